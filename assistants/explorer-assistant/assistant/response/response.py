@@ -400,53 +400,41 @@ async def _get_history_messages(
     token_limit: int | None = None,
 ) -> list[CompletionMessage]:
     """
-    Get all messages in the conversation, formatted for use in a completion.
+    Get the newest messages in the conversation that fit within the token limit, formatted for use in a completion.
     """
 
-    # each call to get_messages will return a maximum of 100 messages
-    # so we need to loop until all messages are retrieved
-    # if token_limit is provided, we will stop when the token limit is reached
+    # the service returns the newest messages that fit the token limit, by its estimate of their token counts,
+    # so the history is retrieved in a single request
+    history_response = await context.get_message_history(token_limit=token_limit)
 
     history = []
     token_count = 0
-    before_message_id = None
 
-    while True:
-        # get the next batch of messages
-        messages_response = await context.get_messages(limit=100, before=before_message_id)
-        messages_list = messages_response.messages
+    # the service estimates token counts from the message content alone, so count the formatted messages,
+    # newest first, to find those that fit
+    for message in reversed(history_response.messages):
+        # format the message
+        formatted_message_list = await converter(context, message, participants)
+        try:
+            results = await _num_tokens_from_messages(
+                context=context,
+                response_provider=response_provider,
+                messages=formatted_message_list,
+                model=model,
+                metadata={},
+                metadata_key="get_history_messages",
+            )
+            if results is not None:
+                token_count += results.count
+        except Exception as e:
+            logger.exception(f"exception occurred calculating token count: {e}")
 
-        # if there are no more messages, break the loop
-        if not messages_list or messages_list.count == 0:
+        # if a token limit is provided and the token count exceeds the limit, break the loop
+        if token_limit and token_count > token_limit:
             break
 
-        # set the before_message_id for the next batch of messages
-        before_message_id = messages_list[0].id
-
-        # messages are returned in reverse order, so we need to reverse them
-        for message in reversed(messages_list):
-            # format the message
-            formatted_message_list = await converter(context, message, participants)
-            try:
-                results = await _num_tokens_from_messages(
-                    context=context,
-                    response_provider=response_provider,
-                    messages=formatted_message_list,
-                    model=model,
-                    metadata={},
-                    metadata_key="get_history_messages",
-                )
-                if results is not None:
-                    token_count += results.count
-            except Exception as e:
-                logger.exception(f"exception occurred calculating token count: {e}")
-
-            # if a token limit is provided and the token count exceeds the limit, break the loop
-            if token_limit and token_count > token_limit:
-                break
-
-            # insert the formatted messages into the beginning of the history list
-            history = formatted_message_list + history
+        # insert the formatted messages into the beginning of the history list
+        history = formatted_message_list + history
 
     # return the formatted messages
     return history
@@ -52,7 +52,7 @@ class OpenAIResponseProvider(ResponseProvider):
         """
         Calculate the number of tokens in a message.
         """
-        count = openai_client.num_tokens_from_messages(
+        count = await openai_client.num_tokens_from_messages_async(
             model=model, messages=openai_client.convert_from_completion_messages(messages)
         )
 
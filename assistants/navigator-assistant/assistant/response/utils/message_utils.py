@@ -209,58 +209,51 @@ async def get_history_messages(
     token_limit: int | None = None,
 ) -> GetHistoryMessagesResult:
     """
-    Get all messages in the conversation, formatted for use in a completion.
+    Get the newest messages in the conversation that fit within the token limit, formatted for use in a completion.
     """
 
-    # each call to get_messages will return a maximum of 100 messages
-    # so we need to loop until all messages are retrieved
-    # if token_limit is provided, we will stop when the token limit is reached
+    # the service returns the newest messages that fit the token limit, by its estimate of their token counts,
+    # along with the token count of the whole conversation, so the history is retrieved in a single request
+    history_response = await context.get_message_history(
+        token_limit=token_limit, message_types=[MessageType.chat, MessageType.note]
+    )
 
     history = []
     token_count = 0
-    before_message_id = None
-    token_overage = 0
-
-    while True:
-        # get the next batch of messages, including chat and tool result messages
-        messages_response = await context.get_messages(
-            limit=100, before=before_message_id, message_types=[MessageType.chat, MessageType.note]
+    # messages that the service did not return do not fit, but are counted in the token overage
+    token_overage = history_response.total_token_count - history_response.token_count
+    is_token_limit_reached = False
+
+    # the service estimates token counts from the message content alone, so count the formatted messages,
+    # newest first, to find those that fit
+    for message in reversed(history_response.messages):
+        # format the message
+        formatted_message_list = await conversation_message_to_chat_message_params(context, message, participants)
+        formatted_messages_token_count = await openai_client.num_tokens_from_messages_async(
+            formatted_message_list, model=model
         )
-        messages_list = messages_response.messages
-
-        # if there are no more messages, break the loop
-        if not messages_list or messages_list.count == 0:
-            break
-
-        # set the before_message_id for the next batch of messages
-        before_message_id = messages_list[0].id
 
-        # messages are returned in reverse order, so we need to reverse them
-        for message in reversed(messages_list):
-            # format the message
-            formatted_message_list = await conversation_message_to_chat_message_params(context, message, participants)
-            formatted_messages_token_count = openai_client.num_tokens_from_messages(formatted_message_list, model=model)
+        # if the token limit is not reached, or if the token limit is not provided
+        if not is_token_limit_reached and (
+            token_limit is None or token_count + formatted_messages_token_count < token_limit
+        ):
+            # increment the token count
+            token_count += formatted_messages_token_count
 
-            # if the token limit is not reached, or if the token limit is not provided
-            if token_overage == 0 and token_limit and token_count + formatted_messages_token_count < token_limit:
-                # increment the token count
-                token_count += formatted_messages_token_count
+            # insert the formatted messages onto the top of the history list
+            history = formatted_message_list + history
 
-                # insert the formatted messages onto the top of the history list
-                history = formatted_message_list + history
-
-            else:
-                # on first time through, remove any tool messages that occur before a non-tool message
-                if token_overage == 0:
-                    for i, message in enumerate(history):
-                        if message.get("role") != "tool":
-                            history = history[i:]
-                            break
-
-                # the token limit was reached, but continue to count the token overage
-                token_overage += formatted_messages_token_count
-
-        # while loop will now check for next batch of messages
+        else:
+            # the token limit was reached, but continue to count the token overage
+            is_token_limit_reached = True
+            token_overage += formatted_messages_token_count
+
+    # if older messages were left out, remove any tool messages that occur before a non-tool message
+    if token_overage > 0:
+        for i, history_message in enumerate(history):
+            if history_message.get("role") != "tool":
+                history = history[i:]
+                break
 
     # return the formatted messages
     return GetHistoryMessagesResult(
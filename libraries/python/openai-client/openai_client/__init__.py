@@ -35,11 +35,15 @@ from .messages import (
     truncate_messages_for_logging,
 )
 from .tokens import (
+    Tokenizer,
     get_encoding_for_model,
     num_tokens_from_message,
     num_tokens_from_messages,
+    num_tokens_from_messages_async,
     num_tokens_from_tools,
     num_tokens_from_tools_and_messages,
+    num_tokens_from_tools_and_messages_async,
+    tokenizer,
 )
 
 logger = _logging.getLogger(__name__)
@@ -68,11 +72,15 @@ __all__ = [
     "message_from_completion",
     "num_tokens_from_message",
     "num_tokens_from_messages",
+    "num_tokens_from_messages_async",
     "num_tokens_from_tools",
     "num_tokens_from_tools_and_messages",
+    "num_tokens_from_tools_and_messages_async",
     "OpenAIServiceConfig",
     "OpenAIRequestConfig",
     "ServiceConfig",
+    "Tokenizer",
+    "tokenizer",
     "truncate_messages_for_logging",
     "validate_completion",
     "completion_structured",
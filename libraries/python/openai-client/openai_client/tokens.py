@@ -1,7 +1,12 @@
+import asyncio
 import base64
+import functools
+import hashlib
 import logging
 import math
 import re
+import threading
+from collections import OrderedDict
 from fractions import Fraction
 from io import BytesIO
 from typing import Any, Iterable, Sequence
@@ -51,12 +56,106 @@ def resolve_model_name(model: str) -> str:
         raise NotImplementedError(f"num_tokens_from_messages() is not implemented for model {model}.")
 
 
-def get_encoding_for_model(model: str) -> tiktoken.Encoding:
+@functools.cache
+def _encoding_for_model(specific_model: str, default_encoding: str) -> tiktoken.Encoding:
     try:
-        return tiktoken.encoding_for_model(resolve_model_name(model))
+        return tiktoken.encoding_for_model(specific_model)
     except KeyError:
-        logger.warning(f"model {model} not found. Using cl100k_base encoding.")
-        return tiktoken.get_encoding("cl100k_base")
+        logger.warning("model %s not found. Using %s encoding.", specific_model, default_encoding)
+        return tiktoken.get_encoding(default_encoding)
+
+
+def get_encoding_for_model(model: str) -> tiktoken.Encoding:
+    """
+    Return the encoding for the model. Encodings are loaded once per model and shared.
+    """
+    return _encoding_for_model(resolve_model_name(model), "cl100k_base")
+
+
+class Tokenizer:
+    """
+    Counts tokens for strings, sharing work across calls:
+    - token counts are cached in an LRU cache keyed by encoding and a hash of the content, so that
+      conversation history that is counted on every turn is only encoded once
+    - when many strings are not cached, they are encoded together with `encode_batch`, which uses tiktoken's
+      threads; a few are encoded directly, as `encode_batch` starts a thread pool on every call
+    - the async methods run large counts in a worker thread, so they do not block the event loop
+    """
+
+    def __init__(self, cache_size: int = 8192, thread_threshold: int = 16_384, batch_threshold: int = 32) -> None:
+        """
+        cache_size: the maximum number of token counts to cache.
+        thread_threshold: the total number of characters at which the async methods count in a worker thread.
+        batch_threshold: the number of uncached strings at which they are encoded with `encode_batch`.
+        """
+        self.cache_size = cache_size
+        self.thread_threshold = thread_threshold
+        self.batch_threshold = batch_threshold
+        self._cache: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(encoding: tiktoken.Encoding, text: str) -> tuple[str, bytes]:
+        return encoding.name, hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+
+    def count(self, text: str, encoding: tiktoken.Encoding) -> int:
+        """
+        Return the number of tokens in the text.
+        """
+        return self.count_batch([text], encoding)[0]
+
+    def count_batch(self, texts: Sequence[str], encoding: tiktoken.Encoding) -> list[int]:
+        """
+        Return the number of tokens in each of the texts.
+        """
+        counts: list[int | None] = [None] * len(texts)
+        keys = [self._cache_key(encoding, text) for text in texts]
+
+        with self._lock:
+            for index, key in enumerate(keys):
+                count = self._cache.get(key)
+                if count is not None:
+                    self._cache.move_to_end(key)
+                    counts[index] = count
+
+        missing = [index for index, count in enumerate(counts) if count is None]
+        if missing:
+            missing_texts = [texts[index] for index in missing]
+            if len(missing_texts) >= self.batch_threshold:
+                encoded = encoding.encode_batch(missing_texts)
+            else:
+                encoded = [encoding.encode(text) for text in missing_texts]
+            with self._lock:
+                for index, tokens in zip(missing, encoded):
+                    counts[index] = len(tokens)
+                    self._cache[keys[index]] = len(tokens)
+                    self._cache.move_to_end(keys[index])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [count or 0 for count in counts]
+
+    async def count_batch_async(self, texts: Sequence[str], encoding: tiktoken.Encoding) -> list[int]:
+        """
+        Return the number of tokens in each of the texts, counting in a worker thread if the texts are large.
+        """
+        if self.is_large(texts):
+            return await asyncio.to_thread(self.count_batch, texts, encoding)
+        return self.count_batch(texts, encoding)
+
+    def is_large(self, texts: Iterable[str]) -> bool:
+        """
+        Return whether the texts are large enough to be counted in a worker thread.
+        """
+        return sum(len(text) for text in texts) >= self.thread_threshold
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+# the tokenizer shared by the token counting functions in this module
+tokenizer = Tokenizer()
 
 
 def num_tokens_from_message(message: ChatCompletionMessageParam, model: str) -> int:
@@ -81,34 +180,42 @@ def num_tokens_from_messages(messages: Iterable[ChatCompletionMessageParam], mod
     Reference: https://cookbook.openai.com/examples/how_to_count_tokens_with_tiktoken#6-counting-tokens-for-chat-completions-api-calls
     """
 
-    total_tokens = 0
     # Resolve the specific model name using the helper function.
     specific_model = resolve_model_name(model)
+    encoding = _encoding_for_model(specific_model, "cl100k_base")
+
+    num_tokens, texts = _message_overhead_and_texts(messages, specific_model)
+
+    # Count the text of all messages in one batch
+    return num_tokens + sum(tokenizer.count_batch(texts, encoding))
+
+
+def _message_overhead_and_texts(
+    messages: Iterable[ChatCompletionMessageParam], specific_model: str
+) -> tuple[int, list[str]]:
+    """
+    Return the tokens used by the messages other than their text, and the text to encode.
+    """
 
     # Use extra token counts determined experimentally.
     tokens_per_message = 3
     tokens_per_name = 1
 
-    try:
-        encoding = tiktoken.encoding_for_model(specific_model)
-    except KeyError:
-        logger.warning("model %s not found. Using cl100k_base encoding.", specific_model)
-        encoding = tiktoken.get_encoding("cl100k_base")
-
-    # Calculate the total tokens for all messages
+    num_tokens = 0
+    texts: list[str] = []
     for message in messages:
         # Start with the tokens added per message
-        num_tokens = tokens_per_message
+        num_tokens += tokens_per_message
 
         # Add tokens for each key-value pair in the message
         for key, value in message.items():
-            # Calculate the tokens for the value
+            # Collect the text of the value
             if isinstance(value, list):
                 # For GPT-4-vision support, based on the OpenAI cookbook
                 for item in value:
                     # Note: item["type"] does not seem to be counted in the token count
                     if item["type"] == "text":
-                        num_tokens += len(encoding.encode(item["text"]))
+                        texts.append(item["text"])
                     elif item["type"] == "image_url":
                         num_tokens += count_tokens_for_image(
                             item["image_url"]["url"],
@@ -116,7 +223,7 @@ def num_tokens_from_messages(messages: Iterable[ChatCompletionMessageParam], mod
                             detail=item["image_url"].get("detail", "auto"),
                         )
             elif isinstance(value, str):
-                num_tokens += len(encoding.encode(value))
+                texts.append(value)
             elif value is None:
                 # Null values do not consume tokens
                 pass
@@ -127,11 +234,33 @@ def num_tokens_from_messages(messages: Iterable[ChatCompletionMessageParam], mod
             if key == "name":
                 num_tokens += tokens_per_name
 
-        # Add the total tokens for this message to the running total
-        total_tokens += num_tokens
+    return num_tokens, texts
+
+
+async def num_tokens_from_messages_async(messages: Iterable[ChatCompletionMessageParam], model: str) -> int:
+    """
+    Return the number of tokens used by a list of messages, as num_tokens_from_messages does.
 
-    # Return the total token count for all messages
-    return total_tokens
+    Large messages are counted in a worker thread, so that counting does not block the event loop.
+    """
+    messages = list(messages)
+    if tokenizer.is_large(_message_texts_for_size(messages)):
+        return await asyncio.to_thread(num_tokens_from_messages, messages, model)
+    return num_tokens_from_messages(messages, model)
+
+
+def _message_texts_for_size(messages: Iterable[ChatCompletionMessageParam]) -> Iterable[str]:
+    # images are included, as decoding them to find their dimensions is also slow
+    for message in messages:
+        for value in message.values():
+            if isinstance(value, str):
+                yield value
+            elif isinstance(value, list):
+                for item in value:
+                    if item["type"] == "text":
+                        yield item["text"]
+                    elif item["type"] == "image_url":
+                        yield item["image_url"]["url"]
 
 
 def count_jsonschema_tokens(schema, encoding, prop_key, enum_item, enum_init) -> Any | int:
@@ -204,11 +333,7 @@ def num_tokens_from_tools(
             f"num_tokens_from_tools_and_messages() is not implemented for model {specific_model}."
         )
 
-    try:
-        encoding = tiktoken.encoding_for_model(specific_model)
-    except KeyError:
-        logger.warning("model %s not found. Using o200k_base encoding.", specific_model)
-        encoding = tiktoken.get_encoding("o200k_base")
+    encoding = _encoding_for_model(specific_model, "o200k_base")
 
     token_count = 0
     for f in tools:
@@ -219,7 +344,7 @@ def num_tokens_from_tools(
         if f_desc.endswith("."):
             f_desc = f_desc[:-1]
         line = f_name + ":" + f_desc
-        token_count += len(encoding.encode(line))  # Add tokens for set name and description
+        token_count += tokenizer.count(line, encoding)  # Add tokens for set name and description
         if "parameters" in function:  # Process any JSON Schema in parameters
             token_count += count_jsonschema_tokens(function["parameters"], encoding, prop_key, enum_item, enum_init)
     if len(tools) > 0:
@@ -242,15 +367,122 @@ def num_tokens_from_tools_and_messages(
     return messages_token_count + tools_token_count
 
 
+async def num_tokens_from_tools_and_messages_async(
+    tools: Sequence[ChatCompletionToolParam],
+    messages: Iterable[ChatCompletionMessageParam],
+    model: str,
+) -> int:
+    """
+    Return the number of tokens used by a list of functions and messages, as num_tokens_from_tools_and_messages
+    does, counting large messages in a worker thread.
+    """
+    messages_token_count = await num_tokens_from_messages_async(messages, model)
+    tools_token_count = num_tokens_from_tools(tools, model)
+    return messages_token_count + tools_token_count
+
+
+# the number of base64 characters decoded to read image dimensions from the image header
+_IMAGE_HEADER_BASE64_LENGTH = 4096
+
+_IMAGE_DIMS_CACHE_SIZE = 1024
+_image_dims_cache: OrderedDict[bytes, tuple[int, int]] = OrderedDict()
+_image_dims_lock = threading.Lock()
+
+# JPEG start-of-frame markers, which are followed by the image dimensions
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_dims(data: bytes) -> tuple[int, int] | None:
+    index = 2
+    while index + 9 <= len(data):
+        if data[index] != 0xFF:
+            return None
+        marker = data[index + 1]
+        if marker == 0xFF:
+            # fill byte
+            index += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[index + 5 : index + 7], "big")
+            width = int.from_bytes(data[index + 7 : index + 9], "big")
+            return width, height
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # markers without a segment
+            index += 2
+            continue
+        index += 2 + int.from_bytes(data[index + 2 : index + 4], "big")
+    return None
+
+
+def _image_dims_from_header(data: bytes) -> tuple[int, int] | None:
+    """
+    Return the dimensions of a PNG, JPEG, GIF or WebP image from its header, or None if the format is not
+    recognized or the data does not include the dimensions.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and len(data) >= 24 and data[12:16] == b"IHDR":
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return int.from_bytes(data[6:8], "little"), int.from_bytes(data[8:10], "little")
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            return int.from_bytes(data[26:28], "little") & 0x3FFF, int.from_bytes(data[28:30], "little") & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+        return None
+
+    if data.startswith(b"\xff\xd8"):
+        return _jpeg_dims(data)
+
+    return None
+
+
+def _read_image_dims(image_data: str) -> tuple[int, int]:
+    # decode only the start of the image, which includes the dimensions for most images
+    header = base64.b64decode(image_data[:_IMAGE_HEADER_BASE64_LENGTH])
+    dims = _image_dims_from_header(header)
+    if dims is not None:
+        return dims
+
+    # JPEG metadata segments can push the dimensions past the start of the image
+    data = base64.b64decode(image_data)
+    dims = _image_dims_from_header(data)
+    if dims is not None:
+        return dims
+
+    with Image.open(BytesIO(data)) as image:
+        return image.size
+
+
 def get_image_dims(image_uri: str) -> tuple[int, int]:
     # From https://github.com/openai/openai-cookbook/pull/881/files
-    if re.match(r"data:image\/\w+;base64", image_uri):
-        image_uri = re.sub(r"data:image\/\w+;base64,", "", image_uri)
-        with Image.open(BytesIO(base64.b64decode(image_uri))) as image:
-            return image.size
-    else:
+    if not re.match(r"data:image\/\w+;base64", image_uri):
         raise ValueError("Image must be a base64 string.")
 
+    image_data = re.sub(r"data:image\/\w+;base64,", "", image_uri, count=1)
+
+    # the same images are counted on every turn, so cache their dimensions by a hash of the data
+    key = hashlib.blake2b(image_data.encode("ascii", errors="replace"), digest_size=16).digest()
+    with _image_dims_lock:
+        dims = _image_dims_cache.get(key)
+        if dims is not None:
+            _image_dims_cache.move_to_end(key)
+            return dims
+
+    dims = _read_image_dims(image_data)
+
+    with _image_dims_lock:
+        _image_dims_cache[key] = dims
+        while len(_image_dims_cache) > _IMAGE_DIMS_CACHE_SIZE:
+            _image_dims_cache.popitem(last=False)
+
+    return dims
+
 
 def count_tokens_for_image(image_uri: str, detail: str, model: str) -> int:
     # From https://github.com/openai/openai-cookbook/pull/881/files
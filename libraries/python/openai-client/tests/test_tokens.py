@@ -1,9 +1,27 @@
+import asyncio
+import base64
 import os
+from io import BytesIO
+from unittest import mock
 
 import openai_client
 import pytest
+import tiktoken
 from openai import OpenAI
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionToolParam
+from openai_client.tokens import get_image_dims
+from PIL import Image
+
+
+@pytest.fixture
+def encoding() -> tiktoken.Encoding:
+    # a byte-level encoding, so that tests do not download the encodings published by openai
+    return tiktoken.Encoding(
+        name="test_bytes",
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([byte]): byte for byte in range(256)},
+        special_tokens={},
+    )
 
 
 @pytest.fixture
@@ -151,3 +169,56 @@ def test_num_tokens_for_tools_and_messages(model: str, client: OpenAI) -> None:
     assert actual_num_tokens == expected_num_tokens, (
         f"num_tokens_from_tools_and_messages() does not match the OpenAI API response for model {model}."
     )
+
+
+def test_tokenizer_counts_and_caches(encoding: tiktoken.Encoding) -> None:
+    tokenizer = openai_client.Tokenizer(cache_size=2, thread_threshold=10)
+
+    texts = ["hello world", "", "the quick brown fox", "hello world"]
+    expected = [len(encoding.encode(text)) for text in texts]
+
+    assert tokenizer.count_batch(texts, encoding) == expected
+    # the least recently used count is evicted
+    assert len(tokenizer._cache) == 2
+
+    # large batches are counted in a worker thread
+    assert tokenizer.is_large(texts)
+    assert asyncio.run(tokenizer.count_batch_async(texts, encoding)) == expected
+
+
+def test_tokenizer_encodes_large_batches_together(encoding: tiktoken.Encoding) -> None:
+    tokenizer = openai_client.Tokenizer(batch_threshold=3)
+
+    texts = [f"text {index}" for index in range(3)]
+    with mock.patch.object(encoding, "encode_batch", wraps=encoding.encode_batch) as encode_batch:
+        # a few uncached strings are encoded one at a time
+        assert tokenizer.count_batch(texts[:2], encoding) == [len(encoding.encode(text)) for text in texts[:2]]
+        encode_batch.assert_not_called()
+
+        texts = [f"other text {index}" for index in range(3)]
+        assert tokenizer.count_batch(texts, encoding) == [len(encoding.encode(text)) for text in texts]
+        encode_batch.assert_called_once_with(texts)
+
+
+def test_num_tokens_from_messages_async(encoding: tiktoken.Encoding, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(openai_client.tokens, "_encoding_for_model", lambda *args: encoding)
+
+    messages: list[ChatCompletionMessageParam] = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "name": "example_user", "content": "word " * 10_000},
+    ]
+
+    assert asyncio.run(
+        openai_client.num_tokens_from_messages_async(messages=messages, model="gpt-4o")
+    ) == openai_client.num_tokens_from_messages(messages=messages, model="gpt-4o")
+
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG", "GIF", "WEBP"])
+def test_get_image_dims(image_format: str) -> None:
+    buffer = BytesIO()
+    Image.new("RGB", (1234, 567)).save(buffer, format=image_format)
+    image_uri = f"data:image/{image_format.lower()};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+    assert get_image_dims(image_uri) == (1234, 567)
+    # cached
+    assert get_image_dims(image_uri) == (1234, 567)
@@ -153,6 +153,11 @@ class MessageType(StrEnum):
     notice = "notice"
 
 
+class TokenEncoding(StrEnum):
+    cl100k_base = "cl100k_base"
+    o200k_base = "o200k_base"
+
+
 class ConversationMessage(BaseModel):
     id: uuid.UUID
     sender: MessageSender
@@ -163,6 +168,7 @@ class ConversationMessage(BaseModel):
     filenames: list[str]
     metadata: dict[str, Any]
     has_debug_data: bool
+    token_counts: dict[TokenEncoding, int] = {}
 
     @property
     def command_name(self) -> str:
@@ -185,7 +191,26 @@ class ConversationMessageDebug(BaseModel):
 
 
 class ConversationMessageList(BaseModel):
+    """
+    Messages in a conversation, oldest first. prev_cursor, if set, can be passed as the cursor to get the preceding
+    page of messages, and next_cursor to get the messages that follow this page.
+    """
+
     messages: list[ConversationMessage]
+    prev_cursor: str | None = None
+    next_cursor: str | None = None
+
+
+class ConversationMessageHistory(BaseModel):
+    """
+    The newest messages in a conversation that fit a token budget, oldest first. token_count is the estimated
+    token count of the messages returned and total_token_count is that of all matching messages in the
+    conversation, so total_token_count - token_count is the number of tokens that did not fit.
+    """
+
+    messages: list[ConversationMessage]
+    token_count: int
+    total_token_count: int
 
 
 class File(BaseModel):
@@ -468,6 +493,38 @@ class UpdateParticipant(BaseModel):
     metadata: dict[str, Any] | None = None
 
 
+class ConversationBatchOperation(BaseModel):
+    """
+    A request to one of the conversation's endpoints, with the path relative to the conversation, ie. "/messages".
+    """
+
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"]
+    path: str = ""
+    params: dict[str, str | list[str]] = {}
+    body: Any = None
+
+
+class ConversationBatchRequest(BaseModel):
+    """
+    Operations to perform in order. Consecutive GET operations may be performed concurrently.
+    """
+
+    operations: Annotated[list[ConversationBatchOperation], Field(max_length=100)]
+
+
+class ConversationBatchOperationResult(BaseModel):
+    status_code: int
+    # the body of a JSON response
+    body: Any = None
+    # the base64-encoded body of any other response
+    content: str | None = None
+    content_type: str | None = None
+
+
+class ConversationBatchResponse(BaseModel):
+    results: list[ConversationBatchOperationResult]
+
+
 class ConversationEventType(StrEnum):
     message_created = "message.created"
     message_deleted = "message.deleted"
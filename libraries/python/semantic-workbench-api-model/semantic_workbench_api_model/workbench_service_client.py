@@ -1,16 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import collections
 import io
 import json
 import types
 import urllib.parse
 import uuid
 from contextlib import asynccontextmanager, suppress
-from dataclasses import dataclass
-from typing import Any, AsyncGenerator, AsyncIterator, Callable, Iterable, Mapping, Self
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Iterable, Mapping, Self, TypeVar
 
 import asgi_correlation_id
 import httpx
+from pydantic import BaseModel
 
 from . import assistant_model, workbench_model
 
@@ -19,9 +23,94 @@ HEADER_ASSISTANT_ID = "X-Assistant-ID"
 HEADER_API_KEY = "X-API-Key"
 
 
+@dataclass
+class HttpxTransportOptions:
+    # http2 requires the h2 package (ie. httpx[http2])
+    http2: bool = False
+    limits: httpx.Limits = field(
+        default_factory=lambda: httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+    )
+
+
+_httpx_transport_options = HttpxTransportOptions()
+
+
+def configure_httpx_transport(options: HttpxTransportOptions) -> None:
+    """
+    Sets the options for the shared transport. Applies to the transport created after the current one is closed.
+    """
+    global _httpx_transport_options
+    _httpx_transport_options = options
+
+
 # HTTPX transport factory can be overridden to return an ASGI transport for testing
-def httpx_transport_factory() -> httpx.AsyncHTTPTransport:
-    return httpx.AsyncHTTPTransport(retries=3)
+def httpx_transport_factory() -> httpx.AsyncBaseTransport:
+    return httpx.AsyncHTTPTransport(
+        retries=3, http2=_httpx_transport_options.http2, limits=_httpx_transport_options.limits
+    )
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """
+    Sends requests with the shared transport, without closing it when the client using it is closed.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+_shared_transport: httpx.AsyncBaseTransport | None = None
+_shared_transport_factory: Callable[[], httpx.AsyncBaseTransport] | None = None
+# closes of transports replaced when the factory was overridden
+_replaced_transport_closes: set[asyncio.Task] = set()
+
+
+def _close_replaced_transport(transport: httpx.AsyncBaseTransport) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # connections are only opened by requests on an event loop, so there are none to close
+        return
+
+    task = loop.create_task(transport.aclose())
+    _replaced_transport_closes.add(task)
+    task.add_done_callback(_replaced_transport_closes.discard)
+
+
+def shared_httpx_transport() -> httpx.AsyncBaseTransport:
+    """
+    Returns a transport that shares one connection pool across the process, so that clients created for each call
+    reuse connections rather than opening (and closing) their own.
+    """
+    global _shared_transport, _shared_transport_factory
+    # the transport is re-created if the factory is overridden, such as by tests, and the replaced one is closed
+    if _shared_transport is None or _shared_transport_factory is not httpx_transport_factory:
+        if _shared_transport is not None:
+            _close_replaced_transport(_shared_transport)
+        _shared_transport = httpx_transport_factory()
+        _shared_transport_factory = httpx_transport_factory
+    return _SharedTransport(_shared_transport)
+
+
+async def aclose_shared_httpx_transport() -> None:
+    """
+    Closes the shared transport, and its pooled connections, waiting for replaced transports to close. A new
+    transport is created when next needed.
+    """
+    global _shared_transport, _shared_transport_factory
+    transport = _shared_transport
+    _shared_transport = None
+    _shared_transport_factory = None
+    if transport is not None:
+        await transport.aclose()
+    if _replaced_transport_closes:
+        await asyncio.gather(*_replaced_transport_closes, return_exceptions=True)
 
 
 @dataclass
@@ -68,6 +157,288 @@ class UserRequestHeaders:
         return {"Authorization": f"Bearer {self.token}"}
 
 
+def _get_messages_params(
+    before: uuid.UUID | None,
+    after: uuid.UUID | None,
+    message_types: Iterable[workbench_model.MessageType],
+    participant_ids: Iterable[str] | None,
+    participant_role: workbench_model.ParticipantRole | None,
+    limit: int | None,
+    cursor: str | None,
+) -> dict[str, str | list[str]]:
+    params: dict[str, str | list[str]] = {}
+    if message_types:
+        params["message_type"] = [mt.value for mt in message_types]
+    if participant_ids:
+        params["participant_id"] = list(participant_ids)
+    if participant_role:
+        params["participant_role"] = participant_role.value
+    if before:
+        params["before"] = str(before)
+    if after:
+        params["after"] = str(after)
+    if limit:
+        params["limit"] = str(limit)
+    if cursor:
+        params["cursor"] = cursor
+    return params
+
+
+# the most operations the workbench service accepts in one batch request
+_BATCH_MAX_OPERATIONS = 100
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+ResultT = TypeVar("ResultT")
+
+
+def _parse_model(model: type[ModelT]) -> Callable[[list[httpx.Response]], ModelT]:
+    def parse(responses: list[httpx.Response]) -> ModelT:
+        responses[0].raise_for_status()
+        return model.model_validate(responses[0].json())
+
+    return parse
+
+
+@dataclass
+class _BatchEntry:
+    operations: list[workbench_model.ConversationBatchOperation]
+    parse: Callable[[list[httpx.Response]], Any]
+    future: asyncio.Future
+
+
+class ConversationBatch:
+    """
+    Operations to send to the workbench service together, when ConversationAPIClient.batch() exits.
+
+    Each method returns a future that, once the batch is sent, resolves to what the ConversationAPIClient method of
+    the same name returns, or raises what it raises. Operations are performed in the order they are added, except
+    that consecutive reads may be performed concurrently.
+    """
+
+    def __init__(self, conversation_id: str) -> None:
+        self._conversation_id = conversation_id
+        self._entries: list[_BatchEntry] = []
+
+    def _add(
+        self,
+        operations: list[workbench_model.ConversationBatchOperation],
+        parse: Callable[[list[httpx.Response]], ResultT],
+    ) -> asyncio.Future[ResultT]:
+        future: asyncio.Future[ResultT] = asyncio.get_running_loop().create_future()
+        self._entries.append(_BatchEntry(operations=operations, parse=parse, future=future))
+        return future
+
+    def get_conversation(self) -> asyncio.Future[workbench_model.Conversation]:
+        return self._add(
+            [workbench_model.ConversationBatchOperation(method="GET")],
+            _parse_model(workbench_model.Conversation),
+        )
+
+    def update_conversation(self, metadata: dict[str, Any]) -> asyncio.Future[workbench_model.Conversation]:
+        return self._add(
+            [
+                workbench_model.ConversationBatchOperation(
+                    method="PATCH",
+                    body=workbench_model.UpdateConversation(metadata=metadata).model_dump(
+                        mode="json", exclude_unset=True, exclude_defaults=True
+                    ),
+                )
+            ],
+            _parse_model(workbench_model.Conversation),
+        )
+
+    def get_participants(
+        self, *, include_inactive: bool = False
+    ) -> asyncio.Future[workbench_model.ConversationParticipantList]:
+        def parse(responses: list[httpx.Response]) -> workbench_model.ConversationParticipantList:
+            if responses[0].status_code == httpx.codes.NOT_FOUND:
+                return workbench_model.ConversationParticipantList(participants=[])
+
+            return _parse_model(workbench_model.ConversationParticipantList)(responses)
+
+        return self._add(
+            [
+                workbench_model.ConversationBatchOperation(
+                    method="GET",
+                    path="/participants",
+                    params={"include_inactive": str(include_inactive).lower()},
+                )
+            ],
+            parse,
+        )
+
+    def update_participant(
+        self,
+        participant_id: str,
+        participant: workbench_model.UpdateParticipant,
+    ) -> asyncio.Future[workbench_model.ConversationParticipant]:
+        return self._add(
+            [
+                workbench_model.ConversationBatchOperation(
+                    method="PATCH",
+                    path=f"/participants/{participant_id}",
+                    body=participant.model_dump(exclude_defaults=True, exclude_unset=True, mode="json"),
+                )
+            ],
+            _parse_model(workbench_model.ConversationParticipant),
+        )
+
+    def update_participant_me(
+        self,
+        participant: workbench_model.UpdateParticipant,
+    ) -> asyncio.Future[workbench_model.ConversationParticipant]:
+        return self.update_participant(participant_id="me", participant=participant)
+
+    def get_messages(
+        self,
+        before: uuid.UUID | None = None,
+        after: uuid.UUID | None = None,
+        message_types: Iterable[workbench_model.MessageType] = (workbench_model.MessageType.chat,),
+        participant_ids: Iterable[str] | None = None,
+        participant_role: workbench_model.ParticipantRole | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> asyncio.Future[workbench_model.ConversationMessageList]:
+        params = _get_messages_params(
+            before=before,
+            after=after,
+            message_types=message_types,
+            participant_ids=participant_ids,
+            participant_role=participant_role,
+            limit=limit,
+            cursor=cursor,
+        )
+        return self._add(
+            [workbench_model.ConversationBatchOperation(method="GET", path="/messages", params=params)],
+            _parse_model(workbench_model.ConversationMessageList),
+        )
+
+    def send_messages(
+        self,
+        *messages: workbench_model.NewConversationMessage,
+    ) -> asyncio.Future[workbench_model.ConversationMessageList]:
+        def parse(responses: list[httpx.Response]) -> workbench_model.ConversationMessageList:
+            messages_out = []
+            for response in responses:
+                response.raise_for_status()
+                messages_out.append(workbench_model.ConversationMessage.model_validate(response.json()))
+            return workbench_model.ConversationMessageList(messages=messages_out)
+
+        return self._add(
+            [
+                workbench_model.ConversationBatchOperation(
+                    method="POST",
+                    path="/messages",
+                    body=message.model_dump(mode="json", exclude_unset=True, exclude_defaults=True),
+                )
+                for message in messages
+            ],
+            parse,
+        )
+
+    def get_files(self, prefix: str | None = None) -> asyncio.Future[workbench_model.FileList]:
+        return self._add(
+            [
+                workbench_model.ConversationBatchOperation(
+                    method="GET", path="/files", params={"prefix": prefix} if prefix else {}
+                )
+            ],
+            _parse_model(workbench_model.FileList),
+        )
+
+    def update_file(self, filename: str, metadata: dict[str, Any]) -> asyncio.Future[workbench_model.FileVersions]:
+        return self._add(
+            [
+                workbench_model.ConversationBatchOperation(
+                    method="PATCH",
+                    path=f"/files/{urllib.parse.quote(filename, safe='')}",
+                    body=workbench_model.UpdateFile(metadata=metadata).model_dump(
+                        mode="json", exclude_unset=True, exclude_defaults=True
+                    ),
+                )
+            ],
+            _parse_model(workbench_model.FileVersions),
+        )
+
+    def _cancel(self) -> None:
+        for entry in self._entries:
+            entry.future.cancel()
+        self._entries = []
+
+    def _response(
+        self,
+        client: httpx.AsyncClient,
+        operation: workbench_model.ConversationBatchOperation,
+        result: workbench_model.ConversationBatchOperationResult,
+    ) -> httpx.Response:
+        # the results are returned as responses, so that errors are raised as they are by ConversationAPIClient
+        request = client.build_request(
+            operation.method,
+            f"/conversations/{self._conversation_id}{operation.path}",
+            params=operation.params,
+        )
+        if result.content is None:
+            return httpx.Response(status_code=result.status_code, json=result.body, request=request)
+
+        return httpx.Response(
+            status_code=result.status_code,
+            content=base64.b64decode(result.content),
+            headers={"content-type": result.content_type} if result.content_type else None,
+            request=request,
+        )
+
+    async def _send(self, client: httpx.AsyncClient) -> None:
+        entries, self._entries = self._entries, []
+        operations = [operation for entry in entries for operation in entry.operations]
+
+        # entries are resolved once the requests holding all of their operations are sent, so that when a request
+        # fails, only the entries that were not performed fail with it
+        responses: list[httpx.Response] = []
+        pending = collections.deque(entries)
+        resolved_count = 0
+
+        def resolve_performed() -> None:
+            nonlocal resolved_count
+            while pending and resolved_count + len(pending[0].operations) <= len(responses):
+                entry = pending.popleft()
+                end = resolved_count + len(entry.operations)
+                entry_responses = responses[resolved_count:end]
+                resolved_count = end
+                if entry.future.cancelled():
+                    continue
+                try:
+                    entry.future.set_result(entry.parse(entry_responses))
+                except Exception as e:
+                    entry.future.set_exception(e)
+
+        try:
+            if operations:
+                async with client:
+                    for start in range(0, len(operations), _BATCH_MAX_OPERATIONS):
+                        batch_operations = operations[start : start + _BATCH_MAX_OPERATIONS]
+                        batch_request = workbench_model.ConversationBatchRequest(operations=batch_operations)
+                        http_response = await client.post(
+                            f"/conversations/{self._conversation_id}/batch",
+                            json=batch_request.model_dump(mode="json"),
+                        )
+                        http_response.raise_for_status()
+                        batch_response = workbench_model.ConversationBatchResponse.model_validate(http_response.json())
+                        responses.extend(
+                            self._response(client, operation, result)
+                            for operation, result in zip(batch_operations, batch_response.results)
+                        )
+                        resolve_performed()
+
+            resolve_performed()
+
+        except BaseException:
+            # the exception is raised by ConversationAPIClient.batch(), so the futures of the entries that were not
+            # performed are cancelled rather than each raising it again
+            for entry in pending:
+                entry.future.cancel()
+            raise
+
+
 class ConversationAPIClient:
     def __init__(
         self,
@@ -81,6 +452,29 @@ class ConversationAPIClient:
     def _client(self) -> httpx.AsyncClient:
         return self._httpx_client_factory()
 
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator[ConversationBatch]:
+        """
+        Sends the operations added to the batch in one request, when the context exits.
+
+        Example:
+        ```python
+        async with client.batch() as batch:
+            conversation = batch.get_conversation()
+            messages = batch.get_messages(limit=100)
+
+        print((await conversation).title, len((await messages).messages))
+        ```
+        """
+        batch = ConversationBatch(self._conversation_id)
+        try:
+            yield batch
+        except BaseException:
+            batch._cancel()
+            raise
+
+        await batch._send(self._client)
+
     async def get_sse_session(self, event_source_url: str) -> AsyncIterator[dict]:
         async with self._client as client:
             async with client.stream("GET", event_source_url) as response:
@@ -212,25 +606,47 @@ class ConversationAPIClient:
         participant_ids: Iterable[str] | None = None,
         participant_role: workbench_model.ParticipantRole | None = None,
         limit: int | None = None,
+        cursor: str | None = None,
     ) -> workbench_model.ConversationMessageList:
+        """
+        Returns the newest messages that match, oldest first. Pass the prev_cursor or next_cursor of a returned
+        list as the cursor to get the preceding or following page.
+        """
         async with self._client as client:
-            params: dict[str, str | list[str]] = {}
+            params = _get_messages_params(
+                before=before,
+                after=after,
+                message_types=message_types,
+                participant_ids=participant_ids,
+                participant_role=participant_role,
+                limit=limit,
+                cursor=cursor,
+            )
+            http_response = await client.get(f"/conversations/{self._conversation_id}/messages", params=params)
+            http_response.raise_for_status()
+            return workbench_model.ConversationMessageList.model_validate(http_response.json())
+
+    async def get_message_history(
+        self,
+        token_limit: int | None = None,
+        encoding: workbench_model.TokenEncoding = workbench_model.TokenEncoding.o200k_base,
+        message_types: Iterable[workbench_model.MessageType] = (workbench_model.MessageType.chat,),
+    ) -> workbench_model.ConversationMessageHistory:
+        """
+        Returns the newest messages that fit within token_limit, or all messages if there is no limit, along with
+        the token count of all matching messages in the conversation. Token counts are estimated by the service
+        using the given encoding.
+        """
+        async with self._client as client:
+            params: dict[str, str | list[str]] = {"encoding": encoding.value}
+            if token_limit is not None:
+                params["token_limit"] = str(token_limit)
             if message_types:
                 params["message_type"] = [mt.value for mt in message_types]
-            if participant_ids:
-                params["participant_id"] = list(participant_ids)
-            if participant_role:
-                params["participant_role"] = participant_role.value
-            if before:
-                params["before"] = str(before)
-            if after:
-                params["after"] = str(after)
-            if limit:
-                params["limit"] = str(limit)
 
-            http_response = await client.get(f"/conversations/{self._conversation_id}/messages", params=params)
+            http_response = await client.get(f"/conversations/{self._conversation_id}/messages/history", params=params)
             http_response.raise_for_status()
-            return workbench_model.ConversationMessageList.model_validate(http_response.json())
+            return workbench_model.ConversationMessageHistory.model_validate(http_response.json())
 
     async def send_messages(
         self,
@@ -550,8 +966,9 @@ class WorkbenchServiceClientBuilder:
         self._api_key = api_key
 
     def _client(self, *headers: AssistantServiceRequestHeaders | AssistantRequestHeaders) -> httpx.AsyncClient:
+        # the client is created per call, for its headers, and sends its requests through the shared transport
         client = httpx.AsyncClient(
-            transport=httpx_transport_factory(),
+            transport=shared_httpx_transport(),
             base_url=self._base_url,
             timeout=httpx.Timeout(5.0, connect=10.0, read=60.0),
             headers={
@@ -620,7 +1037,7 @@ class WorkbenchServiceUserClientBuilder:
         self._headers = headers
 
     def _client(self) -> httpx.AsyncClient:
-        client = httpx.AsyncClient(transport=httpx_transport_factory())
+        client = httpx.AsyncClient(transport=shared_httpx_transport())
         client.base_url = self._base_url
         client.timeout.connect = 10
         client.timeout.read = 60
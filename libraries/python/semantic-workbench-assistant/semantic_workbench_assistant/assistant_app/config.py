@@ -1,5 +1,7 @@
 import logging
+import os
 import pathlib
+from dataclasses import dataclass
 from typing import Any, Generic, TypeVar
 
 from pydantic import (
@@ -26,9 +28,28 @@ logger = logging.getLogger(__name__)
 ConfigModelT = TypeVar("ConfigModelT", bound=BaseModel)
 
 
+@dataclass(frozen=True)
+class _CachedConfig(Generic[ConfigModelT]):
+    template_id: str
+    # the modification time and size of the file the config was read from, or None if there was no file
+    file_version: tuple[int, int] | None
+    config: ConfigModelT
+    errors: list[str]
+
+
+def _file_version(path: pathlib.Path) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 class BaseModelAssistantConfig(Generic[ConfigModelT]):
     """
     Assistant-config implementation that uses a BaseModel for default config.
+
+    Configs are cached in memory, per assistant, until their file is written or modified.
     """
 
     def __init__(
@@ -37,6 +58,7 @@ class BaseModelAssistantConfig(Generic[ConfigModelT]):
         self._templates = {
             "default": default_cls,
         }
+        self._cached_configs: dict[pathlib.Path, _CachedConfig[ConfigModelT]] = {}
 
         if not additional_templates:
             return
@@ -47,19 +69,46 @@ class BaseModelAssistantConfig(Generic[ConfigModelT]):
             self._templates[template_id] = template_cls
 
     async def get(self, assistant_context: AssistantContext) -> ConfigModelT:
+        """
+        Returns the assistant's config. The same instance is returned until the config changes, so it must not be
+        modified.
+        """
+        return self._get_cached(assistant_context).config
+
+    def _get_cached(self, assistant_context: AssistantContext) -> _CachedConfig[ConfigModelT]:
+        template_id = assistant_context._template_id
         path = self._private_path_for(assistant_context)
+        file_version = _file_version(path)
 
-        if not path.exists():
+        if file_version is None:
             # if the config file hasn't been written yet, check the export/import path
             path = self._export_import_path_for(assistant_context)
+            file_version = _file_version(path)
+
+        cached = self._cached_configs.get(path)
+        if cached is not None and cached.template_id == template_id and cached.file_version == file_version:
+            return cached
 
+        config_cls = self._templates[template_id]
         config = None
         try:
-            config = read_model(path, self._templates[assistant_context._template_id])
+            config = read_model(path, config_cls)
         except ValidationError as e:
             logger.warning("exception reading config; path: %s", path, exc_info=e)
 
-        return config or self._templates[assistant_context._template_id].model_construct()
+        config = config or config_cls.model_construct()
+
+        # a config that could not be read is constructed without validation, so may not be valid
+        errors = []
+        try:
+            config_cls.model_validate(config.model_dump())
+        except ValidationError as e:
+            for error in e.errors(include_url=False):
+                errors.append(str(error))
+
+        cached = _CachedConfig(template_id=template_id, file_version=file_version, config=config, errors=errors)
+        self._cached_configs[path] = cached
+        return cached
 
     @property
     def provider(self) -> AssistantConfigProvider:
@@ -68,15 +117,8 @@ class BaseModelAssistantConfig(Generic[ConfigModelT]):
                 self._provider = provider
 
             async def get(self, assistant_context: AssistantContext) -> AssistantConfigDataModel:
-                config = await self._provider.get(assistant_context)
-                errors = []
-                try:
-                    self._provider._templates[assistant_context._template_id].model_validate(config.model_dump())
-                except ValidationError as e:
-                    for error in e.errors(include_url=False):
-                        errors.append(str(error))
-
-                return self._provider._config_data_model_for(config, errors)
+                cached = self._provider._get_cached(assistant_context)
+                return self._provider._config_data_model_for(cached.config, cached.errors)
 
             async def set(self, assistant_context: AssistantContext, config: dict[str, Any]) -> None:
                 try:
@@ -123,6 +165,11 @@ class BaseModelAssistantConfig(Generic[ConfigModelT]):
             ),
         )
 
+        # invalidate explicitly, as the file version may not change if the file is written twice within the file
+        # system's timestamp resolution
+        self._cached_configs.pop(self._private_path_for(assistant_context), None)
+        self._cached_configs.pop(self._export_import_path_for(assistant_context), None)
+
     @staticmethod
     def _config_data_model_for(config: ConfigModelT, errors: list[str] | None = None) -> AssistantConfigDataModel:
         return AssistantConfigDataModel(
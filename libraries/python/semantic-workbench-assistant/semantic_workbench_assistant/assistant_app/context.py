@@ -102,6 +102,23 @@ class ConversationContext:
                 workbench_model.UpdateParticipant(status=revert_to_status)
             )
 
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator[semantic_workbench_api_model.workbench_service_client.ConversationBatch]:
+        """
+        Context manager to send several requests to the workbench service in one round trip.
+
+        Example:
+        ```python
+        async with conversation.batch() as batch:
+            participants = batch.get_participants()
+            messages = batch.get_messages(limit=100)
+
+        participants_list, messages_list = await participants, await messages
+        ```
+        """
+        async with self._conversation_client.batch() as batch:
+            yield batch
+
     async def get_conversation(self) -> workbench_model.Conversation:
         return await self._conversation_client.get_conversation()
 
@@ -119,6 +136,7 @@ class ConversationContext:
         participant_ids: list[str] | None = None,
         participant_role: workbench_model.ParticipantRole | None = None,
         limit: int | None = None,
+        cursor: str | None = None,
     ) -> workbench_model.ConversationMessageList:
         return await self._conversation_client.get_messages(
             before=before,
@@ -127,6 +145,19 @@ class ConversationContext:
             participant_ids=participant_ids,
             participant_role=participant_role,
             limit=limit,
+            cursor=cursor,
+        )
+
+    async def get_message_history(
+        self,
+        token_limit: int | None = None,
+        encoding: workbench_model.TokenEncoding = workbench_model.TokenEncoding.o200k_base,
+        message_types: list[workbench_model.MessageType] = [workbench_model.MessageType.chat],
+    ) -> workbench_model.ConversationMessageHistory:
+        return await self._conversation_client.get_message_history(
+            token_limit=token_limit,
+            encoding=encoding,
+            message_types=message_types,
         )
 
     async def send_conversation_state_event(self, state_event: workbench_model.AssistantStateEvent) -> None:
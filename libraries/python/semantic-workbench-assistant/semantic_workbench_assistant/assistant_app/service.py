@@ -1,4 +1,5 @@
 import asyncio
+import collections
 import contextlib
 import functools
 import logging
@@ -9,6 +10,7 @@ from typing import (
     AsyncContextManager,
     AsyncIterator,
     Callable,
+    Hashable,
     TypeVar,
     cast,
 )
@@ -62,9 +64,101 @@ class _PersistedAssistantStates(BaseModel):
     assistants: dict[str, _AssistantState] = {}
 
 
-class _Event(BaseModel):
-    assistant_id: str
-    event: workbench_model.ConversationEvent
+def coalescing_key(event: workbench_model.ConversationEvent) -> Hashable | None:
+    """
+    Returns a key for the entity whose latest state the event describes. A newer event with the same key
+    supersedes an older one. Returns None for events that must not be coalesced, such as message events.
+    """
+    match event.event:
+        case workbench_model.ConversationEventType.participant_updated:
+            return (event.event, event.data.get("participant", {}).get("id"))
+        case workbench_model.ConversationEventType.file_updated:
+            return (event.event, event.data.get("file", {}).get("filename"))
+        case workbench_model.ConversationEventType.assistant_state_updated:
+            return (event.event, event.data.get("assistant_id"), event.data.get("state_id"))
+        case workbench_model.ConversationEventType.conversation_updated:
+            return (event.event,)
+        case _:
+            return None
+
+
+_MESSAGE_EVENT_TYPES = {
+    workbench_model.ConversationEventType.message_created,
+    workbench_model.ConversationEventType.message_deleted,
+}
+
+# events that message events may be handled before; all other events are handled in order with messages
+_DEFERRABLE_EVENT_TYPES = {
+    workbench_model.ConversationEventType.participant_created,
+    workbench_model.ConversationEventType.participant_updated,
+    workbench_model.ConversationEventType.assistant_state_created,
+    workbench_model.ConversationEventType.assistant_state_updated,
+    workbench_model.ConversationEventType.assistant_state_deleted,
+    workbench_model.ConversationEventType.assistant_state_focus,
+}
+
+
+class ConversationEventQueue:
+    """
+    The events waiting to be handled for one conversation. Message events are handled before waiting participant
+    and assistant state events, so that a burst of status updates does not delay a response. Other events, such as
+    file events, are handled in order with messages. A newer event for the same entity replaces an older one that
+    is still waiting, unless that would move an event that is ordered with messages past a message. Events are
+    otherwise handled in the order they were received.
+    """
+
+    def __init__(self) -> None:
+        self._events: collections.deque[workbench_model.ConversationEvent] = collections.deque()
+        self._not_empty = asyncio.Event()
+        self._coalesced_count = 0
+
+    @property
+    def coalesced_count(self) -> int:
+        """
+        The number of events that were superseded by a newer event before they were handled.
+        """
+        return self._coalesced_count
+
+    def empty(self) -> bool:
+        return not self._events
+
+    def put(self, event: workbench_model.ConversationEvent) -> workbench_model.ConversationEvent | None:
+        """
+        Adds the event, returning the waiting event that it supersedes, if any.
+        """
+        superseded = None
+        key = coalescing_key(event)
+        if key is not None:
+            for index in range(len(self._events) - 1, -1, -1):
+                waiting = self._events[index]
+                if coalescing_key(waiting) == key:
+                    superseded = waiting
+                    del self._events[index]
+                    self._coalesced_count += 1
+                    break
+
+                if waiting.event in _MESSAGE_EVENT_TYPES and event.event not in _DEFERRABLE_EVENT_TYPES:
+                    break
+
+        self._events.append(event)
+        self._not_empty.set()
+        return superseded
+
+    async def get(self) -> workbench_model.ConversationEvent:
+        while self.empty():
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        # the first message is handled next, if only deferrable events were received before it
+        for index, event in enumerate(self._events):
+            if event.event in _MESSAGE_EVENT_TYPES:
+                del self._events[index]
+                return event
+
+            if event.event not in _DEFERRABLE_EVENT_TYPES:
+                break
+
+        return self._events.popleft()
 
 
 def translate_assistant_errors(func):
@@ -132,7 +226,7 @@ class AssistantService(FastAPIAssistantService):
         self._root_path = pathlib.Path(settings.storage.root)
         self._assistant_states_path = self._root_path / "assistant_states.json"
         self._event_queue_lock = asyncio.Lock()
-        self._conversation_event_queues: dict[tuple[str, str], asyncio.Queue[_Event]] = {}
+        self._conversation_event_queues: dict[tuple[str, str], ConversationEventQueue] = {}
         self._conversation_event_tasks: set[asyncio.Task] = set()
         register_lifespan_handler(self.lifespan)
 
@@ -425,48 +519,88 @@ class AssistantService(FastAPIAssistantService):
 
         await self.assistant_app.events.conversation._on_deleted_handlers(True, conversation_context)
 
-    async def _get_or_create_queue(self, assistant_id: str, conversation_id: str) -> asyncio.Queue[_Event]:
+    @property
+    def conversation_worker_count(self) -> int:
+        """
+        The number of conversations with a live event worker.
+        """
+        return len(self._conversation_event_tasks)
+
+    async def _enqueue_event(
+        self, assistant_id: str, conversation_id: str, event: workbench_model.ConversationEvent
+    ) -> None:
         key = (assistant_id, conversation_id)
+        # events are put while holding the lock, so that an idle worker cannot stop after the event is put in its queue
         async with self._event_queue_lock:
             queue = self._conversation_event_queues.get(key)
-            if queue is not None:
-                return queue
+            if queue is None:
+                queue = ConversationEventQueue()
+                self._conversation_event_queues[key] = queue
+                task = asyncio.create_task(self._forward_events_from_queue(key, queue))
+                self._conversation_event_tasks.add(task)
+                task.add_done_callback(self._conversation_event_tasks.discard)
+                logger.debug(
+                    "started conversation event worker; assistant_id: %s, conversation_id: %s, workers: %d",
+                    assistant_id,
+                    conversation_id,
+                    len(self._conversation_event_tasks),
+                )
 
-            queue = asyncio.Queue()
-            self._conversation_event_queues[key] = queue
-            task = asyncio.create_task(self._forward_events_from_queue(queue))
-            self._conversation_event_tasks.add(task)
-            task.add_done_callback(self._conversation_event_tasks.discard)
-            return queue
+            superseded = queue.put(event)
+
+        if superseded is not None:
+            logger.debug(
+                "coalesced conversation event; assistant_id: %s, conversation_id: %s, event: %s, event_id: %s",
+                assistant_id,
+                conversation_id,
+                superseded.event,
+                superseded.id,
+                extra={
+                    "data": {
+                        "assistant_id": assistant_id,
+                        "conversation_id": conversation_id,
+                        "event": superseded.event.value,
+                        "coalesced_event_count": queue.coalesced_count,
+                    }
+                },
+            )
 
-    async def _forward_events_from_queue(self, queue: asyncio.Queue[_Event]) -> None:
+    async def _forward_events_from_queue(self, key: tuple[str, str], queue: ConversationEventQueue) -> None:
         """
-        De-queues events and makes the call to process_workbench_event.
+        De-queues events and makes the call to process_workbench_event. Stops once the queue has been idle for
+        settings.conversation_event_worker_idle_seconds; a new worker is started for the next event.
         """
         while True:
             try:
-                wrapper = None
                 try:
-                    async with asyncio.timeout(1):
-                        wrapper = await queue.get()
-                except asyncio.TimeoutError:
+                    async with asyncio.timeout(settings.conversation_event_worker_idle_seconds):
+                        event = await queue.get()
+
+                except TimeoutError:
+                    async with self._event_queue_lock:
+                        if queue.empty():
+                            del self._conversation_event_queues[key]
+                            # workers that coalesced events are logged at info level, to track how often it happens
+                            logger.log(
+                                logging.INFO if queue.coalesced_count else logging.DEBUG,
+                                "stopped idle conversation event worker; assistant_id: %s, conversation_id: %s,"
+                                " coalesced events: %d",
+                                *key,
+                                queue.coalesced_count,
+                                extra={
+                                    "data": {
+                                        "assistant_id": key[0],
+                                        "conversation_id": key[1],
+                                        "coalesced_event_count": queue.coalesced_count,
+                                    }
+                                },
+                            )
+                            return
                     continue
 
-                except RuntimeError as e:
-                    logging.exception("exception in _forward_events_from_queue loop")
-                    if e.args[0] == "Event loop is closed":
-                        break
-
-                queue.task_done()
-
-                if wrapper is None:
-                    continue
-
-                assistant_id = wrapper.assistant_id
-                event = wrapper.event
-
                 asgi_correlation_id.correlation_id.set(event.correlation_id)
 
+                assistant_id, _ = key
                 conversation_context = self.get_conversation_context(
                     assistant_id=assistant_id,
                     conversation_id=str(event.conversation_id),
@@ -492,8 +626,7 @@ class AssistantService(FastAPIAssistantService):
         """
         _ = require_found(self.get_conversation_context(assistant_id, conversation_id))
 
-        queue = await self._get_or_create_queue(assistant_id=assistant_id, conversation_id=conversation_id)
-        await queue.put(_Event(assistant_id=assistant_id, event=event))
+        await self._enqueue_event(assistant_id=assistant_id, conversation_id=conversation_id, event=event)
 
     async def _forward_event(
         self,
@@ -73,6 +73,17 @@ class FastAPIAssistantService(ABC):
 
         @asynccontextmanager
         async def lifespan() -> AsyncIterator[None]:
+            workbench_service_client.configure_httpx_transport(
+                workbench_service_client.HttpxTransportOptions(
+                    http2=settings.workbench_service_http2,
+                    limits=httpx.Limits(
+                        max_connections=settings.workbench_service_max_connections,
+                        max_keepalive_connections=settings.workbench_service_max_keepalive_connections,
+                        keepalive_expiry=settings.workbench_service_keepalive_expiry_seconds,
+                    ),
+                )
+            )
+
             logger.info(
                 "connecting to semantic-workbench-service; workbench_service_url: %s, assistant_service_id: %s, callback_url: %s",
                 settings.workbench_service_url,
@@ -96,6 +107,9 @@ class FastAPIAssistantService(ABC):
                     except asyncio.CancelledError:
                         pass
 
+                    # close the connections pooled for requests to the workbench service
+                    await workbench_service_client.aclose_shared_httpx_transport()
+
         register_lifespan_handler(lifespan)
 
     async def _periodically_ping_semantic_workbench(
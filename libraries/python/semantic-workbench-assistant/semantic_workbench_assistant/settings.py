@@ -17,6 +17,14 @@ class Settings(BaseSettings):
     workbench_service_url: HttpUrl = HttpUrl("http://127.0.0.1:3000")
     workbench_service_api_key: str = ""
     workbench_service_ping_interval_seconds: float = 20.0
+    # requests to the workbench service share one connection pool; http2 requires the h2 package
+    workbench_service_http2: bool = False
+    workbench_service_max_connections: int = 100
+    workbench_service_max_keepalive_connections: int = 20
+    workbench_service_keepalive_expiry_seconds: float = 30.0
+
+    # events are handled by a worker per conversation, which stops once it has had no events for this long
+    conversation_event_worker_idle_seconds: float = 300.0
 
     assistant_service_id: str | None = None
     assistant_service_name: str | None = None
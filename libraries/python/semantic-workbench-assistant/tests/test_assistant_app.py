@@ -1,6 +1,7 @@
 import asyncio
 import datetime
 import io
+import os
 import pathlib
 import random
 import shutil
@@ -37,8 +38,11 @@ from semantic_workbench_assistant.assistant_app import (
 )
 from semantic_workbench_assistant.assistant_app.context import storage_directory_for_context
 from semantic_workbench_assistant.assistant_app.service import (
+    AssistantService,
+    ConversationEventQueue,
     translate_assistant_errors,
 )
+from semantic_workbench_assistant.assistant_service import create_app
 from semantic_workbench_assistant.config import (
     ConfigSecretStr,
 )
@@ -227,6 +231,157 @@ async def test_assistant_with_event_handlers(
         assert message_created_all_calls == 3
 
 
+async def test_assistant_stops_idle_conversation_event_workers(
+    monkeypatch: pytest.MonkeyPatch, storage_settings: storage.FileStorageSettings
+) -> None:
+    monkeypatch.setattr(settings, "storage", storage_settings)
+    monkeypatch.setattr(settings, "conversation_event_worker_idle_seconds", 0.1)
+
+    app = AssistantApp(
+        assistant_service_id="assistant_id",
+        assistant_service_name="service name",
+        assistant_service_description="service description",
+    )
+
+    message_created_calls = 0
+
+    @app.events.conversation.message.on_created
+    async def on_message_created(
+        conversation_context: ConversationContext,
+        _: workbench_model.ConversationEvent,
+        message: workbench_model.ConversationMessage,
+    ) -> None:
+        nonlocal message_created_calls
+        message_created_calls += 1
+
+    assistant_services: list[AssistantService] = []
+
+    def assistant_service_factory(lifespan) -> AssistantService:
+        assistant_services.append(
+            AssistantService(assistant_app=app, register_lifespan_handler=lifespan.register_handler)
+        )
+        return assistant_services[0]
+
+    service = create_app(assistant_service_factory)
+
+    monkeypatch.setattr(assistant_service_client, "httpx_transport_factory", lambda: httpx.ASGITransport(app=service))
+    monkeypatch.setattr(workbench_service_client, "httpx_transport_factory", lambda: AllOKTransport())
+
+    async with LifespanManager(service):
+        assistant_service = assistant_services[0]
+        assistant_id = uuid.uuid4()
+
+        client_builder = assistant_service_client.AssistantServiceClientBuilder("https://fake", "")
+        await client_builder.for_service().put_assistant(
+            assistant_id=assistant_id,
+            request=assistant_model.AssistantPutRequestModel(assistant_name="my assistant", template_id="default"),
+            from_export=None,
+        )
+        instance_client = client_builder.for_assistant(assistant_id)
+
+        conversation_ids = [uuid.uuid4() for _ in range(3)]
+        for conversation_id in conversation_ids:
+            await instance_client.put_conversation(
+                request=assistant_model.ConversationPutRequestModel(id=str(conversation_id), title="conversation"),
+                from_export=None,
+            )
+
+        async def post_message(conversation_id: uuid.UUID) -> None:
+            await instance_client.post_conversation_event(
+                event=workbench_model.ConversationEvent(
+                    conversation_id=conversation_id,
+                    correlation_id="",
+                    event=workbench_model.ConversationEventType.message_created,
+                    data={
+                        "message": workbench_model.ConversationMessage(
+                            id=uuid.uuid4(),
+                            sender=workbench_model.MessageSender(
+                                participant_role=workbench_model.ParticipantRole.user, participant_id="user"
+                            ),
+                            timestamp=datetime.datetime.now(),
+                            content_type="text/plain",
+                            content="Hello, world",
+                            filenames=[],
+                            metadata={},
+                            has_debug_data=False,
+                        ).model_dump(mode="json")
+                    },
+                )
+            )
+
+        for conversation_id in conversation_ids:
+            await post_message(conversation_id)
+
+        assert assistant_service.conversation_worker_count == 3
+
+        # the workers stop once idle
+        for _ in range(20):
+            if assistant_service.conversation_worker_count == 0:
+                break
+            await asyncio.sleep(0.1)
+
+        assert assistant_service.conversation_worker_count == 0
+
+        # and are started again for the next event
+        await post_message(conversation_ids[0])
+        assert assistant_service.conversation_worker_count == 1
+
+        for _ in range(20):
+            if message_created_calls == 4:
+                break
+            await asyncio.sleep(0.1)
+
+        assert message_created_calls == 4
+
+
+async def test_conversation_event_queue_prioritizes_messages_and_coalesces() -> None:
+    queue = ConversationEventQueue()
+    conversation_id = uuid.uuid4()
+
+    def event(event_type: workbench_model.ConversationEventType, **data) -> workbench_model.ConversationEvent:
+        return workbench_model.ConversationEvent(conversation_id=conversation_id, event=event_type, data=data)
+
+    participant_a = event(workbench_model.ConversationEventType.participant_updated, participant={"id": "a"})
+    participant_b = event(workbench_model.ConversationEventType.participant_updated, participant={"id": "b"})
+    message_1 = event(workbench_model.ConversationEventType.message_created)
+    participant_a_again = event(workbench_model.ConversationEventType.participant_updated, participant={"id": "a"})
+    file_x = event(workbench_model.ConversationEventType.file_updated, file={"filename": "x"})
+    message_2 = event(workbench_model.ConversationEventType.message_created)
+    file_x_again = event(workbench_model.ConversationEventType.file_updated, file={"filename": "x"})
+    file_x_latest = event(workbench_model.ConversationEventType.file_updated, file={"filename": "x"})
+
+    assert queue.put(participant_a) is None
+    assert queue.put(participant_b) is None
+    assert queue.put(message_1) is None
+    # participant events are coalesced across messages
+    assert queue.put(participant_a_again) is participant_a
+    assert queue.put(file_x) is None
+    assert queue.put(message_2) is None
+    # file events are not coalesced across messages, so that they stay in order with them
+    assert queue.put(file_x_again) is None
+    assert queue.put(file_x_latest) is file_x_again
+    assert queue.coalesced_count == 2
+
+    # messages are handled before participant events, but not before file events received earlier
+    assert [await queue.get() for _ in range(6)] == [
+        message_1,
+        participant_b,
+        participant_a_again,
+        file_x,
+        message_2,
+        file_x_latest,
+    ]
+    assert queue.empty()
+
+    # get waits for the next event
+    get_task = asyncio.create_task(queue.get())
+    await asyncio.sleep(0)
+    assert not get_task.done()
+
+    queue.put(message_1)
+    assert await get_task is message_1
+
+
 async def test_assistant_with_inspector(
     monkeypatch: pytest.MonkeyPatch, storage_settings: storage.FileStorageSettings
 ) -> None:
@@ -510,6 +665,39 @@ async def test_assistant_with_config_provider(
         assert e.value.status_code == 400
 
 
+async def test_base_model_assistant_config_is_cached_until_changed(
+    monkeypatch: pytest.MonkeyPatch, storage_settings: storage.FileStorageSettings
+) -> None:
+    monkeypatch.setattr(settings, "storage", storage_settings)
+
+    class TestConfigModel(BaseModel):
+        test_key: str = "test_value"
+
+    assistant_config = BaseModelAssistantConfig(TestConfigModel)
+    assistant_context = AssistantContext(id=str(uuid.uuid4()), name="my assistant", _assistant_service_id="service")
+
+    config = await assistant_config.get(assistant_context)
+    assert config.test_key == "test_value"
+    assert await assistant_config.get(assistant_context) is config
+
+    await assistant_config.provider.set(assistant_context, {"test_key": "new_value"})
+    config = await assistant_config.get(assistant_context)
+    assert config.test_key == "new_value"
+    assert await assistant_config.get(assistant_context) is config
+
+    # changes made to the file by others are read once the file's modification time or size changes
+    config_path = storage_directory_for_context(assistant_context, partition="private") / "config.json"
+    config_path.write_text('{"test_key":"changed_value"}')
+    os.utime(config_path, ns=(0, 0))
+
+    config = await assistant_config.get(assistant_context)
+    assert config.test_key == "changed_value"
+
+    config_data = await assistant_config.provider.get(assistant_context)
+    assert config_data.config == {"test_key": "changed_value"}
+    assert config_data.errors == []
+
+
 async def test_file_system_storage_state_data_provider_to_empty_dir(
     storage_settings: storage.FileStorageSettings, monkeypatch: pytest.MonkeyPatch
 ) -> None:
@@ -661,3 +849,61 @@ async def test_translate_assistant_errors(
 
     if isinstance(exc_info.value, HTTPException):
         assert exc_info.value.status_code == expected_status_code
+
+
+async def test_workbench_service_clients_share_transport(monkeypatch: pytest.MonkeyPatch) -> None:
+    class TrackedTransport(AllOKTransport):
+        def __init__(self) -> None:
+            self.request_count = 0
+            self.closed = False
+
+        async def handle_async_request(self, request) -> httpx.Response:
+            self.request_count += 1
+            return await super().handle_async_request(request)
+
+        async def aclose(self) -> None:
+            self.closed = True
+
+    transports: list[TrackedTransport] = []
+
+    def transport_factory() -> httpx.AsyncBaseTransport:
+        transports.append(TrackedTransport())
+        return transports[-1]
+
+    monkeypatch.setattr(workbench_service_client, "httpx_transport_factory", transport_factory)
+    await workbench_service_client.aclose_shared_httpx_transport()
+
+    def conversation_client() -> workbench_service_client.ConversationAPIClient:
+        return workbench_service_client.WorkbenchServiceClientBuilder(
+            base_url="http://workbench", assistant_service_id="assistant-service", api_key="key"
+        ).for_conversation(assistant_id=str(uuid.uuid4()), conversation_id=str(uuid.uuid4()))
+
+    # clients from separate builder calls share one transport, which is not closed with each client
+    assert await conversation_client().file_exists("file.txt")
+    assert await conversation_client().file_exists("file.txt")
+    assert len(transports) == 1
+    assert transports[0].request_count == 2
+    assert not transports[0].closed
+
+    # closing the shared transport closes its pool, and the next client creates a new one
+    await workbench_service_client.aclose_shared_httpx_transport()
+    assert transports[0].closed
+
+    assert await conversation_client().file_exists("file.txt")
+    assert len(transports) == 2
+    assert transports[1].request_count == 1
+
+    # overriding the factory replaces the shared transport, and the replaced transport is closed
+    def replacement_transport_factory() -> httpx.AsyncBaseTransport:
+        return transport_factory()
+
+    monkeypatch.setattr(workbench_service_client, "httpx_transport_factory", replacement_transport_factory)
+
+    assert await conversation_client().file_exists("file.txt")
+    await asyncio.sleep(0)
+    assert len(transports) == 3
+    assert transports[1].closed
+    assert transports[2].request_count == 1
+    assert not transports[2].closed
+
+    await workbench_service_client.aclose_shared_httpx_transport()
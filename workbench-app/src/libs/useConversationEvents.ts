@@ -14,9 +14,10 @@ export const useConversationEvents = (
         onMessageDeleted?: (messageId: string) => void;
         onParticipantCreated?: (participant: ConversationParticipant) => void;
         onParticipantUpdated?: (participant: ConversationParticipant) => void;
+        onReset?: () => void;
     },
 ) => {
-    const { onMessageCreated, onMessageDeleted, onParticipantCreated, onParticipantUpdated } = handlers;
+    const { onMessageCreated, onMessageDeleted, onParticipantCreated, onParticipantUpdated, onReset } = handlers;
     const environment = useEnvironment();
     const dispatch = useAppDispatch();
 
@@ -64,17 +65,24 @@ export const useConversationEvents = (
         [onParticipantCreated, onParticipantUpdated],
     );
 
+    // handle reset events, sent when the service cannot replay the events missed while reconnecting
+    const handleResetEvent = React.useCallback(() => {
+        onReset?.();
+    }, [onReset]);
+
     React.useEffect(() => {
         workbenchConversationEvents.addEventListener('message.created', handleMessageEvent);
         workbenchConversationEvents.addEventListener('message.deleted', handleMessageEvent);
         workbenchConversationEvents.addEventListener('participant.created', handleParticipantEvent);
         workbenchConversationEvents.addEventListener('participant.updated', handleParticipantEvent);
+        workbenchConversationEvents.addEventListener('reset', handleResetEvent);
 
         return () => {
             workbenchConversationEvents.removeEventListener('message.created', handleMessageEvent);
             workbenchConversationEvents.removeEventListener('message.deleted', handleMessageEvent);
             workbenchConversationEvents.removeEventListener('participant.created', handleParticipantEvent);
             workbenchConversationEvents.removeEventListener('participant.updated', handleParticipantEvent);
+            workbenchConversationEvents.removeEventListener('reset', handleResetEvent);
         };
-    }, [conversationId, dispatch, environment.url, handleMessageEvent, handleParticipantEvent]);
+    }, [conversationId, dispatch, environment.url, handleMessageEvent, handleParticipantEvent, handleResetEvent]);
 };
@@ -27,6 +27,7 @@ export const useHistoryUtility = (conversationId: string) => {
         data: allConversationMessages,
         error: allConversationMessagesError,
         isLoading: allConversationMessagesIsLoading,
+        refetch: allConversationMessagesRefetch,
     } = useGetAllConversationMessagesQuery({
         conversationId,
         limit: Constants.app.maxMessagesPerRequest,
@@ -47,6 +48,7 @@ export const useHistoryUtility = (conversationId: string) => {
         data: conversationFiles,
         error: conversationFilesError,
         isLoading: conversationFilesIsLoading,
+        refetch: conversationFilesRefetch,
     } = useGetConversationFilesQuery(conversationId);
 
     const { data: assistantCapabilities, isFetching: assistantCapabilitiesIsFetching } = useGetAssistantCapabilities(
@@ -128,12 +130,30 @@ export const useHistoryUtility = (conversationId: string) => {
         await conversationParticipantsRefetch();
     }, [conversationParticipantsRefetch]);
 
+    // handler for when events were missed and the conversation must be reloaded
+    const onReset = React.useCallback(async () => {
+        await Promise.all([
+            refetchConversation(),
+            allConversationMessagesRefetch(),
+            conversationParticipantsRefetch(),
+            assistantsRefetch(),
+            conversationFilesRefetch(),
+        ]);
+    }, [
+        refetchConversation,
+        allConversationMessagesRefetch,
+        conversationParticipantsRefetch,
+        assistantsRefetch,
+        conversationFilesRefetch,
+    ]);
+
     // subscribe to conversation events
     useConversationEvents(conversationId, {
         onMessageCreated,
         onMessageDeleted,
         onParticipantCreated,
         onParticipantUpdated,
+        onReset,
     });
 
     // endregion
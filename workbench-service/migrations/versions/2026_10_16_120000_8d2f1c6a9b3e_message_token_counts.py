@@ -0,0 +1,29 @@
+"""message token_counts
+
+Revision ID: 8d2f1c6a9b3e
+Revises: 3763629295ad
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2f1c6a9b3e"
+down_revision: Union[str, None] = "3763629295ad"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing messages are left without token counts, which the service counts in the background
+    with op.batch_alter_table("conversationmessage") as batch_op:
+        batch_op.add_column(sa.Column("token_counts", sa.JSON(none_as_null=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("conversationmessage") as batch_op:
+        batch_op.drop_column("token_counts")
@@ -0,0 +1,64 @@
+"""conversation latest message
+
+Revision ID: 4b7e9d2a1c5f
+Revises: 8d2f1c6a9b3e
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7e9d2a1c5f"
+down_revision: Union[str, None] = "8d2f1c6a9b3e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_conversationmessage_conversation_id_sequence",
+        "conversationmessage",
+        ["conversation_id", "sequence"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_conversationmessage_conversation_id_message_type_sequence",
+        "conversationmessage",
+        ["conversation_id", "message_type", "sequence"],
+        unique=False,
+    )
+
+    op.create_table(
+        "conversationlatestmessage",
+        sa.Column("conversation_id", sa.Uuid(), nullable=False),
+        sa.Column("message_type", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("latest_message_sequence", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["conversation_id"],
+            ["conversation.conversation_id"],
+            name="fk_conversationlatestmessage_conversation_id_conversation",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("conversation_id", "message_type"),
+    )
+
+    op.execute(
+        "INSERT INTO conversationlatestmessage (conversation_id, message_type, latest_message_sequence)"
+        " SELECT conversation_id, message_type, MAX(sequence) FROM conversationmessage"
+        " GROUP BY conversation_id, message_type"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("conversationlatestmessage")
+    op.drop_index(
+        "ix_conversationmessage_conversation_id_message_type_sequence",
+        table_name="conversationmessage",
+    )
+    op.drop_index("ix_conversationmessage_conversation_id_sequence", table_name="conversationmessage")
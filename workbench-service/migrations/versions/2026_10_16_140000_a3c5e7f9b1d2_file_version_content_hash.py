@@ -0,0 +1,32 @@
+"""file version content hash
+
+Revision ID: a3c5e7f9b1d2
+Revises: 4b7e9d2a1c5f
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c5e7f9b1d2"
+down_revision: Union[str, None] = "4b7e9d2a1c5f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing versions remain stored by storage_filename
+    with op.batch_alter_table("fileversion") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sqlmodel.AutoString(), nullable=True))
+    op.create_index(op.f("ix_fileversion_content_hash"), "fileversion", ["content_hash"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_fileversion_content_hash"), table_name="fileversion")
+    with op.batch_alter_table("fileversion") as batch_op:
+        batch_op.drop_column("content_hash")
@@ -0,0 +1,274 @@
+import asyncio
+import collections
+import contextlib
+import datetime
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Hashable
+
+import asgi_correlation_id
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+
+from . import metrics
+from .config import AssistantEventOverflowPolicy
+
+logger = logging.getLogger(__name__)
+
+ForwardEvent = Callable[[uuid.UUID, ConversationEvent], Awaitable[None]]
+
+
+def coalescing_key(event: ConversationEvent) -> Hashable | None:
+    """
+    Returns a key for the entity whose latest state the event describes. A newer event with the same key
+    supersedes an older one. Returns None for events that must not be coalesced, such as message events.
+    """
+    match event.event:
+        case ConversationEventType.participant_updated:
+            return (event.event, event.data.get("participant", {}).get("id"))
+        case ConversationEventType.file_updated:
+            return (event.event, event.data.get("file", {}).get("filename"))
+        case ConversationEventType.assistant_state_updated:
+            return (event.event, event.data.get("assistant_id"), event.data.get("state_id"))
+        case ConversationEventType.conversation_updated:
+            return (event.event,)
+        case _:
+            return None
+
+
+class _AssistantWorkerPool:
+    """
+    Forwards events to one assistant using a fixed number of workers. Events for the same conversation are
+    forwarded one at a time, in order, while different conversations are forwarded in parallel. Once no events
+    have been queued for idle_seconds, the pool stops its workers and calls on_idle.
+    """
+
+    def __init__(
+        self,
+        assistant_id: uuid.UUID,
+        forward: ForwardEvent,
+        concurrency: int,
+        max_queue_size: int,
+        overflow_policy: AssistantEventOverflowPolicy,
+        idle_seconds: float,
+        on_idle: Callable[["_AssistantWorkerPool"], None],
+    ) -> None:
+        self._assistant_id = assistant_id
+        self._forward = forward
+        self._max_queue_size = max_queue_size
+        self._overflow_policy: AssistantEventOverflowPolicy = overflow_policy
+        self._idle_seconds = idle_seconds
+        self._on_idle = on_idle
+
+        # a conversation has an entry in pending from when an event is enqueued until its queue is drained, and
+        # during that time is either waiting in ready or being forwarded by exactly one worker
+        self._pending: dict[uuid.UUID, collections.deque[ConversationEvent]] = {}
+        self._ready: asyncio.Queue[uuid.UUID] = asyncio.Queue()
+        self._workers = {
+            asyncio.create_task(self._work(), name=f"forward_events_to_{assistant_id}_{index}")
+            for index in range(concurrency)
+        }
+
+    def enqueue(self, event: ConversationEvent) -> bool:
+        queue = self._pending.get(event.conversation_id)
+        is_scheduled = queue is not None
+        if queue is None:
+            queue = collections.deque()
+            self._pending[event.conversation_id] = queue
+
+        if len(queue) >= self._max_queue_size and not self._make_room(queue, event):
+            return False
+
+        queue.append(event)
+        metrics.assistant_event_queue_depth.inc()
+
+        if not is_scheduled:
+            self._ready.put_nowait(event.conversation_id)
+
+        return True
+
+    def _make_room(self, queue: collections.deque[ConversationEvent], event: ConversationEvent) -> bool:
+        match self._overflow_policy:
+            case "reject":
+                metrics.assistant_event_overflow_total.labels(action="rejected").inc()
+                logger.warning(
+                    "assistant event queue is full, rejecting event; assistant_id: %s, conversation_id: %s, event: %s,"
+                    " event_id: %s",
+                    self._assistant_id,
+                    event.conversation_id,
+                    event.event,
+                    event.id,
+                )
+                return False
+
+            case "coalesce":
+                key = coalescing_key(event)
+                superseded = next((e for e in queue if key is not None and coalescing_key(e) == key), None)
+                if superseded is not None:
+                    queue.remove(superseded)
+                    metrics.assistant_event_queue_depth.dec()
+                    metrics.assistant_event_overflow_total.labels(action="coalesced").inc()
+                    return True
+
+        dropped = queue.popleft()
+        metrics.assistant_event_queue_depth.dec()
+        metrics.assistant_event_overflow_total.labels(action="dropped").inc()
+        logger.warning(
+            "assistant event queue is full, dropping oldest event; assistant_id: %s, conversation_id: %s, event: %s,"
+            " event_id: %s",
+            self._assistant_id,
+            dropped.conversation_id,
+            dropped.event,
+            dropped.id,
+        )
+        return True
+
+    @property
+    def assistant_id(self) -> uuid.UUID:
+        return self._assistant_id
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                async with asyncio.timeout(self._idle_seconds):
+                    conversation_id = await self._ready.get()
+
+            except TimeoutError:
+                # enqueue does not await, so no event can arrive between this check and the pool being removed;
+                # the next event for the assistant starts a new pool
+                if self._pending:
+                    continue
+
+                self._stop_idle_workers()
+                self._on_idle(self)
+                return
+
+            queue = self._pending[conversation_id]
+            event = queue.popleft()
+            metrics.assistant_event_queue_depth.dec()
+
+            try:
+                await self._forward_event(event)
+            finally:
+                # re-queue the conversation behind the others that are ready, so that a busy conversation does not
+                # starve the rest
+                if queue:
+                    self._ready.put_nowait(conversation_id)
+                else:
+                    del self._pending[conversation_id]
+
+    async def _forward_event(self, event: ConversationEvent) -> None:
+        try:
+            asgi_correlation_id.correlation_id.set(event.correlation_id)
+
+            start_time = datetime.datetime.now(datetime.UTC)
+            metrics.assistant_event_age_seconds.observe((start_time - event.timestamp).total_seconds())
+
+            with metrics.assistant_event_forward_duration_seconds.time():
+                await self._forward(self._assistant_id, event)
+
+            end_time = datetime.datetime.now(datetime.UTC)
+            logger.debug(
+                "forwarded event to assistant; assistant_id: %s, conversation_id: %s, event_id: %s,"
+                " duration: %s, time since event: %s",
+                self._assistant_id,
+                event.conversation_id,
+                event.id,
+                end_time - start_time,
+                end_time - event.timestamp,
+            )
+
+        except Exception:
+            logger.exception("exception forwarding event to assistant; assistant_id: %s", self._assistant_id)
+
+    def _stop_idle_workers(self) -> None:
+        current_task = asyncio.current_task()
+        for worker in self._workers:
+            if worker is not current_task:
+                worker.cancel()
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.gather(*self._workers, return_exceptions=True)
+
+        metrics.assistant_event_queue_depth.dec(sum(len(queue) for queue in self._pending.values()))
+        self._pending.clear()
+
+
+class AssistantEventForwarder:
+    """
+    Queues events for delivery to assistants, with a bounded queue per assistant conversation and a pool of
+    workers per assistant, so that a slow assistant does not delay its other conversations. Pools are removed
+    once they have been idle for idle_seconds, or when their assistant is removed.
+    """
+
+    def __init__(
+        self,
+        forward: ForwardEvent,
+        concurrency: int,
+        max_queue_size: int,
+        overflow_policy: AssistantEventOverflowPolicy,
+        idle_seconds: float,
+    ) -> None:
+        self._forward = forward
+        self._concurrency = concurrency
+        self._max_queue_size = max_queue_size
+        self._overflow_policy: AssistantEventOverflowPolicy = overflow_policy
+        self._idle_seconds = idle_seconds
+        self._pools: dict[uuid.UUID, _AssistantWorkerPool] = {}
+
+    @property
+    def pool_count(self) -> int:
+        """
+        The number of assistants with a live worker pool.
+        """
+        return len(self._pools)
+
+    def enqueue(self, assistant_id: uuid.UUID, event: ConversationEvent) -> bool:
+        """
+        Queues the event for forwarding to the assistant. Returns False if the event was rejected because the
+        queue for the conversation is full.
+        """
+        pool = self._pools.get(assistant_id)
+        if pool is None:
+            pool = _AssistantWorkerPool(
+                assistant_id=assistant_id,
+                forward=self._forward,
+                concurrency=self._concurrency,
+                max_queue_size=self._max_queue_size,
+                overflow_policy=self._overflow_policy,
+                idle_seconds=self._idle_seconds,
+                on_idle=self._remove_idle_pool,
+            )
+            self._pools[assistant_id] = pool
+            logger.debug(
+                "started assistant event worker pool; assistant_id: %s, pools: %d", assistant_id, len(self._pools)
+            )
+
+        return pool.enqueue(event)
+
+    def _remove_idle_pool(self, pool: _AssistantWorkerPool) -> None:
+        if self._pools.get(pool.assistant_id) is pool:
+            del self._pools[pool.assistant_id]
+            logger.debug("stopped idle assistant event worker pool; assistant_id: %s", pool.assistant_id)
+
+    async def remove(self, assistant_id: uuid.UUID) -> None:
+        """
+        Stops forwarding events to the assistant, discarding any that are queued.
+        """
+        pool = self._pools.pop(assistant_id, None)
+        if pool is not None:
+            await pool.stop()
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[None]:
+        try:
+            yield
+
+        finally:
+            pools = list(self._pools.values())
+            self._pools.clear()
+            await asyncio.gather(*(pool.stop() for pool in pools))
@@ -0,0 +1,44 @@
+import uuid
+from typing import Awaitable, Callable, Sequence
+
+import cachetools
+
+from . import metrics
+
+LoadRecipients = Callable[[uuid.UUID], Awaitable[Sequence[uuid.UUID]]]
+
+
+class AssistantRecipientCache:
+    """
+    Caches, per conversation, the ids of the assistants that events are forwarded to: the active assistant
+    participants whose assistant service is online.
+
+    Entries are invalidated when a participant is created or updated, which includes an assistant service going
+    online or offline, and expire after the ttl as a backstop for changes that are not announced by an event.
+    """
+
+    def __init__(self, max_conversations: int, ttl_seconds: float) -> None:
+        self._recipients = cachetools.TTLCache[uuid.UUID, tuple[uuid.UUID, ...]](
+            maxsize=max_conversations, ttl=ttl_seconds
+        )
+        self._generation = 0
+
+    async def get(self, conversation_id: uuid.UUID, load: LoadRecipients) -> Sequence[uuid.UUID]:
+        recipients = self._recipients.get(conversation_id)
+        if recipients is not None:
+            metrics.assistant_recipient_cache_requests_total.labels(result="hit").inc()
+            return recipients
+
+        metrics.assistant_recipient_cache_requests_total.labels(result="miss").inc()
+
+        generation = self._generation
+        recipients = tuple(await load(conversation_id))
+        # a result loaded while an invalidation happened may predate the change, so is not cached
+        if generation == self._generation:
+            self._recipients[conversation_id] = recipients
+
+        return recipients
+
+    def invalidate(self, conversation_id: uuid.UUID) -> None:
+        self._generation += 1
+        self._recipients.pop(conversation_id, None)
@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
 from pydantic import Field, HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -6,15 +6,41 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from .files import StorageSettings
 from .logging_config import LoggingSettings
 
+AssistantEventOverflowPolicy = Literal["coalesce", "drop_oldest", "reject"]
+
 
 class DBSettings(BaseSettings):
     url: str = "sqlite:///.data/workbench.db"
     echosql: bool = False
     postgresql_ssl_mode: str = "require"
     postgresql_pool_size: int = 10
+    # connections opened beyond the pool size under load, and closed when returned
+    postgresql_max_overflow: int = 10
+    postgresql_pool_timeout_seconds: float = 30.0
+    # connections older than this are replaced when checked out; -1 disables recycling
+    postgresql_pool_recycle_seconds: int = -1
+    # statements running longer than this are cancelled by the server; 0 disables the timeout
+    postgresql_statement_timeout_seconds: float = 0
+    # the defaults suit a single-node deployment: WAL lets readers proceed while a write is in progress, and
+    # synchronous=NORMAL is durable in WAL mode except against power loss
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_seconds: float = 5.0
     alembic_config_path: str = "./alembic.ini"
 
 
+class EventBusSettings(BaseSettings):
+    # "memory" delivers events only to SSE clients connected to this process; "postgresql" uses LISTEN/NOTIFY on
+    # the configured postgresql database so that every replica of the service delivers events to its own clients
+    type: Literal["memory", "postgresql"] = "memory"
+    postgresql_channel: str = "workbench_conversation_events"
+    postgresql_reconnect_delay_seconds: float = 2.0
+    postgresql_keepalive_interval_seconds: float = 30.0
+    postgresql_publish_pool_size: int = 2
+    # chunked payloads that are not complete within the timeout are discarded
+    postgresql_partial_payload_timeout_seconds: float = 30.0
+
+
 class ApiKeySettings(BaseSettings):
     key_vault_url: HttpUrl | None = None
 
@@ -26,6 +52,9 @@ class ApiKeySettings(BaseSettings):
 class AuthSettings(BaseSettings):
     allowed_jwt_algorithms: set[str] = {"RS256"}
     allowed_app_id: str = "22cb77c3-ca98-4a26-b4db-ac4dcecba690"
+    # decoded tokens are cached, so that each token is decoded once rather than on every request
+    token_cache_max_size: int = 10_000
+    token_cache_ttl_seconds: float = 10 * 60
 
 
 class AssistantIdentifiers(BaseSettings):
@@ -41,10 +70,67 @@ class WebServiceSettings(BaseSettings):
 
     assistant_api_key: ApiKeySettings = ApiKeySettings()
 
-    anonymous_paths: list[str] = ["/", "/docs", "/openapi.json"]
+    # /metrics is scraped by prometheus, which does not authenticate
+    anonymous_paths: list[str] = ["/", "/docs", "/openapi.json", "/metrics"]
 
     assistant_service_online_check_interval_seconds: float = 10.0
 
+    # idle SSE connections are sent a heartbeat comment at this interval, to keep proxies from closing them
+    sse_heartbeat_interval_seconds: int = 15
+
+    # recent events are kept per conversation so that reconnecting SSE clients can resume from their Last-Event-ID;
+    # max_events bounds the events buffered across all conversations
+    conversation_event_buffer_size: int = 100
+    conversation_event_buffer_max_events: int = 20_000
+    conversation_event_buffer_ttl_seconds: float = 10 * 60
+
+    # events are forwarded to each assistant by a pool of workers, one event at a time per conversation; when the
+    # queue for a conversation is full, "coalesce" replaces a queued event that the new event supersedes (falling
+    # back to dropping the oldest), "drop_oldest" drops the oldest queued event and "reject" drops the new event;
+    # the workers for an assistant are stopped once no events have been queued for it for idle_seconds
+    assistant_event_forwarding_concurrency: int = 4
+    assistant_event_forwarding_idle_seconds: float = 5 * 60
+    assistant_event_queue_max_size: int = 1_000
+    assistant_event_queue_overflow_policy: AssistantEventOverflowPolicy = "coalesce"
+
+    # the assistants that receive each conversation's events are cached, and invalidated by participant events;
+    # the ttl bounds how long changes made without an event, or by another replica, can go unnoticed
+    assistant_recipient_cache_max_conversations: int = 10_000
+    assistant_recipient_cache_ttl_seconds: float = 60.0
+
+    # the api key name of each assistant service is cached for authenticating assistant requests, and invalidated
+    # when registrations change; the ttl bounds how long changes made by another replica can go unnoticed
+    assistant_api_key_name_cache_max_size: int = 1_000
+    assistant_api_key_name_cache_ttl_seconds: float = 60.0
+
+    # users are notified of changes to their conversations at most once per conversation per window, and the
+    # users participating in each conversation are cached, and invalidated by participant events
+    user_event_coalesce_window_seconds: float = 0.25
+    user_recipient_cache_max_conversations: int = 10_000
+    user_recipient_cache_ttl_seconds: float = 60.0
+
+    # conversations are retitled once their user messages have stopped arriving for this long
+    conversation_retitle_debounce_seconds: float = 2.0
+
+    # imported messages, debug entries, participants and files are inserted this many rows per statement
+    import_batch_size: int = 500
+
+    # consecutive reads in a conversation batch request are performed concurrently, up to this many at a time
+    conversation_batch_read_concurrency: int = 4
+
+    # the message history is read from the newest message this many messages at a time, until the token budget is
+    # reached
+    message_history_batch_size: int = 100
+
+    # messages whose tokens were not counted when they were created, including those created before token counts
+    # were stored, are counted at startup and then at this interval, this many messages per batch
+    message_token_count_interval_seconds: float = 60 * 60
+    message_token_count_batch_size: int = 500
+
+    # file blobs are shared by file versions, and deleted by a sweep at this interval once they are unreferenced in
+    # two consecutive sweeps
+    file_blob_sweep_interval_seconds: float = 60 * 60
+
     azure_openai_endpoint: Annotated[str, Field(validation_alias="azure_openai_endpoint")] = ""
     azure_openai_deployment: Annotated[str, Field(validation_alias="azure_openai_deployment")] = "gpt-4o-mini"
     azure_openai_model: Annotated[str, Field(validation_alias="azure_openai_model")] = "gpt-4o-mini"
@@ -68,6 +154,7 @@ class Settings(BaseSettings):
     )
 
     db: DBSettings = DBSettings()
+    event_bus: EventBusSettings = EventBusSettings()
     storage: StorageSettings = StorageSettings()
     logging: LoggingSettings = LoggingSettings()
     service: WebServiceSettings = WebServiceSettings()
@@ -2,13 +2,11 @@ import asyncio
 import datetime
 import io
 import logging
-import pathlib
 import re
 import shutil
-import tempfile
 import uuid
 import zipfile
-from typing import IO, AsyncContextManager, Awaitable, BinaryIO, Callable, NamedTuple
+from typing import IO, AsyncContextManager, AsyncIterator, Awaitable, BinaryIO, Callable, NamedTuple
 
 import httpx
 from pydantic import BaseModel, ConfigDict, ValidationError
@@ -22,6 +20,7 @@ from semantic_workbench_api_model.assistant_model import (
     StateResponseModel,
 )
 from semantic_workbench_api_model.assistant_service_client import (
+    AssistantClient,
     AssistantError,
 )
 from semantic_workbench_api_model.workbench_model import (
@@ -35,8 +34,9 @@ from semantic_workbench_api_model.workbench_model import (
     NewConversation,
     UpdateAssistant,
 )
-from sqlalchemy.orm import joinedload
-from sqlmodel import col, select
+from sqlalchemy import Uuid, bindparam
+from sqlalchemy.orm import aliased, joinedload
+from sqlmodel import and_, col, func, insert, literal, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import auth, db, files, query, settings
@@ -51,7 +51,7 @@ logger = logging.getLogger(__name__)
 
 ExportResult = NamedTuple(
     "ExportResult",
-    [("file_path", str), ("content_type", str), ("filename", str), ("cleanup", Callable[[], None])],
+    [("stream", AsyncIterator[bytes]), ("content_type", str), ("filename", str)],
 )
 
 
@@ -155,12 +155,17 @@ class AssistantController:
         session: AsyncSession,
         assistant: db.Assistant,
         conversation_id: uuid.UUID,
-    ) -> None:
+    ) -> list[ConversationEventQueueItem]:
+        """
+        Deactivates the assistant's participant, returning the events to notify once the change is committed.
+        """
         try:
             await self.disconnect_assistant_from_conversation(conversation_id=conversation_id, assistant=assistant)
         except AssistantError:
             logger.error("error disconnecting assistant", exc_info=True)
 
+        events: list[ConversationEventQueueItem] = []
+
         for participant in await session.exec(
             select(db.AssistantParticipant)
             .where(
@@ -176,7 +181,7 @@ class AssistantController:
             participants = await participant_.get_conversation_participants(
                 session=session, conversation_id=conversation_id, include_inactive=True
             )
-            await self._notify_event(
+            events.append(
                 ConversationEventQueueItem(
                     event=participant_.participant_event(
                         event_type=ConversationEventType.participant_updated,
@@ -190,6 +195,7 @@ class AssistantController:
             )
 
         await session.flush()
+        return events
 
     async def disconnect_assistant_from_conversation(self, conversation_id: uuid.UUID, assistant: db.Assistant) -> None:
         await (await self._client_pool.assistant_client(assistant)).delete_conversation(conversation_id=conversation_id)
@@ -363,11 +369,14 @@ class AssistantController:
                 )
             ).all()
 
+            events: list[ConversationEventQueueItem] = []
             for conversation in conversations:
-                await self._remove_assistant_from_conversation(
-                    session=session,
-                    assistant=assistant,
-                    conversation_id=conversation.conversation_id,
+                events.extend(
+                    await self._remove_assistant_from_conversation(
+                        session=session,
+                        assistant=assistant,
+                        conversation_id=conversation.conversation_id,
+                    )
                 )
 
             try:
@@ -381,6 +390,9 @@ class AssistantController:
             await session.delete(assistant)
             await session.commit()
 
+        for event in events:
+            await self._notify_event(event)
+
     async def get_assistants(
         self,
         user_principal: auth.UserPrincipal,
@@ -657,102 +669,116 @@ class AssistantController:
                 f"assistant_{export_file_name}_{datetime.datetime.now(datetime.UTC).strftime('%Y%m%d%H%M%S')}"
             )
 
-            return await self._export(
-                session=session,
-                export_filename_prefix=export_file_name,
-                conversation_ids=conversation_ids,
-                assistant_ids=set((assistant_id,)),
-            )
+        return ExportResult(
+            stream=self._export(conversation_ids=conversation_ids, assistant_ids=set((assistant_id,))),
+            content_type="application/zip",
+            filename=export_file_name + ".zip",
+        )
 
     async def _export(
         self,
         conversation_ids: set[uuid.UUID],
         assistant_ids: set[uuid.UUID],
-        session: AsyncSession,
-        export_filename_prefix: str,
-    ) -> ExportResult:
-        temp_dir_path = pathlib.Path(tempfile.mkdtemp())
+    ) -> AsyncIterator[bytes]:
+        """
+        Streams an export as a zip archive, which is written as it is sent, without temporary files.
+        """
+        zip_writer = export_import.ZipStreamWriter()
 
-        # write all files to a temporary directory
-        export_dir_path = temp_dir_path / "export"
-        export_dir_path.mkdir()
+        # sessions are only held while reading from the database, not while the export is sent or while assistants
+        # export their data
 
         # export records from database
-        with (export_dir_path / AssistantController.EXPORT_WORKBENCH_FILENAME).open("+wb") as workbench_file:
-            async for file_bytes in export_import.export_file(
+        async for data in zip_writer.write_stream(
+            AssistantController.EXPORT_WORKBENCH_FILENAME,
+            export_import.export_file(
                 conversation_ids=conversation_ids,
                 assistant_ids=assistant_ids,
-                session=session,
-            ):
-                workbench_file.write(file_bytes)
+                get_session=self._get_session,
+            ),
+        ):
+            yield data
 
-        # export files from storage
+        # export files from storage, named by the hash of their storage_filename
         for conversation_id in conversation_ids:
             source_dir = self._file_storage.path_for(namespace=str(conversation_id), filename="")
             if not source_dir.is_dir():
                 continue
 
-            conversation_dir = export_dir_path / "files" / str(conversation_id)
-            conversation_dir.mkdir(parents=True)
+            for source_path in sorted(source_dir.iterdir()):
+                async for data in zip_writer.write_file(f"files/{conversation_id}/{source_path.name}", source_path):
+                    yield data
 
-            await asyncio.to_thread(shutil.copytree, src=source_dir, dst=conversation_dir, dirs_exist_ok=True)
+        async with self._get_session() as session:
+            blob_versions = (
+                await session.exec(
+                    select(db.File.conversation_id, db.FileVersion.storage_filename, db.FileVersion.content_hash)
+                    .join(db.FileVersion)
+                    .where(col(db.File.conversation_id).in_(conversation_ids))
+                    .where(col(db.FileVersion.content_hash).is_not(None))
+                )
+            ).all()
+
+        for conversation_id, storage_filename, content_hash in blob_versions:
+            if content_hash is None:
+                continue
+
+            file_name = self._file_storage.path_for(str(conversation_id), storage_filename).name
+            async for data in zip_writer.write_file(
+                f"files/{conversation_id}/{file_name}", self._file_storage.blob_path(content_hash)
+            ):
+                yield data
 
-        # enumerate assistants
-        assistants = await session.exec(select(db.Assistant).where(col(db.Assistant.assistant_id).in_(assistant_ids)))
+        # enumerate assistants and their conversations
+        async with self._get_session() as session:
+            assistants = (
+                await session.exec(select(db.Assistant).where(col(db.Assistant.assistant_id).in_(assistant_ids)))
+            ).all()
+
+            assistant_conversation_ids: dict[uuid.UUID, list[uuid.UUID]] = {}
+            for assistant_id, conversation_id in await session.exec(
+                select(db.AssistantParticipant.assistant_id, db.AssistantParticipant.conversation_id)
+                .where(col(db.AssistantParticipant.assistant_id).in_(assistant_ids))
+                .where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids))
+            ):
+                assistant_conversation_ids.setdefault(assistant_id, []).append(conversation_id)
 
         for assistant in assistants:
             assistant_client = await self._client_pool.assistant_client(assistant)
 
             # export assistant data
-            assistant_dir = export_dir_path / "assistants" / str(assistant.assistant_id)
-            assistant_dir.mkdir(parents=True)
-
-            with (assistant_dir / AssistantController.EXPORT_ASSISTANT_DATA_FILENAME).open("wb") as assistant_file:
+            async def assistant_data(assistant_client: AssistantClient) -> AsyncIterator[bytes]:
                 async with assistant_client.get_exported_data() as response:
                     async for chunk in response:
-                        assistant_file.write(chunk)
-
-            # enumerate assistant conversations
-            assistant_participants = await session.exec(
-                select(db.AssistantParticipant)
-                .where(db.AssistantParticipant.assistant_id == assistant.assistant_id)
-                .where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids))
-            )
+                        yield chunk
 
-            for assistant_participant in assistant_participants:
-                conversation_dir = assistant_dir / "conversations" / str(assistant_participant.conversation_id)
-                conversation_dir.mkdir(parents=True)
+            async for data in zip_writer.write_stream(
+                f"assistants/{assistant.assistant_id}/{AssistantController.EXPORT_ASSISTANT_DATA_FILENAME}",
+                assistant_data(assistant_client),
+            ):
+                yield data
 
+            for conversation_id in assistant_conversation_ids.get(assistant.assistant_id, []):
                 # export assistant conversation data
-                with (conversation_dir / AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME).open(
-                    "wb"
-                ) as conversation_file:
+                async def conversation_data(
+                    assistant_client: AssistantClient, conversation_id: uuid.UUID
+                ) -> AsyncIterator[bytes]:
                     async with assistant_client.get_exported_conversation_data(
-                        conversation_id=assistant_participant.conversation_id
+                        conversation_id=conversation_id
                     ) as response:
                         async for chunk in response:
-                            conversation_file.write(chunk)
-
-        # zip the export directory
-        zip_file_path = await asyncio.to_thread(
-            shutil.make_archive,
-            base_name=str(temp_dir_path / "zip"),
-            format="zip",
-            root_dir=export_dir_path,
-            base_dir="",
-            logger=logger,
-            verbose=True,
-        )
+                            yield chunk
 
-        def _cleanup() -> None:
-            shutil.rmtree(temp_dir_path, ignore_errors=True)
+                async for data in zip_writer.write_stream(
+                    (
+                        f"assistants/{assistant.assistant_id}/conversations/{conversation_id}"
+                        f"/{AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME}"
+                    ),
+                    conversation_data(assistant_client, conversation_id),
+                ):
+                    yield data
 
-        return ExportResult(
-            file_path=zip_file_path,
-            content_type="application/zip",
-            filename=export_filename_prefix + ".zip",
-            cleanup=_cleanup,
-        )
+        yield zip_writer.close()
 
     async def export_conversations(
         self,
@@ -783,14 +809,15 @@ class AssistantController:
                 ).unique()
             )
 
-            return await self._export(
-                session=session,
-                export_filename_prefix=(
-                    f"semantic_workbench_conversation_export_{datetime.datetime.now(datetime.UTC).strftime('%Y%m%d%H%M%S')}"
-                ),
-                conversation_ids=conversation_ids,
-                assistant_ids=assistant_ids,
-            )
+        export_file_name = (
+            f"semantic_workbench_conversation_export_{datetime.datetime.now(datetime.UTC).strftime('%Y%m%d%H%M%S')}"
+        )
+
+        return ExportResult(
+            stream=self._export(conversation_ids=conversation_ids, assistant_ids=assistant_ids),
+            content_type="application/zip",
+            filename=export_file_name + ".zip",
+        )
 
     async def import_conversations(
         self,
@@ -798,31 +825,49 @@ class AssistantController:
         user_principal: auth.UserPrincipal,
     ) -> ConversationImportResult:
         async with self._get_session() as session:
-            with tempfile.TemporaryDirectory() as extraction_dir:
-                extraction_path = pathlib.Path(extraction_dir)
+            # entries are read directly from the zip file, without extracting it
+            with zipfile.ZipFile(file=from_export, mode="r") as zip_file:
+                # exports created with shutil.make_archive name entries relative to "./"
+                entries = {info.filename.removeprefix("./"): info for info in zip_file.infolist() if not info.is_dir()}
 
-                # extract the zip file to a temporary directory
-                with zipfile.ZipFile(file=from_export, mode="r") as zip_file:
-                    await asyncio.to_thread(zip_file.extractall, path=extraction_path)
+                def open_entry(name: str) -> IO[bytes]:
+                    entry = entries.get(name)
+                    if entry is None:
+                        raise exceptions.InvalidArgumentError(detail=f"export is missing {name}")
+                    return zip_file.open(entry)
 
                 # import records into database
-                with (extraction_path / AssistantController.EXPORT_WORKBENCH_FILENAME).open("rb") as workbench_file:
+                with open_entry(AssistantController.EXPORT_WORKBENCH_FILENAME) as workbench_file:
                     import_result = await export_import.import_files(
                         session=session,
                         owner_id=user_principal.user_id,
                         files=[workbench_file],
+                        batch_size=settings.service.import_batch_size,
                     )
 
                 await session.commit()
 
-                # import files into storage
+                # import files into storage as blobs, which are shared with identical files
                 for old_conversation_id, new_conversation_id in import_result.conversation_id_old_to_new.items():
-                    files_path = extraction_path / "files" / str(old_conversation_id)
-                    if not files_path.is_dir():
-                        continue
+                    file_versions = await session.exec(
+                        select(db.FileVersion).join(db.File).where(db.File.conversation_id == new_conversation_id)
+                    )
+                    for file_version in file_versions:
+                        file_name = self._file_storage.path_for(
+                            str(new_conversation_id), file_version.storage_filename
+                        ).name
+                        entry_name = f"files/{old_conversation_id}/{file_name}"
+                        if entry_name not in entries:
+                            file_version.content_hash = None
+                            session.add(file_version)
+                            continue
+
+                        # the entry is decompressed as the blob is written, in a worker thread
+                        with open_entry(entry_name) as file:
+                            file_version.content_hash = await self._file_storage.write_blob(file)
+                        session.add(file_version)
 
-                    storage_path = self._file_storage.path_for(namespace=str(new_conversation_id), filename="")
-                    await asyncio.to_thread(shutil.copytree, src=files_path, dst=storage_path)
+                await session.commit()
 
                 try:
                     # enumerate assistants
@@ -846,12 +891,12 @@ class AssistantController:
                                 detail=f"assistant service id {assistant.assistant_service_id} is not valid"
                             )
 
-                        assistant_dir = extraction_path / "assistants" / str(old_assistant_id)
+                        assistant_dir = f"assistants/{old_assistant_id}"
 
                         if is_new:
                             # create the assistant from the assistant data file
-                            with (assistant_dir / AssistantController.EXPORT_ASSISTANT_DATA_FILENAME).open(
-                                "rb"
+                            with open_entry(
+                                f"{assistant_dir}/{AssistantController.EXPORT_ASSISTANT_DATA_FILENAME}"
                             ) as assistant_file:
                                 try:
                                     await self._put_assistant(
@@ -873,12 +918,12 @@ class AssistantController:
                                 )
                             ).one()
 
-                            conversation_dir = assistant_dir / "conversations" / str(old_conversation_id)
+                            conversation_dir = f"{assistant_dir}/conversations/{old_conversation_id}"
 
                             # create the conversation from the conversation data file
-                            with (
-                                conversation_dir / AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME
-                            ).open("rb") as conversation_file:
+                            with open_entry(
+                                f"{conversation_dir}/{AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME}"
+                            ) as conversation_file:
                                 try:
                                     await self.connect_assistant_to_conversation(
                                         conversation=new_conversation,
@@ -959,69 +1004,145 @@ class AssistantController:
             session.add(conversation)
             await session.flush()  # To generate new_conversation.conversation_id
 
-            # Copy messages from the original conversation
-            messages = await session.exec(
-                select(db.ConversationMessage)
-                .where(db.ConversationMessage.conversation_id == conversation_id)
-                .order_by(col(db.ConversationMessage.sequence))
-            )
-            message_id_old_to_new = {}
-            for message in messages:
-                new_message_id = uuid.uuid4()
-                message_id_old_to_new[message.message_id] = new_message_id
-                new_message = db.ConversationMessage(
-                    # Do not set 'sequence'; let the database assign it
-                    **message.model_dump(exclude={"message_id", "conversation_id", "sequence"}),
-                    message_id=new_message_id,
-                    conversation_id=conversation.conversation_id,
-                )
-                session.add(new_message)
+            # Copy messages, debug data, files and file versions with INSERT ... SELECT statements, so that their
+            # content is copied by the database rather than read into the service
+            conn = await session.connection()
 
-            # Copy message debug data from the original conversation
-            for old_message_id, new_message_id in message_id_old_to_new.items():
-                message_debugs = await session.exec(
-                    select(db.ConversationMessageDebug).where(db.ConversationMessageDebug.message_id == old_message_id)
+            # Map each original message id to a new message id, in sequence order
+            original_message_ids = (
+                await session.exec(
+                    select(db.ConversationMessage.message_id)
+                    .where(db.ConversationMessage.conversation_id == conversation_id)
+                    .order_by(col(db.ConversationMessage.sequence))
+                )
+            ).all()
+            message_id_mappings = [
+                {"original_message_id": message_id, "new_message_id": uuid.uuid4()}
+                for message_id in original_message_ids
+            ]
+
+            # Copy messages from the original conversation with their new ids; each message is inserted by its own
+            # statement, in sequence order, so that the database assigns new sequences in the original order
+            message_columns = [
+                col(db.ConversationMessage.created_datetime),
+                col(db.ConversationMessage.sender_participant_id),
+                col(db.ConversationMessage.sender_participant_role),
+                col(db.ConversationMessage.message_type),
+                col(db.ConversationMessage.content),
+                col(db.ConversationMessage.content_type),
+                col(db.ConversationMessage.meta_data),
+                col(db.ConversationMessage.filenames),
+                col(db.ConversationMessage.token_counts),
+            ]
+            if message_id_mappings:
+                await conn.execute(
+                    insert(db.ConversationMessage).from_select(
+                        [
+                            col(db.ConversationMessage.message_id),
+                            col(db.ConversationMessage.conversation_id),
+                            *message_columns,
+                        ],
+                        select(
+                            bindparam("new_message_id", type_=Uuid),
+                            literal(conversation.conversation_id),
+                            *message_columns,
+                        ).where(col(db.ConversationMessage.message_id) == bindparam("original_message_id")),
+                    ),
+                    message_id_mappings,
                 )
-                for debug in message_debugs:
-                    new_debug = db.ConversationMessageDebug(
-                        **debug.model_dump(exclude={"message_id"}),
-                        message_id=new_message_id,
-                    )
-                    session.add(new_debug)
 
-            # Copy File entries associated with the conversation
-            files = await session.exec(
-                select(db.File)
-                .where(db.File.conversation_id == original_conversation.conversation_id)
-                .order_by(col(db.File.created_datetime).asc())
+            await conn.execute(
+                insert(db.ConversationLatestMessage).from_select(
+                    [
+                        col(db.ConversationLatestMessage.conversation_id),
+                        col(db.ConversationLatestMessage.message_type),
+                        col(db.ConversationLatestMessage.latest_message_sequence),
+                    ],
+                    select(
+                        literal(conversation.conversation_id),
+                        col(db.ConversationMessage.message_type),
+                        func.max(db.ConversationMessage.sequence),
+                    )
+                    .where(db.ConversationMessage.conversation_id == conversation.conversation_id)
+                    .group_by(col(db.ConversationMessage.message_type)),
+                )
             )
 
-            file_id_old_to_new = {}
-            for file in files:
-                new_file_id = uuid.uuid4()
-                file_id_old_to_new[file.file_id] = new_file_id
-                new_file = db.File(
-                    **file.model_dump(exclude={"file_id", "conversation_id"}),
-                    file_id=new_file_id,
-                    conversation_id=conversation.conversation_id,
+            # Copy message debug data to the new ids of the messages that have it
+            debug_message_ids = set(
+                (
+                    await session.exec(
+                        select(db.ConversationMessageDebug.message_id)
+                        .join(
+                            db.ConversationMessage,
+                            col(db.ConversationMessage.message_id) == col(db.ConversationMessageDebug.message_id),
+                        )
+                        .where(db.ConversationMessage.conversation_id == conversation_id)
+                    )
+                ).all()
+            )
+            debug_message_id_mappings = [
+                mapping for mapping in message_id_mappings if mapping["original_message_id"] in debug_message_ids
+            ]
+            if debug_message_id_mappings:
+                await conn.execute(
+                    insert(db.ConversationMessageDebug).from_select(
+                        [col(db.ConversationMessageDebug.message_id), col(db.ConversationMessageDebug.data)],
+                        select(
+                            bindparam("new_message_id", type_=Uuid),
+                            col(db.ConversationMessageDebug.data),
+                        ).where(col(db.ConversationMessageDebug.message_id) == bindparam("original_message_id")),
+                    ),
+                    debug_message_id_mappings,
                 )
-                session.add(new_file)
-
-            # Copy FileVersion entries associated with the files
-            for old_file_id, new_file_id in file_id_old_to_new.items():
-                file_versions = await session.exec(
-                    select(db.FileVersion)
-                    .where(db.FileVersion.file_id == old_file_id)
-                    .order_by(col(db.FileVersion.version).asc())
+
+            # Copy File entries associated with the conversation, with new ids
+            file_columns = [
+                col(db.File.filename),
+                col(db.File.current_version),
+                col(db.File.created_datetime),
+            ]
+            await conn.execute(
+                insert(db.File).from_select(
+                    [col(db.File.file_id), col(db.File.conversation_id), *file_columns],
+                    select(query.random_uuid(), literal(conversation.conversation_id), *file_columns).where(
+                        db.File.conversation_id == original_conversation.conversation_id
+                    ),
                 )
-                for version in file_versions:
-                    new_version = db.FileVersion(
-                        **version.model_dump(exclude={"file_id"}),
-                        file_id=new_file_id,
+            )
+
+            # Copy FileVersion entries, pairing the original and new files by filename, which is unique in a
+            # conversation; versions stored as blobs share them with the original versions
+            original_file = aliased(db.File)
+            new_file = aliased(db.File)
+            version_columns = [
+                col(db.FileVersion.version),
+                col(db.FileVersion.participant_id),
+                col(db.FileVersion.participant_role),
+                col(db.FileVersion.created_datetime),
+                col(db.FileVersion.meta_data),
+                col(db.FileVersion.content_type),
+                col(db.FileVersion.file_size),
+                col(db.FileVersion.storage_filename),
+                col(db.FileVersion.content_hash),
+            ]
+            await conn.execute(
+                insert(db.FileVersion).from_select(
+                    [col(db.FileVersion.file_id), *version_columns],
+                    select(new_file.file_id, *version_columns)
+                    .join_from(db.FileVersion, original_file, col(db.FileVersion.file_id) == original_file.file_id)
+                    .join(
+                        new_file,
+                        and_(
+                            new_file.conversation_id == conversation.conversation_id,
+                            new_file.filename == original_file.filename,
+                        ),
                     )
-                    session.add(new_version)
+                    .where(original_file.conversation_id == original_conversation.conversation_id),
+                )
+            )
 
-            # Copy files associated with the conversation
+            # Copy files stored by storage_filename, which are not shared like blobs
             original_files_path = self._file_storage.path_for(
                 namespace=str(original_conversation.conversation_id), filename=""
             )
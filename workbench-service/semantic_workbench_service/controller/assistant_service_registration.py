@@ -3,6 +3,7 @@ import datetime
 import logging
 from typing import AsyncContextManager, Awaitable, Callable, Iterable
 
+import cachetools
 from semantic_workbench_api_model.assistant_model import ServiceInfoModel
 from semantic_workbench_api_model.assistant_service_client import AssistantError
 from semantic_workbench_api_model.workbench_model import (
@@ -40,6 +41,11 @@ class AssistantServiceRegistrationController:
         self._notify_event = notify_event
         self._api_key_store = api_key_store
         self._client_pool = client_pool
+        # api key names by assistant service id, so that authenticating assistant requests does not query the db
+        self._api_key_names = cachetools.TTLCache[str, str](
+            maxsize=settings.service.assistant_api_key_name_cache_max_size,
+            ttl=settings.service.assistant_api_key_name_cache_ttl_seconds,
+        )
 
     @property
     def _registration_is_secured(self) -> bool:
@@ -50,16 +56,20 @@ class AssistantServiceRegistrationController:
         if assistant_service_id == generated_key_name:
             return await self._api_key_store.get(generated_key_name)
 
-        async with self._get_session() as session:
-            api_key_name = (
-                await session.exec(
-                    select(db.AssistantServiceRegistration.api_key_name).where(
-                        db.AssistantServiceRegistration.assistant_service_id == assistant_service_id
-                    )
-                )
-            ).first()
+        api_key_name = self._api_key_names.get(assistant_service_id)
         if api_key_name is None:
-            return None
+            async with self._get_session() as session:
+                api_key_name = (
+                    await session.exec(
+                        select(db.AssistantServiceRegistration.api_key_name).where(
+                            db.AssistantServiceRegistration.assistant_service_id == assistant_service_id
+                        )
+                    )
+                ).first()
+            if api_key_name is None:
+                return None
+            self._api_key_names[assistant_service_id] = api_key_name
+
         return await self._api_key_store.get(api_key_name)
 
     async def create_registration(
@@ -99,6 +109,8 @@ class AssistantServiceRegistrationController:
 
             await session.commit()
 
+        self._api_key_names.pop(assistant_service_id, None)
+
         return convert.assistant_service_registration_from_db(
             registration, api_key=api_key, include_api_key_name=self._registration_is_secured
         )
@@ -363,6 +375,7 @@ class AssistantServiceRegistrationController:
             await session.delete(registration)
             await session.commit()
 
+            self._api_key_names.pop(assistant_service_id, None)
             await self._api_key_store.delete(registration.api_key_name)
 
     async def get_service_info(self, assistant_service_id: str) -> ServiceInfoModel:
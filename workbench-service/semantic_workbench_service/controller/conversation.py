@@ -1,9 +1,14 @@
+import asyncio
+import base64
+import contextlib
 import datetime
 import logging
 import uuid
+from contextlib import asynccontextmanager
 from typing import (
     Annotated,
     AsyncContextManager,
+    AsyncIterator,
     Awaitable,
     Callable,
     Iterable,
@@ -13,6 +18,7 @@ from typing import (
 
 import deepmerge
 import openai_client
+from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
 from pydantic import BaseModel, Field, HttpUrl
 from semantic_workbench_api_model.assistant_service_client import AssistantError
@@ -23,6 +29,7 @@ from semantic_workbench_api_model.workbench_model import (
     ConversationList,
     ConversationMessage,
     ConversationMessageDebug,
+    ConversationMessageHistory,
     ConversationMessageList,
     ConversationParticipant,
     ConversationParticipantList,
@@ -30,13 +37,15 @@ from semantic_workbench_api_model.workbench_model import (
     NewConversation,
     NewConversationMessage,
     ParticipantRole,
+    TokenEncoding,
     UpdateConversation,
     UpdateParticipant,
 )
-from sqlmodel import and_, col, or_, select
+from sqlalchemy import ColumnElement, bindparam, func
+from sqlmodel import and_, col, or_, select, update
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .. import auth, db, query, settings
+from .. import auth, db, query, settings, tokens
 from ..event import ConversationEventQueueItem
 from . import assistant, convert, exceptions
 from . import participant as participant_
@@ -74,6 +83,19 @@ class ConversationController:
         self._get_session = get_session
         self._notify_event = notify_event
         self._assistant_controller = assistant_controller
+        # the client used for retitling is created on first use, and shared by all retitles
+        self._title_client: AsyncOpenAI | None = None
+        self._title_client_lock = asyncio.Lock()
+        self._exit_stack = contextlib.AsyncExitStack()
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[None]:
+        try:
+            yield
+
+        finally:
+            self._title_client = None
+            await self._exit_stack.aclose()
 
     async def create_conversation(
         self,
@@ -766,7 +788,10 @@ class ConversationController:
         principal: auth.ActorPrincipal,
         conversation_id: uuid.UUID,
         new_message: NewConversationMessage,
-    ) -> tuple[ConversationMessage, Iterable]:
+    ) -> tuple[ConversationMessage, bool]:
+        """
+        Creates the message, returning it and whether the conversation is a candidate for retitling.
+        """
         async with self._get_session() as session:
             conversation = (
                 await session.exec(
@@ -820,6 +845,7 @@ class ConversationController:
                 content_type=new_message.content_type,
                 filenames=new_message.filenames or [],
                 meta_data=new_message.metadata or {},
+                token_counts=await asyncio.to_thread(tokens.try_count_tokens_by_encoding, new_message.content),
             )
             if new_message.id is not None:
                 message.message_id = new_message.id
@@ -836,16 +862,9 @@ class ConversationController:
             await session.commit()
             await session.refresh(message)
 
-            background_task: Iterable = ()
-            if self._conversation_candidate_for_retitling(
+            retitle = self._conversation_candidate_for_retitling(
                 conversation=conversation
-            ) and self._message_candidate_for_retitling(message=message):
-                background_task = (
-                    self._retitle_conversation,
-                    principal,
-                    conversation_id,
-                    message.sequence,
-                )
+            ) and self._message_candidate_for_retitling(message=message)
 
         message_response = convert.conversation_message_from_db(message, has_debug=bool(message_debug))
 
@@ -861,7 +880,7 @@ class ConversationController:
             )
         )
 
-        return message_response, background_task
+        return message_response, retitle
 
     def _message_candidate_for_retitling(self, message: db.ConversationMessage) -> bool:
         """Check if the message is a candidate for retitling the conversation."""
@@ -883,11 +902,24 @@ class ConversationController:
 
         return True
 
-    async def _retitle_conversation(
+    async def _get_title_client(self) -> AsyncOpenAI:
+        async with self._title_client_lock:
+            if self._title_client is None:
+                self._title_client = await self._exit_stack.enter_async_context(
+                    openai_client.create_client(
+                        openai_client.AzureOpenAIServiceConfig(
+                            auth_config=openai_client.AzureOpenAIAzureIdentityAuthConfig(),
+                            azure_openai_deployment=settings.service.azure_openai_deployment,
+                            azure_openai_endpoint=HttpUrl(settings.service.azure_openai_endpoint),
+                        ),
+                    )
+                )
+            return self._title_client
+
+    async def retitle_conversation(
         self,
         principal: auth.ActorPrincipal,
         conversation_id: uuid.UUID,
-        latest_message_sequence: int,
     ) -> None:
         """Retitle the conversation based on the most recent messages."""
 
@@ -906,6 +938,13 @@ class ConversationController:
             return
 
         async with self._get_session() as session:
+            conversation = (
+                await session.exec(select(db.Conversation).where(db.Conversation.conversation_id == conversation_id))
+            ).one_or_none()
+            # skip the message lookup once the conversation can no longer be retitled
+            if conversation is None or not self._conversation_candidate_for_retitling(conversation):
+                return
+
             # Retrieve the most recent messages
             messages = list(
                 (
@@ -913,7 +952,6 @@ class ConversationController:
                         select(db.ConversationMessage)
                         .where(
                             db.ConversationMessage.conversation_id == conversation_id,
-                            db.ConversationMessage.sequence <= latest_message_sequence,
                             db.ConversationMessage.message_type == MessageType.chat.value,
                         )
                         .order_by(col(db.ConversationMessage.sequence).desc())
@@ -943,32 +981,26 @@ class ConversationController:
 
         # Call the LLM to get a new title
         try:
-            async with openai_client.create_client(
-                openai_client.AzureOpenAIServiceConfig(
-                    auth_config=openai_client.AzureOpenAIAzureIdentityAuthConfig(),
-                    azure_openai_deployment=settings.service.azure_openai_deployment,
-                    azure_openai_endpoint=HttpUrl(settings.service.azure_openai_endpoint),
-                ),
-            ) as client:
-                response = await client.beta.chat.completions.parse(
-                    messages=[
-                        *completion_messages,
-                        {
-                            "role": "developer",
-                            "content": ("The current conversation title is: {conversation.title}"),
-                        },
-                    ],
-                    model=settings.service.azure_openai_model,
-                    # the model's description also contains instructions
-                    response_format=ConversationTitleResponse,
-                )
+            client = await self._get_title_client()
+            response = await client.beta.chat.completions.parse(
+                messages=[
+                    *completion_messages,
+                    {
+                        "role": "developer",
+                        "content": f"The current conversation title is: {conversation.title}",
+                    },
+                ],
+                model=settings.service.azure_openai_model,
+                # the model's description also contains instructions
+                response_format=ConversationTitleResponse,
+            )
 
-                if not response.choices:
-                    raise RuntimeError("No choices in azure openai response")
+            if not response.choices:
+                raise RuntimeError("No choices in azure openai response")
 
-                result = response.choices[0].message.parsed
-                if result is None:
-                    raise RuntimeError("No parsed result in azure openai response")
+            result = response.choices[0].message.parsed
+            if result is None:
+                raise RuntimeError("No parsed result in azure openai response")
 
         except Exception:
             logger.exception("Failed to retitle conversation %s", conversation_id)
@@ -1067,8 +1099,11 @@ class ConversationController:
         message_types: list[MessageType] | None = None,
         before: uuid.UUID | None = None,
         after: uuid.UUID | None = None,
+        cursor: str | None = None,
         limit: int = 100,
     ) -> ConversationMessageList:
+        message_cursor = _decode_message_cursor(cursor) if cursor is not None else None
+
         async with self._get_session() as session:
             conversation = (
                 await session.exec(
@@ -1121,14 +1156,191 @@ class ConversationController:
                 if boundary is not None:
                     select_query = select_query.where(db.ConversationMessage.sequence > boundary.sequence)
 
-            messages = list(
-                (
-                    await session.exec(select_query.order_by(col(db.ConversationMessage.sequence).desc()).limit(limit))
+            match message_cursor:
+                case ("after", cursor_sequence):
+                    # the messages that immediately follow the cursor
+                    messages = list(
+                        (
+                            await session.exec(
+                                select_query.where(col(db.ConversationMessage.sequence) > cursor_sequence)
+                                .order_by(col(db.ConversationMessage.sequence))
+                                .limit(limit)
+                            )
+                        ).all()
+                    )
+                    has_preceding = (
+                        await session.exec(
+                            select_query.where(col(db.ConversationMessage.sequence) <= cursor_sequence).limit(1)
+                        )
+                    ).first() is not None
+                    first_sequence = messages[0][0].sequence if messages else cursor_sequence + 1
+
+                case _:
+                    if message_cursor is not None:
+                        # a "before" cursor
+                        select_query = select_query.where(col(db.ConversationMessage.sequence) < message_cursor[1])
+
+                    # the latest messages, with one extra message read to tell whether there is a preceding page
+                    messages = list(
+                        (
+                            await session.exec(
+                                select_query.order_by(col(db.ConversationMessage.sequence).desc()).limit(limit + 1)
+                            )
+                        ).all()
+                    )
+                    has_preceding = len(messages) > limit
+                    messages = messages[:limit]
+                    messages.reverse()
+                    first_sequence = messages[0][0].sequence if messages else None
+
+            prev_cursor = None
+            if has_preceding and first_sequence is not None:
+                prev_cursor = _encode_message_cursor("before", first_sequence)
+
+            # when there are no messages after the cursor, the same cursor is used to poll for new ones
+            next_cursor = cursor if message_cursor is not None and message_cursor[0] == "after" else None
+            if messages:
+                next_cursor = _encode_message_cursor("after", messages[-1][0].sequence)
+
+            return convert.conversation_message_list_from_db(messages, prev_cursor=prev_cursor, next_cursor=next_cursor)
+
+    async def get_message_history(
+        self,
+        principal: auth.ActorPrincipal,
+        conversation_id: uuid.UUID,
+        token_limit: int | None,
+        encoding: TokenEncoding,
+        message_types: list[MessageType] | None = None,
+    ) -> ConversationMessageHistory:
+        async with self._get_session() as session:
+            conversation = (
+                await session.exec(
+                    query.select_conversations_for(principal=principal, include_observer=True).where(
+                        db.Conversation.conversation_id == conversation_id
+                    )
+                )
+            ).one_or_none()
+            if conversation is None:
+                raise exceptions.NotFoundError()
+
+            message_filters: list[ColumnElement[bool]] = [
+                col(db.ConversationMessage.conversation_id) == conversation_id
+            ]
+            if message_types is not None:
+                message_filters.append(col(db.ConversationMessage.message_type).in_([t.value for t in message_types]))
+
+            # the total is summed by the database, so that only the messages that fit the budget are read
+            total_token_count, oldest_sequence = (
+                await session.exec(
+                    select(
+                        func.coalesce(func.sum(_message_token_count(encoding)), 0),
+                        func.min(db.ConversationMessage.sequence),
+                    ).where(*message_filters)
+                )
+            ).one()
+
+            token_count = total_token_count
+            if token_limit is not None and total_token_count > token_limit:
+                # include the newest messages until one does not fit, reading them in batches from the newest
+                token_count = 0
+                oldest_sequence = None
+                before_sequence: int | None = None
+                is_budget_reached = False
+                while not is_budget_reached:
+                    token_count_query = select(db.ConversationMessage.sequence, _message_token_count(encoding)).where(
+                        *message_filters
+                    )
+                    if before_sequence is not None:
+                        token_count_query = token_count_query.where(db.ConversationMessage.sequence < before_sequence)
+
+                    token_counts = (
+                        await session.exec(
+                            token_count_query.order_by(col(db.ConversationMessage.sequence).desc()).limit(
+                                settings.service.message_history_batch_size
+                            )
+                        )
+                    ).all()
+                    if not token_counts:
+                        break
+
+                    for sequence, message_token_count in token_counts:
+                        if token_count + message_token_count > token_limit:
+                            is_budget_reached = True
+                            break
+
+                        token_count += message_token_count
+                        oldest_sequence = sequence
+
+                    before_sequence = token_counts[-1][0]
+
+            messages = []
+            if oldest_sequence is not None:
+                messages = (
+                    await session.exec(
+                        query.select_conversation_message_projections_for(principal=principal)
+                        .where(*message_filters, db.ConversationMessage.sequence >= oldest_sequence)
+                        .order_by(col(db.ConversationMessage.sequence))
+                    )
+                ).all()
+
+            return ConversationMessageHistory(
+                messages=convert.conversation_message_list_from_db(messages).messages,
+                token_count=token_count,
+                total_token_count=total_token_count,
+            )
+
+    async def count_message_tokens(self, batch_size: int) -> int:
+        """
+        Stores the token counts of the messages that do not have them, which are those created before token counts
+        were stored and those whose tokens could not be counted when they were created. Messages are counted
+        batch_size at a time, each batch in its own session. Stops early if tokens cannot be counted, leaving the
+        rest for the next run. Returns the number of messages counted.
+        """
+        counted = 0
+        after_sequence = 0
+        while True:
+            async with self._get_session() as session:
+                messages = (
+                    await session.exec(
+                        select(db.ConversationMessage.sequence, db.ConversationMessage.content)
+                        .where(
+                            col(db.ConversationMessage.token_counts).is_(None),
+                            db.ConversationMessage.sequence > after_sequence,
+                        )
+                        .order_by(col(db.ConversationMessage.sequence))
+                        .limit(batch_size)
+                    )
                 ).all()
+
+            if not messages:
+                return counted
+
+            token_counts = await asyncio.to_thread(
+                lambda: [tokens.try_count_tokens_by_encoding(content) for _, content in messages]
             )
-            messages.reverse()
+            updates = [
+                {"message_sequence": sequence, "message_token_counts": message_token_counts}
+                for (sequence, _), message_token_counts in zip(messages, token_counts)
+                if message_token_counts is not None
+            ]
+
+            if updates:
+                async with self._get_session() as session:
+                    conn = await session.connection()
+                    await conn.execute(
+                        update(db.ConversationMessage)
+                        .where(col(db.ConversationMessage.sequence) == bindparam("message_sequence"))
+                        .values(token_counts=bindparam("message_token_counts")),
+                        updates,
+                    )
+                    await session.commit()
 
-            return convert.conversation_message_list_from_db(messages)
+                counted += len(updates)
+
+            if len(updates) < len(messages):
+                return counted
+
+            after_sequence = messages[-1][0]
 
     async def delete_message(
         self,
@@ -1172,3 +1384,41 @@ class ConversationController:
                     ),
                 )
             )
+
+
+def _content_token_count(encoding: TokenEncoding) -> ColumnElement[int]:
+    """
+    The stored token count of a message's content for the encoding, or an estimate from the length of the content
+    for messages whose tokens have not been counted yet.
+    """
+    return func.coalesce(
+        col(db.ConversationMessage.token_counts)[encoding.value].as_integer(),
+        (func.length(db.ConversationMessage.content) + (tokens.CHARACTERS_PER_TOKEN - 1))
+        // tokens.CHARACTERS_PER_TOKEN,
+    )
+
+
+def _message_token_count(encoding: TokenEncoding) -> ColumnElement[int]:
+    """
+    An estimate of the tokens a message uses in a chat completion, which is the tokens of its content plus those
+    used by the chat completion format for each message. Assistants format messages before sending them to a
+    model, so the estimate is not exact.
+    """
+    return _content_token_count(encoding) + tokens.TOKENS_PER_MESSAGE
+
+
+def _encode_message_cursor(direction: Literal["before", "after"], sequence: int) -> str:
+    return base64.urlsafe_b64encode(f"{direction}:{sequence}".encode()).decode().rstrip("=")
+
+
+def _decode_message_cursor(cursor: str) -> tuple[Literal["before", "after"], int]:
+    try:
+        direction, sequence = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        if direction == "before":
+            return "before", int(sequence)
+        if direction == "after":
+            return "after", int(sequence)
+    except ValueError:
+        pass
+
+    raise exceptions.InvalidArgumentError(detail="invalid cursor")
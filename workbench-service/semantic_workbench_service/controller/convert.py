@@ -25,6 +25,7 @@ from semantic_workbench_api_model.workbench_model import (
     MessageSender,
     MessageType,
     ParticipantRole,
+    TokenEncoding,
     User,
     UserList,
 )
@@ -254,13 +255,20 @@ def conversation_message_from_db(model: db.ConversationMessage, has_debug: bool)
         metadata=model.meta_data,
         filenames=model.filenames,
         has_debug_data=has_debug,
+        token_counts={TokenEncoding(encoding): count for encoding, count in (model.token_counts or {}).items()},
     )
 
 
 def conversation_message_list_from_db(
     models: Iterable[tuple[db.ConversationMessage, bool]],
+    prev_cursor: str | None = None,
+    next_cursor: str | None = None,
 ) -> ConversationMessageList:
-    return ConversationMessageList(messages=[conversation_message_from_db(m, debug) for m, debug in models])
+    return ConversationMessageList(
+        messages=[conversation_message_from_db(m, debug) for m, debug in models],
+        prev_cursor=prev_cursor,
+        next_cursor=next_cursor,
+    )
 
 
 def conversation_message_debug_from_db(model: db.ConversationMessageDebug) -> ConversationMessageDebug:
@@ -1,18 +1,40 @@
+import asyncio
 import collections
 import datetime
+import io
+import logging
+import pathlib
 import re
-import tempfile
 import uuid
+import zipfile
 from operator import or_
-from typing import IO, Any, AsyncGenerator, Generator, Iterable, Iterator
-
+from typing import (
+    IO,
+    Any,
+    AsyncContextManager,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Iterable,
+)
+
+import sqlalchemy
 from attr import dataclass
 from pydantic import BaseModel
-from sqlalchemy import ScalarResult, func
-from sqlmodel import SQLModel, col, select
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel, col, insert, select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import Select
+
+from .. import db, tokens
 
-from .. import db
+logger = logging.getLogger(__name__)
+
+_EXPORT_BATCH_SIZE = 100
+_CHUNK_SIZE = 100 * 1_024
 
 
 class _Record(BaseModel):
@@ -25,96 +47,164 @@ def _model_record(model: SQLModel) -> _Record:
     return _Record(type=model.__class__.__name__, data=data)
 
 
-def _lines_from(records: Iterator[_Record]) -> Generator[bytes, None, None]:
-    for record in records:
-        yield (record.model_dump_json() + "\n").encode("utf-8")
+def _line_from(record: _Record) -> bytes:
+    return (record.model_dump_json() + "\n").encode("utf-8")
+
+
+def _export_statements(conversation_ids: set[uuid.UUID], assistant_ids: set[uuid.UUID]) -> list[Select]:
+    """
+    Returns the statements for the exported records. Each selects the record, followed by the columns that order the
+    records and identify the last record of a batch.
+    """
+    return [
+        Select(db.Assistant, col(db.Assistant.assistant_id)).where(col(db.Assistant.assistant_id).in_(assistant_ids)),
+        Select(db.Conversation, col(db.Conversation.conversation_id)).where(
+            col(db.Conversation.conversation_id).in_(conversation_ids)
+        ),
+        Select(
+            db.ConversationMessage,
+            col(db.ConversationMessage.conversation_id),
+            col(db.ConversationMessage.sequence),
+        ).where(col(db.ConversationMessage.conversation_id).in_(conversation_ids)),
+        Select(
+            db.ConversationMessageDebug,
+            col(db.ConversationMessage.conversation_id),
+            col(db.ConversationMessage.sequence),
+        )
+        .join(db.ConversationMessage)
+        .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids)),
+        Select(
+            db.UserParticipant,
+            col(db.UserParticipant.conversation_id),
+            col(db.UserParticipant.joined_datetime),
+            col(db.UserParticipant.user_id),
+        ).where(col(db.UserParticipant.conversation_id).in_(conversation_ids)),
+        Select(
+            db.AssistantParticipant,
+            col(db.AssistantParticipant.conversation_id),
+            col(db.AssistantParticipant.joined_datetime),
+            col(db.AssistantParticipant.assistant_id),
+        ).where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids)),
+        Select(
+            db.File,
+            col(db.File.conversation_id),
+            col(db.File.created_datetime),
+            col(db.File.file_id),
+        ).where(col(db.File.conversation_id).in_(conversation_ids)),
+        Select(
+            db.FileVersion,
+            col(db.File.conversation_id),
+            col(db.File.created_datetime),
+            col(db.File.file_id),
+            col(db.FileVersion.version),
+        )
+        .join(db.File)
+        .where(col(db.File.conversation_id).in_(conversation_ids)),
+    ]
 
 
 async def export_file(
     conversation_ids: set[uuid.UUID],
     assistant_ids: set[uuid.UUID],
-    session: AsyncSession,
+    get_session: Callable[[], AsyncContextManager[AsyncSession]],
 ) -> AsyncGenerator[bytes, None]:
-    assistants = await session.exec(
-        select(db.Assistant)
-        .where(col(db.Assistant.assistant_id).in_(assistant_ids))
-        .order_by(col(db.Assistant.assistant_id).asc())
-    )
+    # records are read in batches, each with its own session, so that large exports are not held in memory and no
+    # database connection is held while the export is sent; each batch continues after the last record of the previous
+    for statement in _export_statements(conversation_ids=conversation_ids, assistant_ids=assistant_ids):
+        # the selected columns start with the record's columns
+        keys = list(statement.selected_columns)[-(len(statement.column_descriptions) - 1) :]
+        last_keys: tuple[Any, ...] | None = None
+        while True:
+            batch_statement = statement.order_by(*keys).limit(_EXPORT_BATCH_SIZE)
+            if last_keys is not None:
+                batch_statement = batch_statement.where(
+                    sqlalchemy.tuple_(*keys)
+                    > sqlalchemy.tuple_(*(sqlalchemy.literal(value, key.type) for key, value in zip(keys, last_keys)))
+                )
 
-    conversations = await session.exec(
-        select(db.Conversation)
-        .where(col(db.Conversation.conversation_id).in_(conversation_ids))
-        .order_by(col(db.Conversation.conversation_id).asc())
-    )
+            async with get_session() as session:
+                rows = (await session.exec(batch_statement)).all()
 
-    files = await session.exec(
-        select(db.File)
-        .where(col(db.File.conversation_id).in_(conversation_ids))
-        .order_by(col(db.File.conversation_id).asc())
-        .order_by(col(db.File.created_datetime).asc())
-    )
+            for row in rows:
+                yield _line_from(_model_record(row[0]))
 
-    file_versions = await session.exec(
-        select(db.FileVersion)
-        .join(db.File)
-        .where(col(db.File.conversation_id).in_(conversation_ids))
-        .order_by(col(db.File.conversation_id).asc())
-        .order_by(col(db.File.created_datetime).asc())
-        .order_by(col(db.FileVersion.version).asc())
-    )
+            if len(rows) < _EXPORT_BATCH_SIZE:
+                break
 
-    messages = await session.exec(
-        select(db.ConversationMessage)
-        .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids))
-        .order_by(col(db.ConversationMessage.conversation_id).asc())
-        .order_by(col(db.ConversationMessage.sequence).asc())
-    )
+            last_keys = tuple(rows[-1][1:])
 
-    message_debugs = await session.exec(
-        select(db.ConversationMessageDebug)
-        .join(db.ConversationMessage)
-        .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids))
-        .order_by(col(db.ConversationMessage.conversation_id).asc())
-        .order_by(col(db.ConversationMessage.sequence).asc())
-    )
 
-    user_participants = await session.exec(
-        select(db.UserParticipant)
-        .where(col(db.UserParticipant.conversation_id).in_(conversation_ids))
-        .order_by(col(db.UserParticipant.conversation_id).asc())
-        .order_by(col(db.UserParticipant.joined_datetime).asc())
-    )
+class _WriteBuffer(io.RawIOBase):
+    """
+    A write-only, unseekable stream that holds what is written until it is taken.
+    """
 
-    assistant_participants = await session.exec(
-        select(db.AssistantParticipant)
-        .where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids))
-        .order_by(col(db.AssistantParticipant.conversation_id).asc())
-        .order_by(col(db.AssistantParticipant.joined_datetime).asc())
-    )
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
 
-    def _records(*sources: ScalarResult) -> Generator[_Record, None, None]:
-        for source in sources:
-            for record in source:
-                yield _model_record(record)
-
-    with tempfile.TemporaryFile() as f:
-        f.writelines(
-            _lines_from(
-                _records(
-                    assistants,
-                    conversations,
-                    messages,
-                    message_debugs,
-                    user_participants,
-                    assistant_participants,
-                    files,
-                    file_versions,
-                )
-            )
-        )
-        f.seek(0)
-        for line in iter(lambda: f.readline(), b""):
-            yield line
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        self._chunks.append(bytes(b))
+        return len(self._chunks[-1])
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStreamWriter:
+    """
+    Writes a zip archive without a file, handing out the archive's bytes as entries are written, so that the archive
+    can be streamed to a client while it is created.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = _WriteBuffer()
+        # zipfile writes data descriptors instead of seeking back to entry headers when the stream is unseekable
+        self._zip_file = zipfile.ZipFile(self._buffer, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+    async def write_stream(self, name: str, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        """
+        Writes an entry from the chunks, yielding the archive's bytes as they are written. The chunks are compressed
+        in a worker thread.
+        """
+        with self._zip_file.open(name, mode="w", force_zip64=True) as entry:
+            async for chunk in chunks:
+                await asyncio.to_thread(entry.write, chunk)
+                if data := self._buffer.take():
+                    yield data
+
+        if data := self._buffer.take():
+            yield data
+
+    async def write_file(self, name: str, path: pathlib.Path) -> AsyncIterator[bytes]:
+        """
+        Writes an entry from the file, yielding the archive's bytes as they are written. The file is read and
+        compressed in a worker thread.
+        """
+
+        def copy_chunk(source: IO[bytes], entry: IO[bytes]) -> bool:
+            chunk = source.read(_CHUNK_SIZE)
+            entry.write(chunk)
+            return len(chunk) > 0
+
+        with path.open("rb") as source, self._zip_file.open(name, mode="w", force_zip64=True) as entry:
+            while await asyncio.to_thread(copy_chunk, source, entry):
+                if data := self._buffer.take():
+                    yield data
+
+        if data := self._buffer.take():
+            yield data
+
+    def close(self) -> bytes:
+        """
+        Completes the archive, returning its remaining bytes.
+        """
+        self._zip_file.close()
+        return self._buffer.take()
 
 
 @dataclass
@@ -126,7 +216,153 @@ class ImportResult:
     file_id_old_to_new: dict[uuid.UUID, uuid.UUID]
 
 
-async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[bytes]]) -> ImportResult:
+def _row_from(model: SQLModel) -> dict[str, Any]:
+    # bulk insert parameters are keyed by column, which differs from the attribute for some fields (ie. meta_data)
+    mapper = sqlalchemy.inspect(model.__class__)
+    return {attribute.columns[0].key: getattr(model, attribute.key) for attribute in mapper.column_attrs}
+
+
+class _BulkInserter:
+    """
+    Buffers rows of the bulk-inserted models, inserting them with one multi-row statement per model and batch, in
+    dependency order, so that foreign keys are satisfied.
+    """
+
+    # models in the order they must be inserted
+    models: ClassVar[tuple[type[SQLModel], ...]] = (
+        db.UserParticipant,
+        db.AssistantParticipant,
+        db.ConversationMessage,
+        db.ConversationMessageDebug,
+        db.File,
+        db.FileVersion,
+    )
+
+    def __init__(self, session: AsyncSession, batch_size: int) -> None:
+        self._session = session
+        self._batch_size = batch_size
+        self._pending: dict[type[SQLModel], list[SQLModel]] = {model: [] for model in self.models}
+        self.inserted_counts: dict[str, int] = collections.defaultdict(int)
+
+    async def add(self, model: SQLModel) -> None:
+        pending = self._pending[model.__class__]
+        pending.append(model)
+        if len(pending) >= self._batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        for model_type, pending in self._pending.items():
+            if not pending:
+                continue
+
+            models = pending.copy()
+            pending.clear()
+            await self._insert(model_type, models)
+
+            self.inserted_counts[model_type.__name__] += len(models)
+            logger.info(
+                "imported %d %s records; total imported: %s",
+                len(models),
+                model_type.__name__,
+                dict(self.inserted_counts),
+            )
+
+    async def _insert(self, model_type: type[SQLModel], models: list[SQLModel]) -> None:
+        conn = await self._session.connection()
+
+        match model_type:
+            case db.UserParticipant:
+                await self._insert_user_participants(models)
+
+            case db.AssistantParticipant:
+                await self._insert_assistant_participants(models)
+
+            case db.ConversationMessage:
+                # sequences are assigned by the database, in the order of the rows
+                await conn.execute(
+                    insert(db.ConversationMessage),
+                    [{key: value for key, value in _row_from(model).items() if key != "sequence"} for model in models],
+                )
+
+                # the latest message pointers are maintained on flush for ORM inserts, but not for bulk inserts
+                conversation_ids = {
+                    model.conversation_id for model in models if isinstance(model, db.ConversationMessage)
+                }
+                latest_sequences = await conn.execute(
+                    select(
+                        col(db.ConversationMessage.conversation_id),
+                        col(db.ConversationMessage.message_type),
+                        func.max(db.ConversationMessage.sequence),
+                    )
+                    .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids))
+                    .group_by(col(db.ConversationMessage.conversation_id), col(db.ConversationMessage.message_type))
+                )
+                await conn.run_sync(
+                    db.upsert_latest_message_sequences,
+                    {
+                        (conversation_id, message_type): sequence
+                        for conversation_id, message_type, sequence in latest_sequences
+                    },
+                )
+
+            case _:
+                await conn.execute(insert(model_type), [_row_from(model) for model in models])
+
+    async def _insert_user_participants(self, models: list[SQLModel]) -> None:
+        conn = await self._session.connection()
+        participants = [model for model in models if isinstance(model, db.UserParticipant)]
+        user_ids = {participant.user_id for participant in participants}
+
+        await conn.execute(
+            postgresql.insert(db.User)
+            .values([
+                {"user_id": user_id, "name": "unknown imported user", "service_user": False} for user_id in user_ids
+            ])
+            .on_conflict_do_nothing()
+        )
+
+        # match the participants to the related users, as UserParticipant.on_insert does for ORM inserts
+        users = {
+            user.user_id: user
+            for user in await self._session.exec(select(db.User).where(col(db.User.user_id).in_(user_ids)))
+        }
+        for participant in participants:
+            user = users[participant.user_id]
+            participant.name = user.name
+            participant.image = user.image
+            participant.service_user = user.service_user
+
+        await conn.execute(insert(db.UserParticipant), [_row_from(participant) for participant in participants])
+
+    async def _insert_assistant_participants(self, models: list[SQLModel]) -> None:
+        conn = await self._session.connection()
+        participants = [model for model in models if isinstance(model, db.AssistantParticipant)]
+        assistant_ids = {participant.assistant_id for participant in participants}
+
+        # match the participants to the related assistants, as AssistantParticipant.on_insert does for ORM inserts
+        assistants = {
+            assistant.assistant_id: assistant
+            for assistant in await self._session.exec(
+                select(db.Assistant).where(col(db.Assistant.assistant_id).in_(assistant_ids))
+            )
+        }
+        for participant in participants:
+            assistant = assistants.get(participant.assistant_id)
+            if assistant is None:
+                raise RuntimeError(f"assistant_id {participant.assistant_id} is not found")
+            participant.name = assistant.name
+            participant.image = assistant.image
+
+        await conn.execute(insert(db.AssistantParticipant), [_row_from(participant) for participant in participants])
+
+
+async def import_files(
+    session: AsyncSession, owner_id: str, files: Iterable[IO[bytes]], batch_size: int
+) -> ImportResult:
+    """
+    Imports the records from the files. Assistants and conversations are inserted one at a time, as their names are
+    de-duplicated against existing rows; all other records are bulk inserted, batch_size rows at a time.
+    """
     result = ImportResult(
         assistant_id_old_to_new={},
         conversation_id_old_to_new={},
@@ -134,6 +370,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
         assistant_conversation_old_ids=collections.defaultdict(set),
         file_id_old_to_new={},
     )
+    bulk_inserter = _BulkInserter(session=session, batch_size=batch_size)
 
     async def _process_record(record: _Record) -> None:
         match record.type:
@@ -188,6 +425,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                     assistant.name = f"{assistant.name} ({existing_count})"
 
                 session.add(assistant)
+                await session.flush()
 
             case db.AssistantParticipant.__name__:
                 participant = db.AssistantParticipant.model_validate(record.data)
@@ -200,7 +438,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                 assistant_id, _ = result.assistant_id_old_to_new.get(participant.assistant_id, (None, None))
                 if assistant_id is not None:
                     participant.assistant_id = assistant_id
-                session.add(participant)
+                await bulk_inserter.add(participant)
 
             case db.UserParticipant.__name__:
                 participant = db.UserParticipant.model_validate(record.data)
@@ -211,12 +449,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                 # user participants should always be inactive on import
                 participant.active_participant = False
                 participant.status = None
-
-                await db.insert_if_not_exists(
-                    session, db.User(user_id=participant.user_id, name="unknown imported user", service_user=False)
-                )
-
-                session.add(participant)
+                await bulk_inserter.add(participant)
 
             case db.Conversation.__name__:
                 conversation = db.Conversation.model_validate(record.data)
@@ -251,6 +484,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                     conversation.title = f"{conversation.title} ({existing_count})"
 
                 session.add(conversation)
+                await session.flush()
 
             case db.ConversationMessage.__name__:
                 record.data.pop("sequence", None)
@@ -268,7 +502,11 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                     )
                     if assistant_id is not None:
                         message.sender_participant_id = str(assistant_id)
-                session.add(message)
+
+                # exports from before token counts were stored do not include them
+                if message.token_counts is None:
+                    message.token_counts = await asyncio.to_thread(tokens.try_count_tokens_by_encoding, message.content)
+                await bulk_inserter.add(message)
 
             case db.ConversationMessageDebug.__name__:
                 message_debug = db.ConversationMessageDebug.model_validate(record.data)
@@ -276,7 +514,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                 if message_id is None:
                     raise RuntimeError(f"message_id {message_debug.message_id} is not found")
                 message_debug.message_id = message_id
-                session.add(message_debug)
+                await bulk_inserter.add(message_debug)
 
             case db.File.__name__:
                 file = db.File.model_validate(record.data)
@@ -287,7 +525,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                 if conversation_id is None:
                     raise RuntimeError(f"conversation_id {file.conversation_id} is not found")
                 file.conversation_id = conversation_id
-                session.add(file)
+                await bulk_inserter.add(file)
 
             case db.FileVersion.__name__:
                 file_version = db.FileVersion.model_validate(record.data)
@@ -302,13 +540,14 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                     )
                     if assistant_id is not None:
                         file_version.participant_id = str(assistant_id)
-                session.add(file_version)
+                await bulk_inserter.add(file_version)
 
     for file in files:
         for line in iter(lambda: file.readline(), b""):
             record = _Record.model_validate_json(line.decode("utf-8"))
             await _process_record(record)
-            await session.flush()
+
+    await bulk_inserter.flush()
 
     # ensure the owner is a participant in all conversations
     for _, conversation_id in result.conversation_id_old_to_new.items():
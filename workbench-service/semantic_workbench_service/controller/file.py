@@ -1,11 +1,12 @@
+import logging
+import pathlib
+import time
 import uuid
 from typing import (
     Any,
     AsyncContextManager,
     Awaitable,
     Callable,
-    Generator,
-    Iterable,
     NamedTuple,
 )
 
@@ -23,8 +24,14 @@ from .. import auth, db, files, query
 from ..event import ConversationEventQueueItem
 from . import convert, exceptions
 
+logger = logging.getLogger(__name__)
+
+# the number of blob hashes looked up per query
+_BLOB_REFERENCE_BATCH_SIZE = 500
+
 DownloadFileResult = NamedTuple(
-    "DownloadFileResult", [("filename", str), ("content_type", str), ("stream", Iterable[bytes])]
+    "DownloadFileResult",
+    [("filename", str), ("content_type", str), ("file_path", pathlib.Path), ("etag", str)],
 )
 
 
@@ -38,6 +45,8 @@ class FileController:
         self._get_session = get_session
         self._notify_event = notify_event
         self._file_storage = file_storage
+        # the time of the previous blob sweep, and the blobs that were not referenced then
+        self._unreferenced_blobs: tuple[float, set[str]] | None = None
 
     async def upload_files(
         self,
@@ -111,14 +120,10 @@ class FileController:
                     file_size=upload_file.size or 0,
                     meta_data=file_metadata.get(file_record.filename, {}),
                     storage_filename=f"{file_record.file_id.hex}_{file_record.current_version}",
+                    content_hash=await self._file_storage.write_blob(upload_file.file),
                 )
                 file_record_and_versions.append((file_record, new_version))
 
-                self._file_storage.write_file(
-                    namespace=str(conversation_id),
-                    filename=new_version.storage_filename,
-                    content=upload_file.file,
-                )
                 session.add(file_record)
                 session.add(new_version)
 
@@ -302,20 +307,17 @@ class FileController:
 
             file_record, version_record = file_records
 
-        def generator_wrapper() -> Generator[bytes, Any, None]:
-            with self._file_storage.read_file(
-                namespace=str(conversation_id),
-                filename=version_record.storage_filename,
-            ) as file:
-                for chunk in iter(lambda: file.read(100 * 1_024), b""):
-                    yield chunk
+        file_path = self._file_version_path(conversation_id=conversation_id, version_record=version_record)
+        if not file_path.is_file():
+            raise exceptions.NotFoundError()
 
         filename = file_record.filename.split("/")[-1]
 
         return DownloadFileResult(
             filename=filename,
             content_type=version_record.content_type,
-            stream=generator_wrapper(),
+            file_path=file_path,
+            etag=f'"{file_record.file_id.hex}-{version_record.version}"',
         )
 
     async def delete_file(
@@ -356,10 +358,12 @@ class FileController:
             ).all()
 
             for version_record in version_records:
-                self._file_storage.delete_file(
-                    namespace=str(conversation_id),
-                    filename=version_record.storage_filename,
-                )
+                # blobs are shared by versions with the same content, so are deleted by delete_unreferenced_blobs
+                if version_record.content_hash is None:
+                    await self._file_storage.delete_file(
+                        namespace=str(conversation_id),
+                        filename=version_record.storage_filename,
+                    )
                 await session.delete(version_record)
             await session.commit()
 
@@ -377,3 +381,53 @@ class FileController:
                 ),
             )
         )
+
+    async def delete_unreferenced_blobs(self) -> int:
+        """
+        Deletes the blobs that are not referenced by any file version, returning the number deleted.
+
+        A blob is only deleted once it was unreferenced in the previous sweep too, and has not been written since.
+        Uploads write a blob before committing the version that references it, and duplicates copy the references
+        of versions that may be deleted meanwhile, so a blob that is unreferenced in one sweep may not stay so.
+        """
+        sweep_time = time.time()
+        content_hashes = await self._file_storage.list_blobs()
+
+        referenced: set[str] = set()
+        async with self._get_session() as session:
+            for index in range(0, len(content_hashes), _BLOB_REFERENCE_BATCH_SIZE):
+                batch = content_hashes[index : index + _BLOB_REFERENCE_BATCH_SIZE]
+                referenced.update(
+                    content_hash
+                    for content_hash in (
+                        await session.exec(
+                            select(db.FileVersion.content_hash)
+                            .distinct()
+                            .where(col(db.FileVersion.content_hash).in_(batch))
+                        )
+                    ).all()
+                    if content_hash is not None
+                )
+
+        unreferenced = set(content_hashes) - referenced
+
+        deleted = 0
+        if self._unreferenced_blobs is not None:
+            previous_sweep_time, previously_unreferenced = self._unreferenced_blobs
+            for content_hash in unreferenced & previously_unreferenced:
+                if await self._file_storage.delete_blob(content_hash, modified_before=previous_sweep_time):
+                    unreferenced.discard(content_hash)
+                    deleted += 1
+
+        self._unreferenced_blobs = (sweep_time, unreferenced)
+
+        if deleted:
+            logger.info("deleted unreferenced file blobs; count: %d", deleted)
+
+        return deleted
+
+    def _file_version_path(self, conversation_id: uuid.UUID, version_record: db.FileVersion) -> pathlib.Path:
+        if version_record.content_hash is not None:
+            return self._file_storage.blob_path(version_record.content_hash)
+
+        return self._file_storage.path_for(namespace=str(conversation_id), filename=version_record.storage_filename)
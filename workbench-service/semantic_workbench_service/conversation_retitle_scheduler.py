@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from . import auth
+
+logger = logging.getLogger(__name__)
+
+RetitleConversation = Callable[[auth.ActorPrincipal, uuid.UUID], Awaitable[None]]
+
+
+class ConversationRetitleScheduler:
+    """
+    Retitles conversations in the background, debounced per conversation: a conversation is retitled once its
+    messages have stopped arriving for the debounce period, so that a burst of messages results in one retitle.
+    Messages that arrive while a conversation is being retitled result in one more retitle afterwards.
+    """
+
+    def __init__(self, retitle: RetitleConversation, debounce_seconds: float) -> None:
+        self._retitle = retitle
+        self._debounce_seconds = debounce_seconds
+        # the principal of the latest request, per conversation that is waiting to be retitled
+        self._pending: dict[uuid.UUID, auth.ActorPrincipal] = {}
+        # the debounce timer per conversation that is waiting to be retitled
+        self._timers: dict[uuid.UUID, asyncio.TimerHandle] = {}
+        self._tasks: dict[uuid.UUID, asyncio.Task] = {}
+
+    def schedule(self, principal: auth.ActorPrincipal, conversation_id: uuid.UUID) -> None:
+        self._pending[conversation_id] = principal
+
+        timer = self._timers.pop(conversation_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        # a conversation that is being retitled is scheduled again when its retitle completes
+        if conversation_id in self._tasks:
+            return
+
+        self._timers[conversation_id] = asyncio.get_running_loop().call_later(
+            self._debounce_seconds, self._start, conversation_id
+        )
+
+    def _start(self, conversation_id: uuid.UUID) -> None:
+        self._timers.pop(conversation_id, None)
+        principal = self._pending.pop(conversation_id, None)
+        if principal is None:
+            return
+
+        task = asyncio.create_task(self._run(principal, conversation_id), name="retitle_conversation")
+        self._tasks[conversation_id] = task
+
+    async def _run(self, principal: auth.ActorPrincipal, conversation_id: uuid.UUID) -> None:
+        try:
+            await self._retitle(principal, conversation_id)
+
+        except Exception:
+            logger.exception("exception retitling conversation; conversation_id: %s", conversation_id)
+
+        finally:
+            del self._tasks[conversation_id]
+            pending_principal = self._pending.get(conversation_id)
+            if pending_principal is not None:
+                self.schedule(pending_principal, conversation_id)
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[None]:
+        try:
+            yield
+
+        finally:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._pending.clear()
+
+            tasks = list(self._tasks.values())
+            for task in tasks:
+                task.cancel()
+
+            with contextlib.suppress(asyncio.CancelledError):
+                await asyncio.gather(*tasks, return_exceptions=True)
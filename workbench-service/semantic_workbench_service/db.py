@@ -1,6 +1,8 @@
 import datetime
+import functools
 import logging
 import pathlib
+import time
 import uuid
 from contextlib import asynccontextmanager
 from typing import Annotated, Any, AsyncIterator
@@ -11,11 +13,13 @@ import sqlalchemy.event
 import sqlalchemy.orm
 import sqlalchemy.orm.attributes
 from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
-from sqlmodel import Field, Relationship, Session, SQLModel, select
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel import Field, Relationship, Session, SQLModel, col, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from . import service_user_principals
+from . import metrics, service_user_principals
 from .config import DBSettings
 
 # Download DB Browser for SQLite to view the database
@@ -296,10 +300,45 @@ class ConversationMessage(SQLModel, table=True):
     content_type: str
     meta_data: dict[str, Any] = Field(sa_column=sqlalchemy.Column("metadata", sqlalchemy.JSON), default={})
     filenames: list[str] = Field(sa_column=sqlalchemy.Column(sqlalchemy.JSON), default=[])
+    # token counts of the content, keyed by encoding name; None for messages created before token counts were stored
+    token_counts: dict[str, int] | None = Field(
+        sa_column=sqlalchemy.Column(sqlalchemy.JSON(none_as_null=True), nullable=True), default=None
+    )
 
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_conversation: Conversation = Relationship()
 
+    __table_args__ = (
+        sqlalchemy.Index("ix_conversationmessage_conversation_id_sequence", "conversation_id", "sequence"),
+        sqlalchemy.Index(
+            "ix_conversationmessage_conversation_id_message_type_sequence",
+            "conversation_id",
+            "message_type",
+            "sequence",
+        ),
+    )
+
+
+class ConversationLatestMessage(SQLModel, table=True):
+    """
+    The sequence of the latest message of each type in each conversation, maintained as messages are inserted and
+    deleted, so that listing conversations does not need to aggregate over all messages.
+    """
+
+    conversation_id: uuid.UUID = Field(
+        sa_column=sqlalchemy.Column(
+            sqlalchemy.ForeignKey(
+                "conversation.conversation_id",
+                name="fk_conversationlatestmessage_conversation_id_conversation",
+                ondelete="CASCADE",
+            ),
+            primary_key=True,
+            nullable=False,
+        ),
+    )
+    message_type: str = Field(primary_key=True)
+    latest_message_sequence: int
+
 
 class ConversationMessageDebug(SQLModel, table=True):
     message_id: uuid.UUID = Field(
@@ -364,6 +403,8 @@ class FileVersion(SQLModel, table=True):
     content_type: str
     file_size: int
     storage_filename: str
+    # sha-256 hash of the content blob in file storage; None for versions stored by storage_filename
+    content_hash: str | None = Field(default=None, index=True)
 
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_file: File = Relationship()
@@ -383,15 +424,42 @@ def ensure_async_driver_scheme(url: str) -> str:
     return url.replace("sqlite://", "sqlite+aiosqlite://").replace("postgresql://", "postgresql+asyncpg://")
 
 
-@sqlalchemy.event.listens_for(sqlalchemy.Pool, "connect")
-def set_sqlite_pragma(
+def _set_sqlite_pragmas(
     dbapi_connection: sqlalchemy.engine.interfaces.DBAPIConnection,
     _: sqlalchemy.pool.ConnectionPoolEntry,
+    settings: DBSettings,
 ) -> None:
-    if hasattr(sqlalchemy.dialects, "sqlite"):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA journal_mode=WAL")
-        cursor.close()
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_seconds * 1_000)}")
+    cursor.close()
+
+
+class _MeteredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long each checkout waits for a connection.
+    """
+
+    def _do_get(self) -> sqlalchemy.pool.ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.db_pool_checkout_wait_seconds.observe(time.perf_counter() - start)
+
+
+def _set_pool_metrics(pool: sqlalchemy.Pool | None) -> None:
+    if not isinstance(pool, sqlalchemy.QueuePool):
+        metrics.db_pool_size.set_function(lambda: 0)
+        metrics.db_pool_checked_out_connections.set_function(lambda: 0)
+        metrics.db_pool_overflow_connections.set_function(lambda: 0)
+        return
+
+    metrics.db_pool_size.set_function(pool.size)
+    metrics.db_pool_checked_out_connections.set_function(pool.checkedout)
+    # overflow is negative while the pool has not yet opened pool_size connections
+    metrics.db_pool_overflow_connections.set_function(lambda: max(pool.overflow(), 0))
 
 
 @asynccontextmanager
@@ -414,19 +482,35 @@ async def create_engine(settings: DBSettings) -> AsyncIterator[AsyncEngine]:
 
     kw_args: dict = {"echo": settings.echosql, "future": True}
     if is_postgres:
+        connect_args: dict = {
+            "ssl": settings.postgresql_ssl_mode,
+        }
+        if settings.postgresql_statement_timeout_seconds > 0:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(int(settings.postgresql_statement_timeout_seconds * 1_000)),
+            }
+
         kw_args.update({
-            "connect_args": {
-                "ssl": settings.postgresql_ssl_mode,
-            },
+            "connect_args": connect_args,
+            "poolclass": _MeteredQueuePool,
             "pool_pre_ping": True,
             "pool_size": settings.postgresql_pool_size,
+            "max_overflow": settings.postgresql_max_overflow,
+            "pool_timeout": settings.postgresql_pool_timeout_seconds,
+            "pool_recycle": settings.postgresql_pool_recycle_seconds,
         })
 
     engine = create_async_engine(db_url, **kw_args)
+    if is_sqlite:
+        set_pragmas = functools.partial(_set_sqlite_pragmas, settings=settings)
+        sqlalchemy.event.listen(engine.sync_engine, "connect", set_pragmas)
+
+    _set_pool_metrics(engine.sync_engine.pool)
 
     try:
         yield engine
     finally:
+        _set_pool_metrics(None)
         await engine.dispose()
 
 
@@ -443,6 +527,82 @@ def _session_before_flush(session: Session, flush_context, instances) -> None:
         obj.on_insert(session)
 
 
+@sqlalchemy.event.listens_for(Session, "after_flush")
+def _session_after_flush(session: Session, flush_context) -> None:
+    # sequences are assigned during the flush, so the latest message pointers are maintained after it
+    inserted = [obj for obj in session.new if isinstance(obj, ConversationMessage)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, ConversationMessage)]
+    if not inserted and not deleted:
+        return
+
+    connection = session.connection()
+
+    latest_sequences: dict[tuple[uuid.UUID, str], int] = {}
+    for message in inserted:
+        key = (message.conversation_id, message.message_type)
+        latest_sequences[key] = max(latest_sequences.get(key, message.sequence), message.sequence)
+    if latest_sequences:
+        upsert_latest_message_sequences(connection, latest_sequences)
+
+    for conversation_id, message_type in {(message.conversation_id, message.message_type) for message in deleted}:
+        refresh_latest_message_sequence(connection, conversation_id, message_type)
+
+
+def upsert_latest_message_sequences(
+    connection: sqlalchemy.Connection, latest_sequences: dict[tuple[uuid.UUID, str], int]
+) -> None:
+    """
+    Advances the latest message pointers to the provided sequences, keyed by conversation id and message type.
+    """
+    insert = sqlite_insert if connection.dialect.name == "sqlite" else postgresql.insert
+    statement = insert(ConversationLatestMessage).values([
+        {"conversation_id": conversation_id, "message_type": message_type, "latest_message_sequence": sequence}
+        for (conversation_id, message_type), sequence in latest_sequences.items()
+    ])
+    latest_message_sequence = col(ConversationLatestMessage.latest_message_sequence)
+    statement = statement.on_conflict_do_update(
+        index_elements=["conversation_id", "message_type"],
+        set_={
+            "latest_message_sequence": sqlalchemy.case(
+                (
+                    statement.excluded.latest_message_sequence > latest_message_sequence,
+                    statement.excluded.latest_message_sequence,
+                ),
+                else_=latest_message_sequence,
+            )
+        },
+    )
+    connection.execute(statement)
+
+
+def refresh_latest_message_sequence(
+    connection: sqlalchemy.Connection, conversation_id: uuid.UUID, message_type: str
+) -> None:
+    """
+    Resets the latest message pointer for the conversation and message type from the remaining messages.
+    """
+    latest_sequence = connection.execute(
+        select(sqlalchemy.func.max(ConversationMessage.sequence)).where(
+            ConversationMessage.conversation_id == conversation_id,
+            ConversationMessage.message_type == message_type,
+        )
+    ).scalar()
+
+    pointer_clause = sqlalchemy.and_(
+        col(ConversationLatestMessage.conversation_id) == conversation_id,
+        col(ConversationLatestMessage.message_type) == message_type,
+    )
+    if latest_sequence is None:
+        connection.execute(sqlalchemy.delete(ConversationLatestMessage).where(pointer_clause))
+        return
+
+    connection.execute(
+        sqlalchemy.update(ConversationLatestMessage)
+        .where(pointer_clause)
+        .values(latest_message_sequence=latest_sequence)
+    )
+
+
 async def bootstrap_db(engine: AsyncEngine, settings: DBSettings) -> None:
     logger.info("bootstrapping database")
     await _ensure_schema(engine=engine, settings=settings)
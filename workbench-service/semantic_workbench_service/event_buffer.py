@@ -0,0 +1,46 @@
+import collections
+import uuid
+
+import cachetools
+from semantic_workbench_api_model.workbench_model import ConversationEvent
+
+
+class ConversationEventBuffer:
+    """
+    Keeps a bounded ring buffer of the most recent events for each conversation, so that SSE clients that
+    reconnect with a Last-Event-ID can be sent only the events they missed. Conversations without new events
+    are evicted after the ttl, and the least recently updated conversations are evicted when the total number
+    of buffered events exceeds max_events.
+    """
+
+    def __init__(self, max_events_per_conversation: int, max_events: int, ttl_seconds: float) -> None:
+        self._max_events_per_conversation = min(max_events_per_conversation, max_events)
+        self._buffers = cachetools.TTLCache[uuid.UUID, collections.deque[ConversationEvent]](
+            maxsize=max_events, ttl=ttl_seconds, getsizeof=len
+        )
+
+    def append(self, event: ConversationEvent) -> None:
+        buffer = self._buffers.get(event.conversation_id)
+        if buffer is None:
+            buffer = collections.deque(maxlen=self._max_events_per_conversation)
+
+        buffer.append(event)
+        # setting the entry, even when it already exists, extends the ttl for the conversation and updates the
+        # number of buffered events
+        self._buffers[event.conversation_id] = buffer
+
+    def events_after(self, conversation_id: uuid.UUID, last_event_id: str) -> list[ConversationEvent] | None:
+        """
+        Returns the buffered events that follow the event with the given id, or None if that event is no longer
+        in the buffer and the missed events cannot be determined.
+        """
+        buffer = self._buffers.get(conversation_id)
+        if buffer is None:
+            return None
+
+        events = list(buffer)
+        for index, event in enumerate(events):
+            if event.id == last_event_id:
+                return events[index + 1 :]
+
+        return None
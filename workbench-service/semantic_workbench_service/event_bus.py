@@ -0,0 +1,262 @@
+import asyncio
+import contextlib
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, Protocol
+from urllib.parse import urlparse
+
+import asyncpg
+import cachetools
+
+from .config import DBSettings, EventBusSettings
+from .event import ConversationEventQueueItem
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[ConversationEventQueueItem], Awaitable[None]]
+
+
+class EventBus(Protocol):
+    def lifespan(self) -> AsyncContextManager[None]: ...
+
+    async def publish(self, queue_item: ConversationEventQueueItem) -> None: ...
+
+
+class InMemoryEventBus(EventBus):
+    """
+    Delivers events to the handler in this process only. Suitable for a single worker.
+    """
+
+    def __init__(self, handler: EventHandler) -> None:
+        self._handler = handler
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[None]:
+        yield
+
+    async def publish(self, queue_item: ConversationEventQueueItem) -> None:
+        await self._handler(queue_item)
+
+
+# postgresql rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_PAYLOAD_BYTES = 7_800
+# worst case number of bytes per character in utf-8
+_MAX_BYTES_PER_CHAR = 4
+# bound on the number of chunked payloads being reassembled at once
+_MAX_PARTIAL_PAYLOADS = 1_000
+
+
+class PostgresEventBus(EventBus):
+    """
+    Delivers events to the handler in every process connected to the same postgresql database, using
+    LISTEN/NOTIFY.
+
+    Events are delivered to the handler in the publishing process directly, and ignored when the database
+    echoes them back. Payloads that exceed the NOTIFY limit are split into chunks that are sent in a single
+    transaction, which postgresql delivers together and in order. Payloads that are still incomplete after the
+    timeout, because chunks were lost when the listener reconnected, are discarded.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        ssl: str,
+        channel: str,
+        reconnect_delay_seconds: float,
+        keepalive_interval_seconds: float,
+        publish_pool_size: int,
+        partial_payload_timeout_seconds: float,
+        handler: EventHandler,
+    ) -> None:
+        self._dsn = dsn
+        self._ssl = ssl
+        self._channel = channel
+        self._reconnect_delay_seconds = reconnect_delay_seconds
+        self._keepalive_interval_seconds = keepalive_interval_seconds
+        self._publish_pool_size = publish_pool_size
+        self._handler = handler
+
+        self._origin = uuid.uuid4().hex
+        self._publish_pool: asyncpg.Pool | None = None
+        self._received: asyncio.Queue[ConversationEventQueueItem] = asyncio.Queue()
+        self._partial_payloads = cachetools.TTLCache[str, list[str | None]](
+            maxsize=_MAX_PARTIAL_PAYLOADS, ttl=partial_payload_timeout_seconds
+        )
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[None]:
+        async with asyncpg.create_pool(
+            dsn=self._dsn,
+            ssl=self._ssl,
+            min_size=1,
+            max_size=self._publish_pool_size,
+        ) as publish_pool:
+            self._publish_pool = publish_pool
+
+            tasks = {
+                asyncio.create_task(self._listen(), name="event_bus_listen"),
+                asyncio.create_task(self._dispatch(), name="event_bus_dispatch"),
+            }
+            try:
+                yield
+
+            finally:
+                self._publish_pool = None
+
+                for task in tasks:
+                    task.cancel()
+
+                with contextlib.suppress(asyncio.CancelledError):
+                    await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def publish(self, queue_item: ConversationEventQueueItem) -> None:
+        await self._handler(queue_item)
+
+        if self._publish_pool is None:
+            logger.warning(
+                "event bus is not started, event not published; conversation_id: %s, event: %s, id: %s",
+                queue_item.event.conversation_id,
+                queue_item.event.event,
+                queue_item.event.id,
+            )
+            return
+
+        payload = queue_item.model_dump_json()
+        message_id = uuid.uuid4().hex
+        chunks = split_payload(payload)
+
+        try:
+            async with self._publish_pool.acquire() as connection, connection.transaction():
+                for index, chunk in enumerate(chunks):
+                    await connection.execute(
+                        "SELECT pg_notify($1, $2)",
+                        self._channel,
+                        f"{self._origin}:{message_id}:{index}:{len(chunks)}:{chunk}",
+                    )
+        except Exception:
+            logger.exception(
+                "failed to publish event; conversation_id: %s, event: %s, id: %s",
+                queue_item.event.conversation_id,
+                queue_item.event.event,
+                queue_item.event.id,
+            )
+
+    def _on_notification(
+        self,
+        connection: asyncpg.Connection,
+        pid: int,
+        channel: str,
+        notification: str,
+    ) -> None:
+        try:
+            origin, message_id, index_str, count_str, chunk = notification.split(":", 4)
+            index = int(index_str)
+            count = int(count_str)
+        except ValueError:
+            logger.warning("ignoring malformed event bus notification")
+            return
+
+        if origin == self._origin:
+            return
+
+        for expired_message_id, _ in self._partial_payloads.expire():
+            logger.warning("discarding incomplete event bus notification; message_id: %s", expired_message_id)
+
+        if count == 1:
+            payload = chunk
+        else:
+            chunks = self._partial_payloads.setdefault(message_id, [None for _ in range(count)])
+            chunks[index] = chunk
+            if any(c is None for c in chunks):
+                return
+            self._partial_payloads.pop(message_id, None)
+            payload = "".join(c for c in chunks if c is not None)
+
+        try:
+            queue_item = ConversationEventQueueItem.model_validate_json(payload)
+        except Exception:
+            logger.exception("failed to parse event bus notification; message_id: %s", message_id)
+            return
+
+        self._received.put_nowait(queue_item)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self._listen_until_terminated()
+            except Exception:
+                logger.exception("error in event bus listener; channel: %s", self._channel)
+
+            await asyncio.sleep(self._reconnect_delay_seconds)
+
+    async def _listen_until_terminated(self) -> None:
+        connection: asyncpg.Connection = await asyncpg.connect(dsn=self._dsn, ssl=self._ssl)
+        try:
+            terminated = asyncio.Event()
+            connection.add_termination_listener(lambda _: terminated.set())
+
+            self._partial_payloads.clear()
+            await connection.add_listener(self._channel, self._on_notification)
+            logger.info("event bus listening; channel: %s", self._channel)
+
+            while True:
+                try:
+                    await asyncio.wait_for(terminated.wait(), timeout=self._keepalive_interval_seconds)
+                    break
+                except asyncio.TimeoutError:
+                    # detect half-open connections, which would otherwise silently stop delivering notifications
+                    await connection.execute("SELECT 1")
+
+            logger.warning("event bus connection terminated; channel: %s", self._channel)
+
+        finally:
+            if not connection.is_closed():
+                connection.terminate()
+
+    async def _dispatch(self) -> None:
+        while True:
+            queue_item = await self._received.get()
+            try:
+                await self._handler(queue_item)
+            except Exception:
+                logger.exception(
+                    "error handling event from event bus; conversation_id: %s, event: %s, id: %s",
+                    queue_item.event.conversation_id,
+                    queue_item.event.event,
+                    queue_item.event.id,
+                )
+
+
+def split_payload(payload: str) -> list[str]:
+    if len(payload.encode("utf-8")) <= NOTIFY_MAX_PAYLOAD_BYTES:
+        return [payload]
+
+    # leave room for the "<origin>:<message_id>:<index>:<count>:" header
+    chunk_length = (NOTIFY_MAX_PAYLOAD_BYTES - 100) // _MAX_BYTES_PER_CHAR
+    return [payload[i : i + chunk_length] for i in range(0, len(payload), chunk_length)]
+
+
+def create_event_bus(settings: EventBusSettings, db_settings: DBSettings, handler: EventHandler) -> EventBus:
+    match settings.type:
+        case "memory":
+            logger.info("creating InMemoryEventBus")
+            return InMemoryEventBus(handler=handler)
+
+        case "postgresql":
+            parsed_url = urlparse(db_settings.url)
+            if not parsed_url.scheme.startswith("postgresql"):
+                raise ValueError("the postgresql event bus requires a postgresql database url")
+
+            logger.info("creating PostgresEventBus; channel: %s", settings.postgresql_channel)
+            return PostgresEventBus(
+                # asyncpg expects a plain postgresql url, without the sqlalchemy driver name
+                dsn=parsed_url._replace(scheme="postgresql").geturl(),
+                ssl=db_settings.postgresql_ssl_mode,
+                channel=settings.postgresql_channel,
+                reconnect_delay_seconds=settings.postgresql_reconnect_delay_seconds,
+                keepalive_interval_seconds=settings.postgresql_keepalive_interval_seconds,
+                publish_pool_size=settings.postgresql_publish_pool_size,
+                partial_payload_timeout_seconds=settings.postgresql_partial_payload_timeout_seconds,
+                handler=handler,
+            )
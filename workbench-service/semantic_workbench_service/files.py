@@ -1,19 +1,36 @@
+import asyncio
 import hashlib
 import logging
+import os
 import pathlib
+import tempfile
 from contextlib import contextmanager
-from typing import BinaryIO, Iterator
+from typing import IO, BinaryIO, Iterator
 
 from pydantic_settings import BaseSettings
 
 logger = logging.getLogger(__name__)
 
+_CHUNK_SIZE = 100 * 1_024
+
 
 class StorageSettings(BaseSettings):
     root: str = ".data/files"
 
 
 class Storage:
+    """
+    File storage for conversation files.
+
+    File contents are stored as blobs, addressed by their SHA-256 hash, so that identical uploads, duplicated
+    conversations and imported conversations share one copy. Blobs are shared by the file versions that reference
+    them, so are not deleted with a file; blobs that are no longer referenced are deleted by a periodic sweep.
+
+    Files written before blobs were introduced are stored per namespace (conversation), by file name.
+
+    Writes and deletes run in a worker thread, so they do not block the event loop.
+    """
+
     def __init__(self, settings: StorageSettings):
         self.root = pathlib.Path(settings.root)
         self._initialized = False
@@ -41,22 +58,107 @@ class Storage:
         filename_hash = hashlib.sha256(filename.encode("utf-8")).hexdigest()
         return namespace_path / filename_hash
 
+    def blob_path(self, content_hash: str) -> pathlib.Path:
+        return self.root / "blobs" / content_hash[:2] / content_hash
+
     def file_exists(self, namespace: str, filename: str) -> bool:
         file_path = self._file_path(namespace, filename)
         return file_path.exists()
 
-    def write_file(self, namespace: str, filename: str, content: BinaryIO) -> None:
-        file_path = self._file_path(namespace, filename, mkdir=True)
-        with open(file_path, "wb") as f:
-            for chunk in iter(lambda: content.read(100 * 1_024), b""):
-                f.write(chunk)
+    async def write_file(self, namespace: str, filename: str, content: BinaryIO) -> None:
+        def write() -> None:
+            file_path = self._file_path(namespace, filename, mkdir=True)
+            with open(file_path, "wb") as f:
+                for chunk in iter(lambda: content.read(_CHUNK_SIZE), b""):
+                    f.write(chunk)
 
-    def delete_file(self, namespace: str, filename: str) -> None:
+        await asyncio.to_thread(write)
+
+    async def delete_file(self, namespace: str, filename: str) -> None:
         file_path = self._file_path(namespace, filename)
-        file_path.unlink(missing_ok=True)
+        await asyncio.to_thread(file_path.unlink, missing_ok=True)
 
     @contextmanager
     def read_file(self, namespace: str, filename: str) -> Iterator[BinaryIO]:
         file_path = self._file_path(namespace, filename)
         with open(file_path, "rb") as f:
             yield f
+
+    async def write_blob(self, content: IO[bytes]) -> str:
+        """
+        Writes the content as a blob, if a blob with the same content does not already exist, and returns its hash.
+        """
+
+        def write() -> str:
+            self._ensure_initialized()
+            blobs_path = self.root / "blobs"
+            blobs_path.mkdir(exist_ok=True)
+
+            # the hash is only known once the content is read, so write to a temporary file and move it into place
+            content_hash = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(dir=blobs_path, prefix=".upload-", delete=False) as f:
+                try:
+                    for chunk in iter(lambda: content.read(_CHUNK_SIZE), b""):
+                        content_hash.update(chunk)
+                        f.write(chunk)
+                except BaseException:
+                    f.close()
+                    os.unlink(f.name)
+                    raise
+
+            blob_path = self.blob_path(content_hash.hexdigest())
+            blob_path.parent.mkdir(exist_ok=True)
+            # replacing an existing blob is safe, as its content is identical
+            os.replace(f.name, blob_path)
+            return content_hash.hexdigest()
+
+        return await asyncio.to_thread(write)
+
+    async def list_blobs(self) -> list[str]:
+        """
+        Returns the hashes of all blobs.
+        """
+
+        def list_hashes() -> list[str]:
+            blobs_path = self.root / "blobs"
+            if not blobs_path.exists():
+                return []
+            # temporary files start with a "."
+            return [path.name for path in blobs_path.glob("*/*") if not path.name.startswith(".")]
+
+        return await asyncio.to_thread(list_hashes)
+
+    async def delete_blob(self, content_hash: str, modified_before: float | None = None) -> bool:
+        """
+        Deletes the blob, returning whether it was deleted. If modified_before is set, the blob is only deleted if it
+        has not been written since then, as a blob is written again when identical content is uploaded.
+        """
+
+        def delete() -> bool:
+            blob_path = self.blob_path(content_hash)
+            if modified_before is None:
+                blob_path.unlink(missing_ok=True)
+                return True
+
+            # move the blob aside before checking it, so that a concurrent write is either the blob that is checked,
+            # or is written in its place and not deleted
+            deleting_path = blob_path.with_name(f".delete-{content_hash}")
+            try:
+                os.rename(blob_path, deleting_path)
+            except FileNotFoundError:
+                return False
+
+            if deleting_path.stat().st_mtime >= modified_before:
+                # replacing a blob written since is safe, as its content is identical
+                os.replace(deleting_path, blob_path)
+                return False
+
+            deleting_path.unlink()
+            return True
+
+        return await asyncio.to_thread(delete)
+
+    @contextmanager
+    def read_blob(self, content_hash: str) -> Iterator[BinaryIO]:
+        with open(self.blob_path(content_hash), "rb") as f:
+            yield f
@@ -0,0 +1,52 @@
+"""
+Prometheus metrics for the workbench service, exposed on the /metrics endpoint.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+assistant_event_queue_depth = Gauge(
+    "workbench_assistant_event_queue_depth",
+    "Number of events waiting to be forwarded to assistants.",
+)
+assistant_event_age_seconds = Histogram(
+    "workbench_assistant_event_age_seconds",
+    "Time from an event being created until it is forwarded to an assistant.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+assistant_event_forward_duration_seconds = Histogram(
+    "workbench_assistant_event_forward_duration_seconds",
+    "Duration of requests forwarding events to assistants.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+assistant_event_overflow_total = Counter(
+    "workbench_assistant_event_overflow_total",
+    "Events coalesced, dropped or rejected because an assistant event queue was full.",
+    ["action"],
+)
+assistant_recipient_cache_requests_total = Counter(
+    "workbench_assistant_recipient_cache_requests_total",
+    "Lookups of the assistants that receive a conversation's events, by whether they were served from the cache.",
+    ["result"],
+)
+user_event_notifications_total = Counter(
+    "workbench_user_event_notifications_total",
+    "Conversation change notifications for user SSE clients, by whether they were delivered or coalesced.",
+    ["result"],
+)
+db_pool_size = Gauge(
+    "workbench_db_pool_size",
+    "Number of connections the database connection pool keeps open.",
+)
+db_pool_checked_out_connections = Gauge(
+    "workbench_db_pool_checked_out_connections",
+    "Number of database connections in use by sessions.",
+)
+db_pool_overflow_connections = Gauge(
+    "workbench_db_pool_overflow_connections",
+    "Number of database connections open beyond the pool size.",
+)
+db_pool_checkout_wait_seconds = Histogram(
+    "workbench_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the database connection pool.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
@@ -1,9 +1,12 @@
+import hashlib
 import logging
 import secrets
 import time
+from dataclasses import dataclass
 from functools import lru_cache
 from typing import Any, Awaitable, Callable
 
+import cachetools
 import httpx
 from fastapi import HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse
@@ -63,33 +66,68 @@ async def _assistant_service_principal_from_request(
     return auth.AssistantServicePrincipal(assistant_service_id=assistant_service_id)
 
 
+_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+
+@dataclass(frozen=True)
+class _DecodedToken:
+    algorithm: str
+    app_id: str
+    user_id: str
+    name: str
+    expiration: float | None
+
+
+# decoded tokens, keyed by the hash of the token; the allowed algorithms and app are checked on every request
+_decoded_tokens = cachetools.TTLCache[str, _DecodedToken](
+    maxsize=settings.auth.token_cache_max_size, ttl=settings.auth.token_cache_ttl_seconds
+)
+
+
+def _decode_token(token: str) -> _DecodedToken:
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    decoded_token = _decoded_tokens.get(token_hash)
+    if decoded_token is not None:
+        # cached tokens can expire while they are cached
+        if decoded_token.expiration is not None and decoded_token.expiration <= time.time():
+            raise ExpiredSignatureError("Signature has expired.")
+        return decoded_token
+
+    algorithm: str = jwt.get_unverified_header(token).get("alg") or ""
+
+    match algorithm:
+        case "RS256":
+            keys = _get_rs256_jwks()
+        case _:
+            keys = ""
+
+    decoded = jwt.decode(
+        token,
+        algorithms=settings.auth.allowed_jwt_algorithms,
+        key=keys,
+        options={"verify_signature": False, "verify_aud": False},
+    )
+    tid: str = decoded.get("tid", "")
+    oid: str = decoded.get("oid", "")
+    expiration = decoded.get("exp")
+    decoded_token = _DecodedToken(
+        algorithm=algorithm,
+        app_id=decoded.get("appid", ""),
+        user_id=f"{tid}.{oid}",
+        name=decoded.get("name", ""),
+        expiration=float(expiration) if expiration is not None else None,
+    )
+    _decoded_tokens[token_hash] = decoded_token
+    return decoded_token
+
+
 async def _user_principal_from_request(request: Request) -> auth.UserPrincipal | None:
-    token = await OAuth2PasswordBearer(tokenUrl="token", auto_error=False)(request)
+    token = await _oauth2_scheme(request)
     if token is None:
         return None
 
-    allowed_jwt_algorithms = settings.auth.allowed_jwt_algorithms
-
     try:
-        algorithm: str = jwt.get_unverified_header(token).get("alg") or ""
-
-        match algorithm:
-            case "RS256":
-                keys = _get_rs256_jwks()
-            case _:
-                keys = ""
-
-        decoded = jwt.decode(
-            token,
-            algorithms=allowed_jwt_algorithms,
-            key=keys,
-            options={"verify_signature": False, "verify_aud": False},
-        )
-        app_id: str = decoded.get("appid", "")
-        tid: str = decoded.get("tid", "")
-        oid: str = decoded.get("oid", "")
-        name: str = decoded.get("name", "")
-        user_id = f"{tid}.{oid}"
+        decoded_token = _decode_token(token)
 
     except ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Expired token")
@@ -98,13 +136,13 @@ async def _user_principal_from_request(request: Request) -> auth.UserPrincipal |
         logger.exception("error decoding token", exc_info=True)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    if algorithm not in allowed_jwt_algorithms:
+    if decoded_token.algorithm not in settings.auth.allowed_jwt_algorithms:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token algorithm")
 
-    if app_id != settings.auth.allowed_app_id:
+    if decoded_token.app_id != settings.auth.allowed_app_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid app")
 
-    return auth.UserPrincipal(user_id=user_id, name=name)
+    return auth.UserPrincipal(user_id=decoded_token.user_id, name=decoded_token.name)
 
 
 async def principal_from_request(
@@ -179,5 +217,6 @@ def ttl_lru_cache(seconds_to_live: int, maxsize: int = 128):
 
 @ttl_lru_cache(seconds_to_live=60 * 10)
 def _get_rs256_jwks() -> dict[str, Any]:
-    response = httpx.Client().get("https://login.microsoftonline.com/common/discovery/v2.0/keys")
+    with httpx.Client() as client:
+        response = client.get("https://login.microsoftonline.com/common/discovery/v2.0/keys")
     return response.json()
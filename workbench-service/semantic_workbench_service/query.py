@@ -14,6 +14,13 @@ def json_extract_path(expression, *paths: str) -> Function[Any]:
     return func.json_extract_path(expression, *paths)
 
 
+def random_uuid() -> Function[Any]:
+    if settings.db.url.startswith("sqlite"):
+        # sqlite stores uuids as 32 hex characters
+        return func.lower(func.hex(func.randomblob(16)))
+    return func.gen_random_uuid()
+
+
 def select_assistants_for(
     user_principal: auth.UserPrincipal, include_assistants_from_conversations: bool = False
 ) -> SelectOfScalar[db.Assistant]:
@@ -133,11 +140,11 @@ def select_conversation_projections_for(
 
     latest_message_subquery = (
         select(
-            db.ConversationMessage.conversation_id,
-            func.max(db.ConversationMessage.sequence).label("latest_message_sequence"),
+            db.ConversationLatestMessage.conversation_id,
+            func.max(db.ConversationLatestMessage.latest_message_sequence).label("latest_message_sequence"),
         )
-        .where(col(db.ConversationMessage.message_type).in_(latest_message_types))
-        .group_by(col(db.ConversationMessage.conversation_id))
+        .where(col(db.ConversationLatestMessage.message_type).in_(latest_message_types))
+        .group_by(col(db.ConversationLatestMessage.conversation_id))
         .subquery()
     )
 
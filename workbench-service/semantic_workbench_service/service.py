@@ -1,6 +1,8 @@
 import asyncio
+import base64
 import contextlib
 import datetime
+import itertools
 import json
 import logging
 import urllib.parse
@@ -14,16 +16,18 @@ from typing import (
     AsyncIterator,
     Callable,
     NoReturn,
+    Sequence,
 )
 
-import asgi_correlation_id
-import starlette.background
-from asgi_correlation_id import CorrelationIdMiddleware
+import httpx
+import prometheus_client
+from asgi_correlation_id import CorrelationIdMiddleware, correlation_id
 from fastapi import (
     BackgroundTasks,
     FastAPI,
     File,
     Form,
+    Header,
     HTTPException,
     Query,
     Request,
@@ -49,12 +53,17 @@ from semantic_workbench_api_model.workbench_model import (
     AssistantServiceRegistrationList,
     AssistantStateEvent,
     Conversation,
+    ConversationBatchOperation,
+    ConversationBatchOperationResult,
+    ConversationBatchRequest,
+    ConversationBatchResponse,
     ConversationEvent,
     ConversationEventType,
     ConversationImportResult,
     ConversationList,
     ConversationMessage,
     ConversationMessageDebug,
+    ConversationMessageHistory,
     ConversationMessageList,
     ConversationParticipant,
     ConversationParticipantList,
@@ -71,6 +80,7 @@ from semantic_workbench_api_model.workbench_model import (
     NewConversationMessage,
     NewConversationShare,
     ParticipantRole,
+    TokenEncoding,
     UpdateAssistant,
     UpdateAssistantServiceRegistration,
     UpdateAssistantServiceRegistrationUrl,
@@ -81,6 +91,11 @@ from semantic_workbench_api_model.workbench_model import (
     User,
     UserList,
 )
+from semantic_workbench_api_model.workbench_service_client import (
+    HEADER_API_KEY,
+    HEADER_ASSISTANT_ID,
+    HEADER_ASSISTANT_SERVICE_ID,
+)
 from sqlmodel import col, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sse_starlette import EventSourceResponse, ServerSentEvent
@@ -88,10 +103,20 @@ from sse_starlette import EventSourceResponse, ServerSentEvent
 from semantic_workbench_service import azure_speech
 
 from . import assistant_api_key, auth, controller, db, files, middleware, settings
+from . import event_bus as event_bus_
+from .assistant_event_forwarder import AssistantEventForwarder
+from .assistant_recipient_cache import AssistantRecipientCache
+from .conversation_retitle_scheduler import ConversationRetitleScheduler
 from .event import ConversationEventQueueItem
+from .event_buffer import ConversationEventBuffer
+from .user_event_notifier import UserEventNotifier
 
 logger = logging.getLogger(__name__)
 
+# sent to conversation SSE clients that reconnect after missing events that can no longer be replayed, to tell
+# them to reload the conversation
+CONVERSATION_EVENTS_RESET = "reset"
+
 
 def init(
     app: FastAPI,
@@ -101,45 +126,53 @@ def init(
     stop_signal: asyncio.Event = asyncio.Event()
 
     conversation_sse_queues_lock = asyncio.Lock()
-    conversation_sse_queues: dict[uuid.UUID, set[asyncio.Queue[ConversationEvent]]] = defaultdict(set)
+    # the SSE generators wait on their queues; None is put in each queue when the service is stopping
+    conversation_sse_queues: dict[uuid.UUID, set[asyncio.Queue[ConversationEvent | None]]] = defaultdict(set)
 
     user_sse_queues_lock = asyncio.Lock()
-    user_sse_queues: dict[str, set[asyncio.Queue[uuid.UUID]]] = defaultdict(set)
+    user_sse_queues: dict[str, set[asyncio.Queue[uuid.UUID | None]]] = defaultdict(set)
 
-    assistant_event_queues: dict[uuid.UUID, asyncio.Queue[ConversationEvent]] = {}
+    conversation_event_buffer = ConversationEventBuffer(
+        max_events_per_conversation=settings.service.conversation_event_buffer_size,
+        max_events=settings.service.conversation_event_buffer_max_events,
+        ttl_seconds=settings.service.conversation_event_buffer_ttl_seconds,
+    )
+
+    assistant_recipient_cache = AssistantRecipientCache(
+        max_conversations=settings.service.assistant_recipient_cache_max_conversations,
+        ttl_seconds=settings.service.assistant_recipient_cache_ttl_seconds,
+    )
 
     background_tasks: set[asyncio.Task] = set()
 
     def _controller_get_session() -> AsyncContextManager[AsyncSession]:
         return db.create_session(app.state.db_engine)
 
-    async def _forward_events_to_assistant(
-        assistant_id: uuid.UUID, event_queue: asyncio.Queue[ConversationEvent]
-    ) -> NoReturn:
-        while True:
-            try:
-                event = await event_queue.get()
-                event_queue.task_done()
-
-                asgi_correlation_id.correlation_id.set(event.correlation_id)
+    _participant_event_types = {
+        ConversationEventType.participant_created,
+        ConversationEventType.participant_updated,
+    }
 
-                start_time = datetime.datetime.now(datetime.UTC)
+    def _invalidate_recipients(conversation_id: uuid.UUID) -> None:
+        # participant events are notified after the change is committed, so recipients loaded from here on see it
+        assistant_recipient_cache.invalidate(conversation_id)
+        user_event_notifier.invalidate(conversation_id)
 
-                await assistant_controller.forward_event_to_assistant(assistant_id=assistant_id, event=event)
-
-                end_time = datetime.datetime.now(datetime.UTC)
-                logger.debug(
-                    "forwarded event to assistant; assistant_id: %s, conversation_id: %s, event_id: %s,"
-                    " duration: %s, time since event: %s",
-                    assistant_id,
-                    event.conversation_id,
-                    event.id,
-                    end_time - start_time,
-                    end_time - event.timestamp,
+    async def _get_assistant_recipients(conversation_id: uuid.UUID) -> Sequence[uuid.UUID]:
+        async with _controller_get_session() as session:
+            return (
+                await session.exec(
+                    select(db.Assistant.assistant_id)
+                    .join(
+                        db.AssistantParticipant,
+                        col(db.Assistant.assistant_id) == col(db.AssistantParticipant.assistant_id),
+                    )
+                    .join(db.AssistantServiceRegistration)
+                    .where(col(db.AssistantServiceRegistration.assistant_service_online).is_(True))
+                    .where(col(db.AssistantParticipant.active_participant).is_(True))
+                    .where(db.AssistantParticipant.conversation_id == conversation_id)
                 )
-
-            except Exception:
-                logger.exception("exception in _forward_events_to_assistant")
+            ).all()
 
     async def _notify_event(queue_item: ConversationEventQueueItem) -> None:
         if stop_signal.is_set():
@@ -160,56 +193,20 @@ def init(
         )
 
         if "user" in queue_item.event_audience:
-            async with conversation_sse_queues_lock:
-                for queue in conversation_sse_queues.get(queue_item.event.conversation_id, {}):
-                    await queue.put(queue_item.event)
-            logger.debug(
-                "enqueued event for SSE; conversation_id: %s, event: %s, event_id: %s",
-                queue_item.event.conversation_id,
-                queue_item.event.event,
-                queue_item.event.id,
-            )
-
-            if queue_item.event.event in [
-                ConversationEventType.message_created,
-                ConversationEventType.message_deleted,
-                ConversationEventType.conversation_updated,
-                ConversationEventType.participant_created,
-                ConversationEventType.participant_updated,
-            ]:
-                task = asyncio.create_task(
-                    _notify_user_event(queue_item.event.conversation_id), name="notify_user_event"
-                )
-                background_tasks.add(task)
-                task.add_done_callback(background_tasks.discard)
+            # delivering the event invalidates the recipients of participant events, in this and every other process
+            await event_bus.publish(queue_item)
+        elif queue_item.event.event in _participant_event_types:
+            _invalidate_recipients(queue_item.event.conversation_id)
 
         if "assistant" in queue_item.event_audience:
-            async with _controller_get_session() as session:
-                assistant_ids = (
-                    await session.exec(
-                        select(db.Assistant.assistant_id)
-                        .join(
-                            db.AssistantParticipant,
-                            col(db.Assistant.assistant_id) == col(db.AssistantParticipant.assistant_id),
-                        )
-                        .join(db.AssistantServiceRegistration)
-                        .where(col(db.AssistantServiceRegistration.assistant_service_online).is_(True))
-                        .where(col(db.AssistantParticipant.active_participant).is_(True))
-                        .where(db.AssistantParticipant.conversation_id == queue_item.event.conversation_id)
-                    )
-                ).all()
+            assistant_ids = await assistant_recipient_cache.get(
+                queue_item.event.conversation_id, _get_assistant_recipients
+            )
 
             for assistant_id in assistant_ids:
-                if assistant_id not in assistant_event_queues:
-                    queue = asyncio.Queue()
-                    assistant_event_queues[assistant_id] = queue
-                    task = asyncio.create_task(
-                        _forward_events_to_assistant(assistant_id, queue),
-                        name=f"forward_events_to_{assistant_id}",
-                    )
-                    background_tasks.add(task)
+                if not assistant_event_forwarder.enqueue(assistant_id, queue_item.event):
+                    continue
 
-                await assistant_event_queues[assistant_id].put(queue_item.event)
                 logger.debug(
                     "enqueued event for assistant; conversation_id: %s, event: %s, event_id: %s, assistant_id: %s",
                     queue_item.event.conversation_id,
@@ -218,29 +215,69 @@ def init(
                     assistant_id,
                 )
 
-    async def _notify_user_event(conversation_id: uuid.UUID) -> None:
-        listening_user_ids = set(user_sse_queues.keys())
+    async def _deliver_event_to_sse_clients(queue_item: ConversationEventQueueItem) -> None:
+        """
+        Delivers an event to the SSE clients connected to this process. Called by the event bus, in every process,
+        for each event with a "user" audience.
+        """
+        if queue_item.event.event in _participant_event_types:
+            # participants may have changed, in this or another process
+            _invalidate_recipients(queue_item.event.conversation_id)
+
+        async with conversation_sse_queues_lock:
+            # buffered under the same lock as SSE connections are registered, so that a reconnecting client
+            # receives each event exactly once, either from the buffer or from its queue
+            conversation_event_buffer.append(queue_item.event)
+            for queue in conversation_sse_queues.get(queue_item.event.conversation_id, {}):
+                await queue.put(queue_item.event)
+        logger.debug(
+            "enqueued event for SSE; conversation_id: %s, event: %s, event_id: %s",
+            queue_item.event.conversation_id,
+            queue_item.event.event,
+            queue_item.event.id,
+        )
+
+        if queue_item.event.event in [
+            ConversationEventType.message_created,
+            ConversationEventType.message_deleted,
+            ConversationEventType.conversation_updated,
+            ConversationEventType.participant_created,
+            ConversationEventType.participant_updated,
+        ]:
+            # no users are notified when no user SSE clients are connected to this process
+            if user_sse_queues:
+                user_event_notifier.notify(queue_item.event.conversation_id)
+
+    async def _get_user_recipients(conversation_id: uuid.UUID) -> Sequence[str]:
         async with _controller_get_session() as session:
-            active_user_participants = (
+            return (
                 await session.exec(
                     select(db.UserParticipant.user_id).where(
                         col(db.UserParticipant.active_participant).is_(True),
                         db.UserParticipant.conversation_id == conversation_id,
-                        col(db.UserParticipant.user_id).in_(listening_user_ids),
                     )
                 )
             ).all()
 
-        if not active_user_participants:
-            return
-
+    async def _notify_user_event(user_id: str, conversation_id: uuid.UUID) -> None:
         async with user_sse_queues_lock:
-            for user_id in active_user_participants:
-                for queue in user_sse_queues.get(user_id, {}):
-                    await queue.put(conversation_id)
-                    logger.debug(
-                        "enqueued event for user SSE; user_id: %s, conversation_id: %s", user_id, conversation_id
-                    )
+            for queue in user_sse_queues.get(user_id, {}):
+                await queue.put(conversation_id)
+                logger.debug("enqueued event for user SSE; user_id: %s, conversation_id: %s", user_id, conversation_id)
+
+    user_event_notifier = UserEventNotifier(
+        load_user_ids=_get_user_recipients,
+        deliver=_notify_user_event,
+        window_seconds=settings.service.user_event_coalesce_window_seconds,
+        max_conversations=settings.service.user_recipient_cache_max_conversations,
+        ttl_seconds=settings.service.user_recipient_cache_ttl_seconds,
+    )
+
+    event_bus = event_bus_.create_event_bus(
+        settings=settings.event_bus,
+        db_settings=settings.db,
+        handler=_deliver_event_to_sse_clients,
+    )
 
     assistant_client_pool = controller.AssistantServiceClientPool(api_key_store=api_key_store)
 
@@ -274,11 +311,22 @@ def init(
         client_pool=assistant_client_pool,
         file_storage=files.Storage(settings.storage),
     )
+    assistant_event_forwarder = AssistantEventForwarder(
+        forward=assistant_controller.forward_event_to_assistant,
+        concurrency=settings.service.assistant_event_forwarding_concurrency,
+        max_queue_size=settings.service.assistant_event_queue_max_size,
+        overflow_policy=settings.service.assistant_event_queue_overflow_policy,
+        idle_seconds=settings.service.assistant_event_forwarding_idle_seconds,
+    )
     conversation_controller = controller.ConversationController(
         get_session=_controller_get_session,
         notify_event=_notify_event,
         assistant_controller=assistant_controller,
     )
+    conversation_retitle_scheduler = ConversationRetitleScheduler(
+        retitle=conversation_controller.retitle_conversation,
+        debounce_seconds=settings.service.conversation_retitle_debounce_seconds,
+    )
     conversation_share_controller = controller.ConversationShareController(
         get_session=_controller_get_session,
         notify_event=_notify_event,
@@ -292,16 +340,29 @@ def init(
 
     @asynccontextmanager
     async def _lifespan() -> AsyncIterator[None]:
-        async with db.create_engine(settings.db) as engine:
+        async with contextlib.AsyncExitStack() as stack:
+            engine = await stack.enter_async_context(db.create_engine(settings.db))
             await db.bootstrap_db(engine, settings=settings.db)
 
             app.state.db_engine = engine
 
+            await stack.enter_async_context(event_bus.lifespan())
+            await stack.enter_async_context(assistant_event_forwarder.lifespan())
+            await stack.enter_async_context(user_event_notifier.lifespan())
+            await stack.enter_async_context(conversation_controller.lifespan())
+            await stack.enter_async_context(conversation_retitle_scheduler.lifespan())
+
             background_tasks.add(
                 asyncio.create_task(
                     _update_assistant_service_online_status(), name="update_assistant_service_online_status"
                 ),
             )
+            background_tasks.add(
+                asyncio.create_task(_delete_unreferenced_file_blobs(), name="delete_unreferenced_file_blobs"),
+            )
+            background_tasks.add(
+                asyncio.create_task(_count_message_tokens(), name="count_message_tokens"),
+            )
 
             try:
                 yield
@@ -309,6 +370,10 @@ def init(
             finally:
                 stop_signal.set()
 
+                for sse_queues in [*conversation_sse_queues.values(), *user_sse_queues.values()]:
+                    for sse_queue in sse_queues:
+                        sse_queue.put_nowait(None)
+
                 for task in background_tasks:
                     task.cancel()
 
@@ -326,10 +391,37 @@ def init(
             except Exception:
                 logger.exception("exception in _update_assistant_service_online_status")
 
+    async def _delete_unreferenced_file_blobs() -> NoReturn:
+        while True:
+            try:
+                await asyncio.sleep(settings.service.file_blob_sweep_interval_seconds)
+                await file_controller.delete_unreferenced_blobs()
+
+            except Exception:
+                logger.exception("exception in _delete_unreferenced_file_blobs")
+
+    async def _count_message_tokens() -> NoReturn:
+        while True:
+            try:
+                counted = await conversation_controller.count_message_tokens(
+                    batch_size=settings.service.message_token_count_batch_size
+                )
+                if counted:
+                    logger.info("counted the tokens of messages without token counts; count: %d", counted)
+
+            except Exception:
+                logger.exception("exception in _count_message_tokens")
+
+            await asyncio.sleep(settings.service.message_token_count_interval_seconds)
+
     @app.get("/")
     async def root() -> Response:
         return Response(status_code=status.HTTP_200_OK, content="")
 
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics() -> Response:
+        return Response(content=prometheus_client.generate_latest(), media_type=prometheus_client.CONTENT_TYPE_LATEST)
+
     @app.get("/users")
     async def list_users(
         user_ids: list[str] = Query(alias="id"),
@@ -484,14 +576,14 @@ def init(
     async def export_assistant(
         user_principal: auth.DependsUserPrincipal,
         assistant_id: uuid.UUID,
-    ) -> FileResponse:
+    ) -> StreamingResponse:
         result = await assistant_controller.export_assistant(user_principal=user_principal, assistant_id=assistant_id)
 
-        return FileResponse(
-            path=result.file_path,
+        # the archive is written as it is streamed, so its size is not known up front
+        return StreamingResponse(
+            content=result.stream,
             media_type=result.content_type,
-            filename=result.filename,
-            background=starlette.background.BackgroundTask(result.cleanup),
+            headers={"Content-Disposition": _content_disposition(result.filename)},
         )
 
     @app.get(
@@ -501,16 +593,16 @@ def init(
     async def export_conversations(
         user_principal: auth.DependsUserPrincipal,
         conversation_ids: list[uuid.UUID] = Query(alias="id"),
-    ) -> FileResponse:
+    ) -> StreamingResponse:
         result = await assistant_controller.export_conversations(
             user_principal=user_principal, conversation_ids=set(conversation_ids)
         )
 
-        return FileResponse(
-            path=result.file_path,
+        # the archive is written as it is streamed, so its size is not known up front
+        return StreamingResponse(
+            content=result.stream,
             media_type=result.content_type,
-            filename=result.filename,
-            background=starlette.background.BackgroundTask(result.cleanup),
+            headers={"Content-Disposition": _content_disposition(result.filename)},
         )
 
     @app.post("/conversations/import")
@@ -609,6 +701,7 @@ def init(
             user_principal=user_principal,
             assistant_id=assistant_id,
         )
+        await assistant_event_forwarder.remove(assistant_id)
 
     @app.get("/assistants/{assistant_id}/conversations")
     async def get_assistant_conversations(
@@ -624,7 +717,9 @@ def init(
 
     @app.get("/conversations/{conversation_id}/events")
     async def conversation_server_sent_events(
-        conversation_id: uuid.UUID, request: Request, principal: auth.DependsActorPrincipal
+        conversation_id: uuid.UUID,
+        principal: auth.DependsActorPrincipal,
+        last_event_id: Annotated[str | None, Header(alias="Last-Event-ID")] = None,
     ) -> EventSourceResponse:
         # ensure the principal has access to the conversation
         await conversation_controller.get_conversation(
@@ -642,36 +737,53 @@ def init(
             principal_id,
             conversation_id,
         )
-        event_queue = asyncio.Queue[ConversationEvent]()
+        event_queue = asyncio.Queue[ConversationEvent | None]()
+        reset_required = False
 
         async with conversation_sse_queues_lock:
             queues = conversation_sse_queues[conversation_id]
             queues.add(event_queue)
 
+            if last_event_id:
+                missed_events = conversation_event_buffer.events_after(conversation_id, last_event_id)
+                if missed_events is None:
+                    logger.info(
+                        "last event id is no longer buffered, unable to replay, sending reset to sse client;"
+                        " conversation_id: %s, last_event_id: %s",
+                        conversation_id,
+                        last_event_id,
+                    )
+                    reset_required = True
+                else:
+                    logger.debug(
+                        "replaying events to sse client; conversation_id: %s, last_event_id: %s, count: %d",
+                        conversation_id,
+                        last_event_id,
+                        len(missed_events),
+                    )
+                    for missed_event in missed_events:
+                        event_queue.put_nowait(missed_event)
+
+        # EventSourceResponse cancels the generator when the client disconnects, and sends heartbeat comments
+        # while it is idle, so the generator only wakes for events
         async def event_generator() -> AsyncIterator[ServerSentEvent]:
             try:
+                if reset_required:
+                    # the events the client missed cannot be replayed, so it is told to reload the conversation
+                    yield ServerSentEvent(
+                        id=uuid.uuid4().hex,
+                        event=CONVERSATION_EVENTS_RESET,
+                        data=json.dumps({"conversation_id": str(conversation_id)}),
+                        retry=1000,
+                    )
+
                 while True:
-                    if stop_signal.is_set():
+                    conversation_event = await event_queue.get()
+                    if conversation_event is None or stop_signal.is_set():
                         logger.debug("sse stopping due to signal; conversation_id: %s", conversation_id)
                         break
 
                     try:
-                        if await request.is_disconnected():
-                            logger.debug("client disconnected from sse; conversation_id: %s", conversation_id)
-                            break
-                    except Exception:
-                        logger.exception(
-                            "error checking if client disconnected from sse; conversation_id: %s", conversation_id
-                        )
-                        break
-
-                    try:
-                        try:
-                            async with asyncio.timeout(1):
-                                conversation_event = await event_queue.get()
-                        except asyncio.TimeoutError:
-                            continue
-
                         server_sent_event = ServerSentEvent(
                             id=conversation_event.id,
                             event=conversation_event.event.value,
@@ -700,44 +812,29 @@ def init(
                         if len(queues) == 0:
                             conversation_sse_queues.pop(conversation_id, None)
 
-        return EventSourceResponse(event_generator(), sep="\n")
+        return EventSourceResponse(event_generator(), sep="\n", ping=settings.service.sse_heartbeat_interval_seconds)
 
     @app.get("/events")
-    async def user_server_sent_events(
-        request: Request, user_principal: auth.DependsUserPrincipal
-    ) -> EventSourceResponse:
+    async def user_server_sent_events(user_principal: auth.DependsUserPrincipal) -> EventSourceResponse:
         logger.debug("client connected to user events sse; user_id: %s", user_principal.user_id)
 
-        event_queue = asyncio.Queue[uuid.UUID]()
+        event_queue = asyncio.Queue[uuid.UUID | None]()
 
         async with user_sse_queues_lock:
             queues = user_sse_queues[user_principal.user_id]
             queues.add(event_queue)
 
+        # EventSourceResponse cancels the generator when the client disconnects, and sends heartbeat comments
+        # while it is idle, so the generator only wakes for events
         async def event_generator() -> AsyncIterator[ServerSentEvent]:
             try:
                 while True:
-                    if stop_signal.is_set():
+                    conversation_id = await event_queue.get()
+                    if conversation_id is None or stop_signal.is_set():
                         logger.debug("sse stopping due to signal; user_id: %s", user_principal.user_id)
                         break
 
                     try:
-                        if await request.is_disconnected():
-                            logger.debug("client disconnected from sse; user_id: %s", user_principal.user_id)
-                            break
-                    except Exception:
-                        logger.exception(
-                            "error checking if client disconnected from sse; user_id: %s", user_principal.user_id
-                        )
-                        break
-
-                    try:
-                        try:
-                            async with asyncio.timeout(1):
-                                conversation_id = await event_queue.get()
-                        except asyncio.TimeoutError:
-                            continue
-
                         server_sent_event = ServerSentEvent(
                             id=uuid.uuid4().hex,
                             event="message.created",
@@ -761,7 +858,7 @@ def init(
                         if len(queues) == 0:
                             user_sse_queues.pop(user_principal.user_id, None)
 
-        return EventSourceResponse(event_generator(), sep="\n")
+        return EventSourceResponse(event_generator(), sep="\n", ping=settings.service.sse_heartbeat_interval_seconds)
 
     @app.post("/conversations")
     async def create_conversation(
@@ -773,6 +870,18 @@ def init(
             new_conversation=new_conversation,
         )
 
+    # registered before create_conversation_with_owner, which would otherwise match conversation ids; user ids are
+    # never uuids, so owner ids do not match this route
+    @app.post("/conversations/{conversation_id:uuid}")
+    async def duplicate_conversation(
+        conversation_id: uuid.UUID,
+        principal: auth.DependsActorPrincipal,
+        new_conversation: NewConversation,
+    ) -> ConversationImportResult:
+        return await assistant_controller.duplicate_conversation(
+            principal=principal, conversation_id=conversation_id, new_conversation=new_conversation
+        )
+
     @app.post("/conversations/{owner_id}")
     async def create_conversation_with_owner(
         assistant_principal: auth.DependsAssistantPrincipal,
@@ -785,16 +894,6 @@ def init(
             owner_id=owner_id,
         )
 
-    @app.post("/conversations/{conversation_id}")
-    async def duplicate_conversation(
-        conversation_id: uuid.UUID,
-        principal: auth.DependsActorPrincipal,
-        new_conversation: NewConversation,
-    ) -> ConversationImportResult:
-        return await assistant_controller.duplicate_conversation(
-            principal=principal, conversation_id=conversation_id, new_conversation=new_conversation
-        )
-
     @app.get("/conversations")
     async def list_conversations(
         principal: auth.DependsActorPrincipal,
@@ -893,6 +992,7 @@ def init(
         message_types: Annotated[list[MessageType] | None, Query(alias="message_type")] = None,
         before: Annotated[uuid.UUID | None, Query()] = None,
         after: Annotated[uuid.UUID | None, Query()] = None,
+        cursor: Annotated[str | None, Query()] = None,
         limit: Annotated[int, Query(lte=500)] = 100,
     ) -> ConversationMessageList:
         return await conversation_controller.get_messages(
@@ -903,23 +1003,39 @@ def init(
             message_types=message_types,
             before=before,
             after=after,
+            cursor=cursor,
             limit=limit,
         )
 
+    @app.get("/conversations/{conversation_id}/messages/history")
+    async def get_conversation_message_history(
+        conversation_id: uuid.UUID,
+        principal: auth.DependsActorPrincipal,
+        token_limit: Annotated[int | None, Query()] = None,
+        encoding: Annotated[TokenEncoding, Query()] = TokenEncoding.o200k_base,
+        message_types: Annotated[list[MessageType] | None, Query(alias="message_type")] = None,
+    ) -> ConversationMessageHistory:
+        return await conversation_controller.get_message_history(
+            conversation_id=conversation_id,
+            principal=principal,
+            token_limit=token_limit,
+            encoding=encoding,
+            message_types=message_types,
+        )
+
     @app.post("/conversations/{conversation_id}/messages")
     async def create_conversation_message(
         conversation_id: uuid.UUID,
         new_message: NewConversationMessage,
         principal: auth.DependsActorPrincipal,
-        background_tasks: BackgroundTasks,
     ) -> ConversationMessage:
-        response, task_args = await conversation_controller.create_conversation_message(
+        response, retitle = await conversation_controller.create_conversation_message(
             conversation_id=conversation_id,
             new_message=new_message,
             principal=principal,
         )
-        if task_args:
-            background_tasks.add_task(*task_args)
+        if retitle:
+            conversation_retitle_scheduler.schedule(principal, conversation_id)
         return response
 
     @app.get(
@@ -1014,7 +1130,8 @@ def init(
         filename: str,
         principal: auth.DependsActorPrincipal,
         version: int | None = None,
-    ) -> StreamingResponse:
+        if_none_match: Annotated[str | None, Header()] = None,
+    ) -> Response:
         result = await file_controller.download_file(
             conversation_id=conversation_id,
             filename=filename,
@@ -1022,10 +1139,18 @@ def init(
             version=version,
         )
 
-        return StreamingResponse(
-            result.stream,
+        # file versions are immutable, so clients can revalidate cached content by the version's etag
+        if if_none_match is not None and _etag_matches(if_none_match, result.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": result.etag})
+
+        # FileResponse answers range requests, and sends the file without reading it into python where supported
+        return FileResponse(
+            path=result.file_path,
             media_type=result.content_type,
-            headers={"Content-Disposition": f'attachment; filename="{urllib.parse.quote(result.filename)}"'},
+            headers={
+                "Content-Disposition": f'attachment; filename="{urllib.parse.quote(result.filename)}"',
+                "ETag": result.etag,
+            },
         )
 
     @app.patch("/conversations/{conversation_id}/files/{filename:path}")
@@ -1054,6 +1179,66 @@ def init(
             principal=principal,
         )
 
+    # batched operations are dispatched to the conversation's endpoints in-process, with the caller's credentials
+    batch_transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    batch_forwarded_headers = {
+        header.lower() for header in ("Authorization", HEADER_ASSISTANT_SERVICE_ID, HEADER_ASSISTANT_ID, HEADER_API_KEY)
+    }
+
+    @app.post("/conversations/{conversation_id}/batch")
+    async def batch_conversation_operations(
+        conversation_id: uuid.UUID,
+        batch_request: ConversationBatchRequest,
+        request: Request,
+    ) -> ConversationBatchResponse:
+        # paths are validated up front, so that an invalid operation fails the batch before any are performed
+        urls = [_batch_operation_url(conversation_id, operation.path) for operation in batch_request.operations]
+
+        headers = {name: value for name, value in request.headers.items() if name.lower() in batch_forwarded_headers}
+        request_id = correlation_id.get()
+        if request_id:
+            headers["X-Request-ID"] = request_id
+
+        read_semaphore = asyncio.Semaphore(settings.service.conversation_batch_read_concurrency)
+
+        async with httpx.AsyncClient(
+            transport=batch_transport, base_url=str(request.base_url), headers=headers
+        ) as client:
+
+            async def perform(operation: ConversationBatchOperation, url: str) -> ConversationBatchOperationResult:
+                http_response = await client.request(
+                    operation.method, url, params=operation.params, json=operation.body
+                )
+                content_type = http_response.headers.get("content-type")
+                if content_type is not None and content_type.startswith("application/json"):
+                    return ConversationBatchOperationResult(
+                        status_code=http_response.status_code, body=http_response.json(), content_type=content_type
+                    )
+
+                return ConversationBatchOperationResult(
+                    status_code=http_response.status_code,
+                    content=base64.b64encode(http_response.content).decode("ascii") if http_response.content else None,
+                    content_type=content_type,
+                )
+
+            async def perform_read(operation: ConversationBatchOperation, url: str) -> ConversationBatchOperationResult:
+                async with read_semaphore:
+                    return await perform(operation, url)
+
+            results: list[ConversationBatchOperationResult] = []
+            # writes are performed in order; runs of consecutive reads are performed concurrently
+            for is_read, group in itertools.groupby(
+                zip(batch_request.operations, urls), key=lambda operation_url: operation_url[0].method == "GET"
+            ):
+                if is_read:
+                    results.extend(await asyncio.gather(*(perform_read(operation, url) for operation, url in group)))
+                    continue
+
+                for operation, url in group:
+                    results.append(await perform(operation, url))
+
+        return ConversationBatchResponse(results=results)
+
     @app.post("/conversation-shares")
     async def create_conversation_share(
         user_principal: auth.DependsUserPrincipal,
@@ -1138,3 +1323,36 @@ def init(
     @app.get("/azure-speech/token")
     async def get_azure_speech_token() -> dict[str, str]:
         return azure_speech.get_token()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _content_disposition(filename: str) -> str:
+    quoted_filename = urllib.parse.quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
+
+
+def _batch_operation_url(conversation_id: uuid.UUID, path: str) -> str:
+    """
+    Returns the url for a batched operation, which is limited to the conversation's own endpoints, other than the
+    event stream and the batch endpoint itself.
+    """
+    segments = path.split("/")
+    if segments[0] != "" or "?" in path or "#" in path:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"batch operation path must be empty or start with '/', without a query: {path}",
+        )
+
+    segments = [urllib.parse.unquote(segment) for segment in segments[1:]]
+    if any(segment in ("", ".", "..") for segment in segments) or segments[:1] in (["events"], ["batch"]):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"invalid batch operation path: {path}")
+
+    return f"/conversations/{conversation_id}{path}"
@@ -0,0 +1,44 @@
+import functools
+import logging
+
+import tiktoken
+from semantic_workbench_api_model.workbench_model import TokenEncoding
+
+logger = logging.getLogger(__name__)
+
+# tokens used by the chat completion format for each message, in addition to its content
+TOKENS_PER_MESSAGE = 4
+
+# the average length of a token in english text, used to estimate the tokens of content that has not been counted
+CHARACTERS_PER_TOKEN = 4
+
+
+@functools.cache
+def _get_encoding(encoding: TokenEncoding) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(encoding.value)
+
+
+def count_tokens(content: str, encoding: TokenEncoding) -> int:
+    return len(_get_encoding(encoding).encode(content, disallowed_special=()))
+
+
+def count_tokens_by_encoding(content: str) -> dict[str, int]:
+    """
+    Returns the token counts of the content for every supported encoding, keyed by encoding name, as stored on
+    messages.
+    """
+    return {encoding.value: count_tokens(content, encoding) for encoding in TokenEncoding}
+
+
+def try_count_tokens_by_encoding(content: str) -> dict[str, int] | None:
+    """
+    Returns the token counts of the content for every supported encoding, or None if they cannot be counted.
+    tiktoken downloads the encodings on first use, unless they are in its cache directory (TIKTOKEN_CACHE_DIR),
+    so counting fails when the download does. Messages without token counts are counted later by a background
+    job, and estimated from their length until then.
+    """
+    try:
+        return count_tokens_by_encoding(content)
+    except Exception:
+        logger.exception("failed to count tokens")
+        return None
@@ -0,0 +1,107 @@
+import asyncio
+import contextlib
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Sequence
+
+import cachetools
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+LoadUserIds = Callable[[uuid.UUID], Awaitable[Sequence[str]]]
+DeliverUserEvent = Callable[[str, uuid.UUID], Awaitable[None]]
+
+
+class UserEventNotifier:
+    """
+    Notifies users that their conversations have changed, for the user SSE endpoint.
+
+    Notifications are coalesced: a conversation that changes several times within the window, such as while an
+    assistant streams a response, results in one notification per user at the end of the window.
+
+    The ids of each conversation's active user participants are cached, and invalidated by participant events;
+    the ttl bounds how long changes made without an event can go unnoticed.
+    """
+
+    def __init__(
+        self,
+        load_user_ids: LoadUserIds,
+        deliver: DeliverUserEvent,
+        window_seconds: float,
+        max_conversations: int,
+        ttl_seconds: float,
+    ) -> None:
+        self._load_user_ids = load_user_ids
+        self._deliver = deliver
+        self._window_seconds = window_seconds
+        self._user_ids = cachetools.TTLCache[uuid.UUID, tuple[str, ...]](maxsize=max_conversations, ttl=ttl_seconds)
+        self._generation = 0
+        self._pending: set[uuid.UUID] = set()
+        self._window_open = False
+        self._tasks: set[asyncio.Task] = set()
+
+    def notify(self, conversation_id: uuid.UUID) -> None:
+        if conversation_id in self._pending:
+            metrics.user_event_notifications_total.labels(result="coalesced").inc()
+            return
+
+        self._pending.add(conversation_id)
+        if self._window_open:
+            return
+
+        self._window_open = True
+        task = asyncio.create_task(self._flush_after_window(), name="notify_user_events")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def invalidate(self, conversation_id: uuid.UUID) -> None:
+        self._generation += 1
+        self._user_ids.pop(conversation_id, None)
+
+    async def _get_user_ids(self, conversation_id: uuid.UUID) -> Sequence[str]:
+        user_ids = self._user_ids.get(conversation_id)
+        if user_ids is not None:
+            return user_ids
+
+        generation = self._generation
+        user_ids = tuple(await self._load_user_ids(conversation_id))
+        # a result loaded while an invalidation happened may predate the change, so is not cached
+        if generation == self._generation:
+            self._user_ids[conversation_id] = user_ids
+
+        return user_ids
+
+    async def _flush_after_window(self) -> None:
+        try:
+            await asyncio.sleep(self._window_seconds)
+
+        finally:
+            # conversations that change from here on are notified in the next window
+            self._window_open = False
+            conversation_ids = self._pending
+            self._pending = set()
+
+        for conversation_id in conversation_ids:
+            try:
+                for user_id in await self._get_user_ids(conversation_id):
+                    await self._deliver(user_id, conversation_id)
+                    metrics.user_event_notifications_total.labels(result="delivered").inc()
+
+            except Exception:
+                logger.exception("exception notifying users; conversation_id: %s", conversation_id)
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[None]:
+        try:
+            yield
+
+        finally:
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+
+            with contextlib.suppress(asyncio.CancelledError):
+                await asyncio.gather(*tasks, return_exceptions=True)
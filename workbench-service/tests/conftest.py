@@ -15,6 +15,7 @@ import semantic_workbench_assistant.canonical
 import semantic_workbench_assistant.storage
 import semantic_workbench_service
 import semantic_workbench_service.assistant_api_key
+import semantic_workbench_service.tokens
 from fastapi import FastAPI
 from semantic_workbench_api_model import (
     assistant_service_client,
@@ -40,6 +41,14 @@ def create_test_user(monkeypatch: pytest.MonkeyPatch) -> MockUser:
     return test_user
 
 
+@pytest.fixture(autouse=True)
+def offline_token_counts(monkeypatch: pytest.MonkeyPatch) -> None:
+    # tiktoken downloads its encodings on first use, so tokens are counted as words for tests to run offline
+    monkeypatch.setattr(
+        semantic_workbench_service.tokens, "count_tokens", lambda content, encoding: len(content.split())
+    )
+
+
 @pytest.fixture
 def test_user(monkeypatch: pytest.MonkeyPatch) -> MockUser:
     return create_test_user(monkeypatch)
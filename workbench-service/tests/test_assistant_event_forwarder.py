@@ -0,0 +1,181 @@
+import asyncio
+import uuid
+
+import pytest
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from semantic_workbench_service.assistant_event_forwarder import AssistantEventForwarder
+from semantic_workbench_service.config import AssistantEventOverflowPolicy
+
+
+def create_event(
+    conversation_id: uuid.UUID,
+    event: ConversationEventType = ConversationEventType.message_created,
+    data: dict | None = None,
+) -> ConversationEvent:
+    return ConversationEvent(conversation_id=conversation_id, event=event, data=data or {})
+
+
+async def test_forwards_events_in_order_per_conversation() -> None:
+    assistant_id = uuid.uuid4()
+    conversation_ids = [uuid.uuid4(), uuid.uuid4()]
+    forwarded: dict[uuid.UUID, list[str]] = {conversation_id: [] for conversation_id in conversation_ids}
+    in_flight: set[uuid.UUID] = set()
+    done = asyncio.Event()
+
+    async def forward(_: uuid.UUID, event: ConversationEvent) -> None:
+        assert event.conversation_id not in in_flight
+        in_flight.add(event.conversation_id)
+        await asyncio.sleep(0.001)
+        in_flight.discard(event.conversation_id)
+        forwarded[event.conversation_id].append(event.id)
+        if sum(len(ids) for ids in forwarded.values()) == 20:
+            done.set()
+
+    forwarder = AssistantEventForwarder(
+        forward=forward, concurrency=4, max_queue_size=100, overflow_policy="reject", idle_seconds=60
+    )
+    async with forwarder.lifespan():
+        events = [create_event(conversation_ids[i % 2]) for i in range(20)]
+        for event in events:
+            assert forwarder.enqueue(assistant_id, event)
+
+        async with asyncio.timeout(5):
+            await done.wait()
+
+    for conversation_id in conversation_ids:
+        assert forwarded[conversation_id] == [e.id for e in events if e.conversation_id == conversation_id]
+
+
+async def test_slow_conversation_does_not_block_others() -> None:
+    assistant_id = uuid.uuid4()
+    slow_conversation_id = uuid.uuid4()
+    release_slow = asyncio.Event()
+    fast_forwarded = asyncio.Event()
+
+    async def forward(_: uuid.UUID, event: ConversationEvent) -> None:
+        if event.conversation_id == slow_conversation_id:
+            await release_slow.wait()
+        else:
+            fast_forwarded.set()
+
+    forwarder = AssistantEventForwarder(
+        forward=forward, concurrency=2, max_queue_size=100, overflow_policy="reject", idle_seconds=60
+    )
+    async with forwarder.lifespan():
+        forwarder.enqueue(assistant_id, create_event(slow_conversation_id))
+        forwarder.enqueue(assistant_id, create_event(slow_conversation_id))
+        forwarder.enqueue(assistant_id, create_event(uuid.uuid4()))
+
+        async with asyncio.timeout(5):
+            await fast_forwarded.wait()
+
+        release_slow.set()
+
+
+@pytest.mark.parametrize(
+    ("overflow_policy", "expected_accepted", "expected_forwarded"),
+    [
+        ("reject", [True, True, True, False], ["blocking", "message", "participant-1"]),
+        ("drop_oldest", [True, True, True, True], ["blocking", "participant-1", "participant-2"]),
+        ("coalesce", [True, True, True, True], ["blocking", "message", "participant-2"]),
+    ],
+)
+async def test_overflow_policy(
+    overflow_policy: AssistantEventOverflowPolicy,
+    expected_accepted: list[bool],
+    expected_forwarded: list[str],
+) -> None:
+    assistant_id = uuid.uuid4()
+    conversation_id = uuid.uuid4()
+    participant_id = str(uuid.uuid4())
+    release = asyncio.Event()
+    forwarded: list[str] = []
+
+    async def forward(_: uuid.UUID, event: ConversationEvent) -> None:
+        await release.wait()
+        forwarded.append(event.data["name"])
+
+    def participant_updated(name: str) -> ConversationEvent:
+        return create_event(
+            conversation_id,
+            ConversationEventType.participant_updated,
+            {"name": name, "participant": {"id": participant_id}},
+        )
+
+    forwarder = AssistantEventForwarder(
+        forward=forward, concurrency=1, max_queue_size=2, overflow_policy=overflow_policy, idle_seconds=60
+    )
+    async with forwarder.lifespan():
+        # the first event is taken by the worker, leaving room for two queued events
+        accepted = [forwarder.enqueue(assistant_id, create_event(conversation_id, data={"name": "blocking"}))]
+        await asyncio.sleep(0)
+        accepted.append(forwarder.enqueue(assistant_id, create_event(conversation_id, data={"name": "message"})))
+        accepted.append(forwarder.enqueue(assistant_id, participant_updated("participant-1")))
+        accepted.append(forwarder.enqueue(assistant_id, participant_updated("participant-2")))
+
+        release.set()
+        async with asyncio.timeout(5):
+            while len(forwarded) < len(expected_forwarded):
+                await asyncio.sleep(0.01)
+
+    assert accepted == expected_accepted
+    assert forwarded == expected_forwarded
+
+
+async def test_coalesce_falls_back_to_dropping_oldest() -> None:
+    assistant_id = uuid.uuid4()
+    conversation_id = uuid.uuid4()
+    forwarded: list[str] = []
+    done = asyncio.Event()
+
+    async def forward(_: uuid.UUID, event: ConversationEvent) -> None:
+        forwarded.append(event.data["name"])
+        if len(forwarded) == 2:
+            done.set()
+
+    forwarder = AssistantEventForwarder(
+        forward=forward, concurrency=1, max_queue_size=2, overflow_policy="coalesce", idle_seconds=60
+    )
+    async with forwarder.lifespan():
+        # message events are never coalesced
+        for name in ["message-1", "message-2", "message-3"]:
+            assert forwarder.enqueue(assistant_id, create_event(conversation_id, data={"name": name}))
+
+        async with asyncio.timeout(5):
+            await done.wait()
+
+    assert forwarded == ["message-2", "message-3"]
+
+
+async def test_idle_pools_are_removed() -> None:
+    assistant_ids = [uuid.uuid4(), uuid.uuid4()]
+    forwarded: list[uuid.UUID] = []
+
+    async def forward(assistant_id: uuid.UUID, _: ConversationEvent) -> None:
+        forwarded.append(assistant_id)
+
+    forwarder = AssistantEventForwarder(
+        forward=forward, concurrency=2, max_queue_size=100, overflow_policy="reject", idle_seconds=0.1
+    )
+    async with forwarder.lifespan():
+        for assistant_id in assistant_ids:
+            assert forwarder.enqueue(assistant_id, create_event(uuid.uuid4()))
+
+        assert forwarder.pool_count == 2
+
+        await forwarder.remove(assistant_ids[1])
+        assert forwarder.pool_count == 1
+
+        async with asyncio.timeout(5):
+            while forwarder.pool_count > 0:
+                await asyncio.sleep(0.01)
+
+        # the next event for an assistant starts a new pool
+        assert forwarder.enqueue(assistant_ids[0], create_event(uuid.uuid4()))
+        assert forwarder.pool_count == 1
+
+        async with asyncio.timeout(5):
+            while len(forwarded) < 2:
+                await asyncio.sleep(0.01)
+
+    assert forwarded == [assistant_ids[0], assistant_ids[0]]
@@ -0,0 +1,52 @@
+import asyncio
+import uuid
+from typing import Sequence
+
+from semantic_workbench_service.assistant_recipient_cache import AssistantRecipientCache
+
+
+async def test_recipients_are_cached_until_invalidated() -> None:
+    conversation_id = uuid.uuid4()
+    assistant_ids = [uuid.uuid4()]
+    loads: list[uuid.UUID] = []
+
+    async def load(conversation_id: uuid.UUID) -> Sequence[uuid.UUID]:
+        loads.append(conversation_id)
+        return assistant_ids
+
+    cache = AssistantRecipientCache(max_conversations=10, ttl_seconds=60)
+
+    assert await cache.get(conversation_id, load) == tuple(assistant_ids)
+    assert await cache.get(conversation_id, load) == tuple(assistant_ids)
+    assert loads == [conversation_id]
+
+    cache.invalidate(conversation_id)
+    assistant_ids = []
+
+    assert await cache.get(conversation_id, load) == ()
+    assert loads == [conversation_id, conversation_id]
+
+
+async def test_recipients_loaded_during_invalidation_are_not_cached() -> None:
+    conversation_id = uuid.uuid4()
+    loading = asyncio.Event()
+    release = asyncio.Event()
+    loads = 0
+
+    async def load(_: uuid.UUID) -> Sequence[uuid.UUID]:
+        nonlocal loads
+        loads += 1
+        loading.set()
+        await release.wait()
+        return [uuid.uuid4()]
+
+    cache = AssistantRecipientCache(max_conversations=10, ttl_seconds=60)
+
+    task = asyncio.create_task(cache.get(conversation_id, load))
+    await loading.wait()
+    cache.invalidate(conversation_id)
+    release.set()
+    await task
+
+    await cache.get(conversation_id, load)
+    assert loads == 2
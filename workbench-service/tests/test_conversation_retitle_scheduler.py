@@ -0,0 +1,58 @@
+import asyncio
+import uuid
+
+from semantic_workbench_service import auth
+from semantic_workbench_service.conversation_retitle_scheduler import ConversationRetitleScheduler
+
+principal = auth.UserPrincipal(user_id="user-id", name="user")
+
+
+async def test_burst_is_retitled_once() -> None:
+    conversation_ids = [uuid.uuid4(), uuid.uuid4()]
+    retitled: list[uuid.UUID] = []
+
+    async def retitle(_: auth.ActorPrincipal, conversation_id: uuid.UUID) -> None:
+        retitled.append(conversation_id)
+
+    scheduler = ConversationRetitleScheduler(retitle=retitle, debounce_seconds=0.05)
+    async with scheduler.lifespan():
+        for _ in range(5):
+            for conversation_id in conversation_ids:
+                scheduler.schedule(principal, conversation_id)
+            await asyncio.sleep(0.01)
+
+        assert retitled == []
+
+        await asyncio.sleep(0.2)
+
+    assert sorted(retitled) == sorted(conversation_ids)
+
+
+async def test_scheduled_during_retitle_is_retitled_again() -> None:
+    conversation_id = uuid.uuid4()
+    started = asyncio.Event()
+    release = asyncio.Event()
+    retitle_count = 0
+
+    async def retitle(_: auth.ActorPrincipal, conversation_id: uuid.UUID) -> None:
+        nonlocal retitle_count
+        retitle_count += 1
+        started.set()
+        await release.wait()
+
+    scheduler = ConversationRetitleScheduler(retitle=retitle, debounce_seconds=0)
+    async with scheduler.lifespan():
+        scheduler.schedule(principal, conversation_id)
+        async with asyncio.timeout(5):
+            await started.wait()
+
+        # scheduled while the retitle is in progress, so run once more after it completes
+        scheduler.schedule(principal, conversation_id)
+        scheduler.schedule(principal, conversation_id)
+        await asyncio.sleep(0.05)
+        assert retitle_count == 1
+
+        release.set()
+        await asyncio.sleep(0.05)
+
+    assert retitle_count == 2
@@ -0,0 +1,64 @@
+import time
+import uuid
+
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from semantic_workbench_service.event_buffer import ConversationEventBuffer
+
+
+def create_event(conversation_id: uuid.UUID) -> ConversationEvent:
+    return ConversationEvent(conversation_id=conversation_id, event=ConversationEventType.message_created)
+
+
+def test_events_after_returns_missed_events() -> None:
+    buffer = ConversationEventBuffer(max_events_per_conversation=10, max_events=100, ttl_seconds=60)
+    conversation_id = uuid.uuid4()
+    events = [create_event(conversation_id) for _ in range(5)]
+    for event in events:
+        buffer.append(event)
+
+    # events from other conversations are not included
+    buffer.append(create_event(uuid.uuid4()))
+
+    assert buffer.events_after(conversation_id, events[1].id) == events[2:]
+    assert buffer.events_after(conversation_id, events[-1].id) == []
+
+
+def test_events_after_unknown_event_id() -> None:
+    buffer = ConversationEventBuffer(max_events_per_conversation=3, max_events=100, ttl_seconds=60)
+    conversation_id = uuid.uuid4()
+    events = [create_event(conversation_id) for _ in range(5)]
+    for event in events:
+        buffer.append(event)
+
+    # the oldest events have been dropped from the ring buffer
+    assert buffer.events_after(conversation_id, events[0].id) is None
+    assert buffer.events_after(conversation_id, events[2].id) == events[3:]
+    assert buffer.events_after(uuid.uuid4(), events[2].id) is None
+
+
+def test_idle_conversations_are_evicted() -> None:
+    buffer = ConversationEventBuffer(max_events_per_conversation=10, max_events=100, ttl_seconds=0.1)
+    conversation_id = uuid.uuid4()
+    event = create_event(conversation_id)
+    buffer.append(event)
+    buffer.append(create_event(conversation_id))
+
+    assert buffer.events_after(conversation_id, event.id) is not None
+
+    time.sleep(0.2)
+
+    assert buffer.events_after(conversation_id, event.id) is None
+
+
+def test_least_recently_updated_conversations_are_evicted_over_max_events() -> None:
+    buffer = ConversationEventBuffer(max_events_per_conversation=3, max_events=6, ttl_seconds=60)
+    conversation_ids = [uuid.uuid4() for _ in range(3)]
+    first_events = {conversation_id: create_event(conversation_id) for conversation_id in conversation_ids}
+    for conversation_id in conversation_ids:
+        buffer.append(first_events[conversation_id])
+        buffer.append(create_event(conversation_id))
+
+    # the first conversation was evicted to make room for the events of the third
+    assert buffer.events_after(conversation_ids[0], first_events[conversation_ids[0]].id) is None
+    assert buffer.events_after(conversation_ids[1], first_events[conversation_ids[1]].id) is not None
+    assert buffer.events_after(conversation_ids[2], first_events[conversation_ids[2]].id) is not None
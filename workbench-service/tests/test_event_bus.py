@@ -0,0 +1,145 @@
+import asyncio
+import uuid
+
+import pytest
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from semantic_workbench_service import event_bus
+from semantic_workbench_service.config import DBSettings, EventBusSettings
+from semantic_workbench_service.event import ConversationEventQueueItem
+
+
+def create_queue_item(content: str = "hello") -> ConversationEventQueueItem:
+    return ConversationEventQueueItem(
+        event=ConversationEvent(
+            conversation_id=uuid.uuid4(),
+            event=ConversationEventType.message_created,
+            data={"message": {"content": content}},
+        ),
+    )
+
+
+async def test_in_memory_event_bus_delivers_to_handler() -> None:
+    received: list[ConversationEventQueueItem] = []
+
+    async def handler(queue_item: ConversationEventQueueItem) -> None:
+        received.append(queue_item)
+
+    bus = event_bus.create_event_bus(settings=EventBusSettings(), db_settings=DBSettings(), handler=handler)
+    queue_item = create_queue_item()
+
+    async with bus.lifespan():
+        await bus.publish(queue_item)
+
+    assert received == [queue_item]
+
+
+def test_postgres_event_bus_requires_postgres_url() -> None:
+    async def handler(_: ConversationEventQueueItem) -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        event_bus.create_event_bus(
+            settings=EventBusSettings(type="postgresql"),
+            db_settings=DBSettings(url="sqlite:///.data/workbench.db"),
+            handler=handler,
+        )
+
+
+@pytest.mark.parametrize("content", ["short", "ü" * 20_000], ids=["single", "chunked"])
+async def test_postgres_event_bus_reassembles_notifications(content: str) -> None:
+    async def handler(_: ConversationEventQueueItem) -> None:
+        pass
+
+    bus = event_bus.PostgresEventBus(
+        dsn="postgresql://localhost/workbench",
+        ssl="disable",
+        channel="channel",
+        reconnect_delay_seconds=1,
+        keepalive_interval_seconds=1,
+        publish_pool_size=1,
+        partial_payload_timeout_seconds=30,
+        handler=handler,
+    )
+
+    queue_item = create_queue_item(content)
+    chunks = event_bus.split_payload(queue_item.model_dump_json())
+    assert all(len(chunk.encode("utf-8")) < event_bus.NOTIFY_MAX_PAYLOAD_BYTES - 100 for chunk in chunks)
+
+    # notifications from the publishing process are ignored
+    for index, chunk in enumerate(chunks):
+        bus._on_notification(None, 0, "channel", f"{bus._origin}:message-1:{index}:{len(chunks)}:{chunk}")  # type: ignore
+    assert bus._received.empty()
+
+    for index, chunk in enumerate(chunks):
+        bus._on_notification(None, 0, "channel", f"other:message-2:{index}:{len(chunks)}:{chunk}")  # type: ignore
+    assert bus._received.qsize() == 1
+    assert bus._received.get_nowait() == queue_item
+
+
+async def test_postgres_event_bus_discards_incomplete_notifications() -> None:
+    async def handler(_: ConversationEventQueueItem) -> None:
+        pass
+
+    bus = event_bus.PostgresEventBus(
+        dsn="postgresql://localhost/workbench",
+        ssl="disable",
+        channel="channel",
+        reconnect_delay_seconds=1,
+        keepalive_interval_seconds=1,
+        publish_pool_size=1,
+        partial_payload_timeout_seconds=0.1,
+        handler=handler,
+    )
+
+    queue_item = create_queue_item("ü" * 20_000)
+    chunks = event_bus.split_payload(queue_item.model_dump_json())
+    assert len(chunks) > 1
+
+    # the last chunk is lost
+    for index, chunk in enumerate(chunks[:-1]):
+        bus._on_notification(None, 0, "channel", f"other:message-1:{index}:{len(chunks)}:{chunk}")  # type: ignore
+    assert "message-1" in bus._partial_payloads
+
+    await asyncio.sleep(0.2)
+
+    for index, chunk in enumerate(chunks):
+        bus._on_notification(None, 0, "channel", f"other:message-2:{index}:{len(chunks)}:{chunk}")  # type: ignore
+
+    assert "message-1" not in bus._partial_payloads
+    assert len(bus._partial_payloads) == 0
+    assert bus._received.qsize() == 1
+    assert bus._received.get_nowait() == queue_item
+
+
+async def test_postgres_event_bus_delivers_across_processes(db_settings: DBSettings, db_type: str) -> None:
+    if db_type != "postgresql":
+        pytest.skip("requires a postgresql database")
+
+    received_by_publisher: list[ConversationEventQueueItem] = []
+    received_by_subscriber: asyncio.Queue[ConversationEventQueueItem] = asyncio.Queue()
+
+    async def publisher_handler(queue_item: ConversationEventQueueItem) -> None:
+        received_by_publisher.append(queue_item)
+
+    async def subscriber_handler(queue_item: ConversationEventQueueItem) -> None:
+        received_by_subscriber.put_nowait(queue_item)
+
+    settings = EventBusSettings(type="postgresql", postgresql_channel=f"test_{uuid.uuid4().hex}")
+    publisher = event_bus.create_event_bus(settings=settings, db_settings=db_settings, handler=publisher_handler)
+    subscriber = event_bus.create_event_bus(settings=settings, db_settings=db_settings, handler=subscriber_handler)
+
+    async with publisher.lifespan(), subscriber.lifespan():
+        # allow the listeners to connect
+        await asyncio.sleep(0.5)
+
+        small_item = create_queue_item()
+        large_item = create_queue_item("x" * 50_000)
+        await publisher.publish(small_item)
+        await publisher.publish(large_item)
+
+        async with asyncio.timeout(5):
+            assert await received_by_subscriber.get() == small_item
+            assert await received_by_subscriber.get() == large_item
+
+    # the publisher receives each event once, directly
+    assert received_by_publisher == [small_item, large_item]
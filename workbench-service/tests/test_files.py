@@ -1,4 +1,6 @@
 import io
+import os
+import time
 import uuid
 
 import pytest
@@ -19,13 +21,13 @@ def test_read_file_not_found(storage_settings: files.StorageSettings) -> None:
         f.read()
 
 
-def test_write_file(storage_settings: files.StorageSettings) -> None:
+async def test_write_file(storage_settings: files.StorageSettings) -> None:
     file_storage = files.Storage(settings=storage_settings)
 
-    file_storage.write_file(namespace="conversation_id", filename="filename", content=io.BytesIO(b"content"))
+    await file_storage.write_file(namespace="conversation_id", filename="filename", content=io.BytesIO(b"content"))
 
 
-def test_write_read_delete_file(storage_settings: files.StorageSettings) -> None:
+async def test_write_read_delete_file(storage_settings: files.StorageSettings) -> None:
     file_storage = files.Storage(settings=storage_settings)
 
     conversation_id = uuid.uuid4().hex
@@ -33,12 +35,51 @@ def test_write_read_delete_file(storage_settings: files.StorageSettings) -> None
     file_content = b"""
     this is a text file.
     """
-    file_storage.write_file(namespace=conversation_id, filename=filename, content=io.BytesIO(file_content))
+    await file_storage.write_file(namespace=conversation_id, filename=filename, content=io.BytesIO(file_content))
 
     with file_storage.read_file(namespace=conversation_id, filename=filename) as f:
         assert f.read() == file_content
 
-    file_storage.delete_file(namespace=conversation_id, filename=filename)
+    await file_storage.delete_file(namespace=conversation_id, filename=filename)
 
     with pytest.raises(FileNotFoundError), file_storage.read_file(namespace=conversation_id, filename=filename) as f:
         pass
+
+
+async def test_write_read_delete_blob(storage_settings: files.StorageSettings) -> None:
+    file_storage = files.Storage(settings=storage_settings)
+
+    file_content = uuid.uuid4().bytes * 100_000
+    content_hash = await file_storage.write_blob(io.BytesIO(file_content))
+
+    # identical content is stored once
+    assert await file_storage.write_blob(io.BytesIO(file_content)) == content_hash
+    assert await file_storage.write_blob(io.BytesIO(b"other content")) != content_hash
+    assert list((file_storage.root / "blobs").glob(".upload-*")) == []
+
+    with file_storage.read_blob(content_hash) as f:
+        assert f.read() == file_content
+
+    await file_storage.delete_blob(content_hash)
+
+    with pytest.raises(FileNotFoundError), file_storage.read_blob(content_hash) as f:
+        pass
+
+
+async def test_delete_blob_modified_before(storage_settings: files.StorageSettings) -> None:
+    file_storage = files.Storage(settings=storage_settings)
+
+    content_hash = await file_storage.write_blob(io.BytesIO(b"content"))
+    assert await file_storage.list_blobs() == [content_hash]
+
+    # a blob written since is kept
+    written_time = time.time()
+    os.utime(file_storage.blob_path(content_hash), (written_time, written_time))
+    assert not await file_storage.delete_blob(content_hash, modified_before=written_time - 60)
+    assert await file_storage.list_blobs() == [content_hash]
+    with file_storage.read_blob(content_hash) as f:
+        assert f.read() == b"content"
+
+    assert await file_storage.delete_blob(content_hash, modified_before=written_time + 60)
+    assert await file_storage.list_blobs() == []
+    assert not await file_storage.delete_blob(content_hash, modified_before=written_time + 60)
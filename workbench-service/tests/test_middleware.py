@@ -1,3 +1,4 @@
+import time
 import uuid
 
 import fastapi
@@ -83,6 +84,40 @@ def test_auth_middleware_accepts_valid_user(test_user: MockUser):
         assert http_response.status_code == 404
 
 
+def test_auth_middleware_rejects_cached_token_once_expired(monkeypatch: pytest.MonkeyPatch) -> None:
+    algo = "HS256"
+    app_id = "test-app-id"
+
+    monkeypatch.setattr(settings.auth, "allowed_app_id", app_id)
+    monkeypatch.setattr(settings.auth, "allowed_jwt_algorithms", {algo})
+
+    now = time.time()
+    token = jwt.encode(
+        claims={"tid": str(uuid.uuid4()), "oid": str(uuid.uuid4()), "appid": app_id, "exp": int(now + 60)},
+        key="",
+        algorithm=algo,
+    )
+
+    app = fastapi.FastAPI()
+    app.add_middleware(middleware.AuthMiddleware, api_key_source=mock_api_key_source())
+
+    with TestClient(app) as client:
+        http_response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+        assert http_response.status_code == 404
+
+        # the decoded token is cached, and is still checked against the allowed app
+        monkeypatch.setattr(settings.auth, "allowed_app_id", "another-app-id")
+        http_response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+        assert http_response.status_code == 401
+        assert http_response.json()["detail"].lower() == "invalid app"
+
+        monkeypatch.setattr(settings.auth, "allowed_app_id", app_id)
+        monkeypatch.setattr(middleware.time, "time", lambda: now + 120)
+        http_response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+        assert http_response.status_code == 401
+        assert http_response.json()["detail"].lower() == "expired token"
+
+
 def test_auth_middleware_accepts_valid_assistant_service():
     test_api_key = uuid.uuid4().hex
 
@@ -0,0 +1,71 @@
+import asyncio
+import uuid
+from typing import Sequence
+
+from semantic_workbench_service.user_event_notifier import UserEventNotifier
+
+
+async def test_notifications_are_coalesced_per_conversation() -> None:
+    conversation_ids = [uuid.uuid4(), uuid.uuid4()]
+    delivered: list[tuple[str, uuid.UUID]] = []
+
+    async def load_user_ids(_: uuid.UUID) -> Sequence[str]:
+        return ["user-1", "user-2"]
+
+    async def deliver(user_id: str, conversation_id: uuid.UUID) -> None:
+        delivered.append((user_id, conversation_id))
+
+    notifier = UserEventNotifier(
+        load_user_ids=load_user_ids, deliver=deliver, window_seconds=0.05, max_conversations=10, ttl_seconds=60
+    )
+    async with notifier.lifespan():
+        for _ in range(10):
+            for conversation_id in conversation_ids:
+                notifier.notify(conversation_id)
+
+        await asyncio.sleep(0.1)
+
+        assert sorted(delivered) == sorted(
+            (user_id, conversation_id) for user_id in ["user-1", "user-2"] for conversation_id in conversation_ids
+        )
+
+        # a change after the window is notified again
+        notifier.notify(conversation_ids[0])
+        await asyncio.sleep(0.1)
+
+        assert len(delivered) == 6
+
+
+async def test_user_ids_are_cached_until_invalidated() -> None:
+    conversation_id = uuid.uuid4()
+    user_ids = ["user-1"]
+    loads: list[uuid.UUID] = []
+    delivered: list[str] = []
+
+    async def load_user_ids(conversation_id: uuid.UUID) -> Sequence[str]:
+        loads.append(conversation_id)
+        return user_ids
+
+    async def deliver(user_id: str, _: uuid.UUID) -> None:
+        delivered.append(user_id)
+
+    notifier = UserEventNotifier(
+        load_user_ids=load_user_ids, deliver=deliver, window_seconds=0, max_conversations=10, ttl_seconds=60
+    )
+    async with notifier.lifespan():
+        notifier.notify(conversation_id)
+        await asyncio.sleep(0.01)
+        notifier.notify(conversation_id)
+        await asyncio.sleep(0.01)
+
+        assert loads == [conversation_id]
+        assert delivered == ["user-1", "user-1"]
+
+        notifier.invalidate(conversation_id)
+        user_ids = ["user-1", "user-2"]
+
+        notifier.notify(conversation_id)
+        await asyncio.sleep(0.01)
+
+        assert loads == [conversation_id, conversation_id]
+        assert delivered == ["user-1", "user-1", "user-1", "user-2"]
@@ -1,8 +1,11 @@
 import asyncio
+import base64
+import contextlib
 import datetime
 import io
 import json
 import logging
+import pathlib
 import re
 import time
 import uuid
@@ -13,11 +16,16 @@ import openai_client
 import pytest
 import semantic_workbench_api_model.assistant_model as api_model
 import semantic_workbench_service
+import semantic_workbench_service.files
+import semantic_workbench_service.tokens
+import sse_starlette.sse
+from asgi_lifespan import LifespanManager
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from pydantic import HttpUrl
 from pytest_httpx import HTTPXMock
 from semantic_workbench_api_model import workbench_model, workbench_service_client
+from starlette.types import Message
 
 from .types import MockUser
 
@@ -27,6 +35,14 @@ def test_service_init(workbench_service: FastAPI):
         pass
 
 
+def test_get_metrics_without_credentials(workbench_service: FastAPI):
+    with TestClient(app=workbench_service) as client:
+        http_response = client.get("/metrics")
+        assert http_response.status_code == 200
+        assert http_response.headers["content-type"].startswith("text/plain")
+        assert "workbench_assistant_event_queue_depth" in http_response.text
+
+
 id_segment = "[0-9a-f-]+"
 
 
@@ -166,6 +182,13 @@ class AsyncContextManagerMock:
         pass
 
 
+@pytest.fixture
+def no_retitle_debounce(monkeypatch: pytest.MonkeyPatch) -> None:
+    # the retitle scheduler reads its debounce period when the service is initialized
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "conversation_retitle_debounce_seconds", 0)
+
+
+@pytest.mark.usefixtures("no_retitle_debounce")
 def test_create_conversation_and_retitle(
     workbench_service: FastAPI, test_user: MockUser, monkeypatch: pytest.MonkeyPatch
 ):
@@ -249,6 +272,156 @@ def test_create_update_conversation(workbench_service: FastAPI, test_user: MockU
         assert exclude_system_keys(get_conversation_response.metadata) == updated_metadata
 
 
+@pytest.fixture
+def sse_app_status(monkeypatch: pytest.MonkeyPatch) -> None:
+    # sse_starlette keeps a process-wide exit event, which is bound to the event loop of the first test to use it
+    monkeypatch.setattr(sse_starlette.sse.AppStatus, "should_exit_event", None)
+
+
+def start_server_sent_events(
+    app: FastAPI, path: str, headers: dict[str, str]
+) -> tuple[asyncio.Task[None], asyncio.Queue[bytes]]:
+    """
+    Starts a GET request for an event stream, returning the task running the request and a queue that receives
+    each chunk of the response body as it is sent. httpx.ASGITransport buffers whole responses, so it cannot be
+    used to read event streams that do not end.
+    """
+    chunks = asyncio.Queue[bytes]()
+
+    async def receive() -> Message:
+        # the client does not disconnect; the request task is cancelled instead
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.put_nowait(message["body"])
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test"), *((name.lower().encode(), value.encode()) for name, value in headers.items())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    return asyncio.create_task(app(scope, receive, send)), chunks
+
+
+async def test_conversation_events_reset_when_missed_events_cannot_be_replayed(
+    workbench_service: FastAPI,
+    test_user: MockUser,
+    sse_app_status: None,
+) -> None:
+    async with (
+        LifespanManager(workbench_service),
+        httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=workbench_service),
+            headers=test_user.authorization_headers,
+            base_url="http://test",
+        ) as client,
+    ):
+        new_conversation = workbench_model.NewConversation(title="test-conversation")
+        http_response = await client.post("/conversations", json=new_conversation.model_dump(mode="json"))
+        assert httpx.codes.is_success(http_response.status_code)
+
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+
+        events_task, chunks = start_server_sent_events(
+            workbench_service,
+            f"/conversations/{conversation.id}/events",
+            headers={**test_user.authorization_headers, "Last-Event-ID": uuid.uuid4().hex},
+        )
+        try:
+            chunk = await asyncio.wait_for(chunks.get(), timeout=5)
+            assert b"event: reset" in chunk
+
+        finally:
+            events_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await events_task
+
+
+async def test_conversation_events_stop_when_service_stops(
+    workbench_service: FastAPI,
+    test_user: MockUser,
+    sse_app_status: None,
+) -> None:
+    async with (
+        LifespanManager(workbench_service),
+        httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=workbench_service),
+            headers=test_user.authorization_headers,
+            base_url="http://test",
+        ) as client,
+    ):
+        new_conversation = workbench_model.NewConversation(title="test-conversation")
+        http_response = await client.post("/conversations", json=new_conversation.model_dump(mode="json"))
+        assert httpx.codes.is_success(http_response.status_code)
+
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+
+        events_task, chunks = start_server_sent_events(
+            workbench_service,
+            f"/conversations/{conversation.id}/events",
+            headers=test_user.authorization_headers,
+        )
+
+        # wait for an event, so that the stream is known to be running
+        http_response = await client.post(f"/conversations/{conversation.id}/messages", json={"content": "hello"})
+        assert httpx.codes.is_success(http_response.status_code)
+
+        chunk = await asyncio.wait_for(chunks.get(), timeout=5)
+        assert b"event: message.created" in chunk
+
+    # stopping the service ends the stream, without the client disconnecting
+    await asyncio.wait_for(events_task, timeout=5)
+
+
+async def test_conversation_events_send_heartbeats(
+    workbench_service: FastAPI,
+    test_user: MockUser,
+    sse_app_status: None,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "sse_heartbeat_interval_seconds", 1)
+
+    async with (
+        LifespanManager(workbench_service),
+        httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=workbench_service),
+            headers=test_user.authorization_headers,
+            base_url="http://test",
+        ) as client,
+    ):
+        new_conversation = workbench_model.NewConversation(title="test-conversation")
+        http_response = await client.post("/conversations", json=new_conversation.model_dump(mode="json"))
+        assert httpx.codes.is_success(http_response.status_code)
+
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+
+        events_task, chunks = start_server_sent_events(
+            workbench_service,
+            f"/conversations/{conversation.id}/events",
+            headers=test_user.authorization_headers,
+        )
+        try:
+            # the stream is idle, so the first chunk is a heartbeat comment
+            chunk = await asyncio.wait_for(chunks.get(), timeout=5)
+            assert chunk.startswith(b": ping")
+
+        finally:
+            events_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await events_task
+
+
 def test_create_assistant_add_to_conversation(
     workbench_service: FastAPI,
     httpx_mock: HTTPXMock,
@@ -874,6 +1047,37 @@ def test_create_conversation_send_user_message(workbench_service: FastAPI, test_
         messages = workbench_model.ConversationMessageList.model_validate(http_response.json())
         assert len(messages.messages) == 3
 
+        # page back through messages with cursors
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages", params={"message_type": "chat", "limit": 1}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        messages = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.id for m in messages.messages] == [message_two_id]
+        assert messages.prev_cursor is not None
+        assert messages.next_cursor is not None
+        next_cursor = messages.next_cursor
+
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages",
+            params={"message_type": "chat", "limit": 1, "cursor": messages.prev_cursor},
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        messages = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.id for m in messages.messages] == [message_id]
+        assert messages.prev_cursor is None
+
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages", params={"message_type": "chat", "cursor": next_cursor}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        messages = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert messages.messages == []
+        assert messages.next_cursor == next_cursor
+
+        http_response = client.get(f"/conversations/{conversation_id}/messages", params={"cursor": "not-a-cursor"})
+        assert http_response.status_code == httpx.codes.BAD_REQUEST
+
         # check latest chat message in conversation (chat is default)
         http_response = client.get(f"/conversations/{conversation_id}")
         assert httpx.codes.is_success(http_response.status_code)
@@ -888,6 +1092,351 @@ def test_create_conversation_send_user_message(workbench_service: FastAPI, test_
         assert conversation.latest_message is not None
         assert conversation.latest_message.id == message_log_id
 
+        # the latest message moves back when the latest message is deleted
+        http_response = client.delete(f"/conversations/{conversation_id}/messages/{message_two_id}")
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get(f"/conversations/{conversation_id}")
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+        assert conversation.latest_message is not None
+        assert conversation.latest_message.id == message_id
+
+
+def test_create_conversation_page_messages_with_cursors(workbench_service: FastAPI, test_user: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = workbench_model.Conversation.model_validate(http_response.json()).id
+
+        contents = [f"message {index}" for index in range(7)]
+        for content in contents:
+            http_response = client.post(f"/conversations/{conversation_id}/messages", json={"content": content})
+            assert httpx.codes.is_success(http_response.status_code)
+
+        def get_page(cursor: str | None = None) -> workbench_model.ConversationMessageList:
+            params: dict[str, str | int] = {"limit": 2}
+            if cursor is not None:
+                params["cursor"] = cursor
+            http_response = client.get(f"/conversations/{conversation_id}/messages", params=params)
+            assert httpx.codes.is_success(http_response.status_code)
+            return workbench_model.ConversationMessageList.model_validate(http_response.json())
+
+        # page back from the latest messages
+        pages = [get_page()]
+        while pages[-1].prev_cursor is not None:
+            pages.append(get_page(pages[-1].prev_cursor))
+
+        assert [[m.content for m in page.messages] for page in pages] == [
+            contents[5:7],
+            contents[3:5],
+            contents[1:3],
+            contents[0:1],
+        ]
+
+        # page forward from the oldest message, through the messages that immediately follow each cursor
+        assert pages[-1].next_cursor is not None
+        page = get_page(pages[-1].next_cursor)
+        assert [m.content for m in page.messages] == contents[1:3]
+
+        assert page.prev_cursor is not None
+        assert [m.content for m in get_page(page.prev_cursor).messages] == contents[0:1]
+
+        forward_contents = [m.content for m in page.messages]
+        next_cursor = page.next_cursor
+        while page.messages:
+            next_cursor = page.next_cursor
+            assert next_cursor is not None
+            page = get_page(next_cursor)
+            forward_contents.extend(m.content for m in page.messages)
+
+        assert forward_contents == contents[1:]
+        # the last cursor is returned again, to poll for new messages
+        assert page.next_cursor == next_cursor
+        assert page.prev_cursor is not None
+
+
+def test_create_conversation_get_message_history(
+    workbench_service: FastAPI, test_user: MockUser, monkeypatch: pytest.MonkeyPatch
+):
+    # read the history in batches smaller than the messages that fit the budget
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "message_history_batch_size", 1)
+
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = workbench_model.Conversation.model_validate(http_response.json()).id
+
+        for content in ["one " * 100, "two " * 10, "three " * 10]:
+            http_response = client.post(f"/conversations/{conversation_id}/messages", json={"content": content})
+            assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.post(
+            f"/conversations/{conversation_id}/messages", json={"content": "log " * 1000, "message_type": "log"}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages/history",
+            params={"token_limit": 100, "message_type": "chat"},
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        history = workbench_model.ConversationMessageHistory.model_validate(http_response.json())
+
+        # the newest messages that fit the budget are returned, oldest first
+        assert [m.content for m in history.messages] == ["two " * 10, "three " * 10]
+        assert 0 < history.token_count <= 100
+        assert history.total_token_count > history.token_count + 100
+
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages/history",
+            params={"token_limit": 100_000, "message_type": "chat", "encoding": "cl100k_base"},
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        history = workbench_model.ConversationMessageHistory.model_validate(http_response.json())
+
+        assert len(history.messages) == 3
+        assert history.token_count == history.total_token_count
+
+        # token counts are stored when messages are created and returned with them
+        for message in history.messages:
+            assert set(message.token_counts) == set(workbench_model.TokenEncoding)
+            assert message.token_counts[workbench_model.TokenEncoding.cl100k_base] > 0
+
+
+def test_create_conversation_message_when_tokens_cannot_be_counted(
+    workbench_service: FastAPI, test_user: MockUser, monkeypatch: pytest.MonkeyPatch
+):
+    encodings_available = False
+    original_count_tokens_by_encoding = semantic_workbench_service.tokens.count_tokens_by_encoding
+
+    def count_tokens_by_encoding(content: str) -> dict[str, int]:
+        if not encodings_available:
+            raise ConnectionError("encodings are not available")
+        return original_count_tokens_by_encoding(content)
+
+    monkeypatch.setattr(semantic_workbench_service.tokens, "count_tokens_by_encoding", count_tokens_by_encoding)
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "message_token_count_interval_seconds", 0.1)
+
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = workbench_model.Conversation.model_validate(http_response.json()).id
+
+        http_response = client.post(f"/conversations/{conversation_id}/messages", json={"content": "hello"})
+        assert httpx.codes.is_success(http_response.status_code)
+        message = workbench_model.ConversationMessage.model_validate(http_response.json())
+        assert message.content == "hello"
+        assert message.token_counts == {}
+
+        # the tokens of messages that have not been counted are estimated from their length
+        http_response = client.get(f"/conversations/{conversation_id}/messages/history", params={"token_limit": 100})
+        assert httpx.codes.is_success(http_response.status_code)
+        history = workbench_model.ConversationMessageHistory.model_validate(http_response.json())
+        assert [m.content for m in history.messages] == ["hello"]
+        assert history.token_count == semantic_workbench_service.tokens.TOKENS_PER_MESSAGE + 2
+
+        # and are counted in the background once tokens can be counted
+        encodings_available = True
+        for _ in range(50):
+            http_response = client.get(f"/conversations/{conversation_id}/messages/{message.id}")
+            assert httpx.codes.is_success(http_response.status_code)
+            message = workbench_model.ConversationMessage.model_validate(http_response.json())
+            if message.token_counts:
+                break
+            time.sleep(0.1)
+
+        assert set(message.token_counts) == set(workbench_model.TokenEncoding)
+
+
+def test_create_conversation_batch_operations(workbench_service: FastAPI, test_user: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+        conversation_id = conversation.id
+
+        batch_request = workbench_model.ConversationBatchRequest(
+            operations=[
+                workbench_model.ConversationBatchOperation(
+                    method="PATCH", path="/participants/me", body={"status": "x"}
+                ),
+                workbench_model.ConversationBatchOperation(method="POST", path="/messages", body={"content": "hello"}),
+                workbench_model.ConversationBatchOperation(method="POST", path="/messages", body={"content": "again"}),
+                workbench_model.ConversationBatchOperation(method="GET"),
+                workbench_model.ConversationBatchOperation(method="GET", path="/participants"),
+                workbench_model.ConversationBatchOperation(
+                    method="GET", path="/messages", params={"message_type": ["chat"], "limit": "1"}
+                ),
+                workbench_model.ConversationBatchOperation(method="PATCH", body={"metadata": {"key": "value"}}),
+                workbench_model.ConversationBatchOperation(method="GET", path=f"/messages/{uuid.uuid4()}"),
+            ]
+        )
+        http_response = client.post(
+            f"/conversations/{conversation_id}/batch", json=batch_request.model_dump(mode="json")
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        results = workbench_model.ConversationBatchResponse.model_validate(http_response.json()).results
+
+        assert [result.status_code for result in results] == [200, 200, 200, 200, 200, 200, 200, 404]
+
+        participant = workbench_model.ConversationParticipant.model_validate(results[0].body)
+        assert participant.status == "x"
+
+        message = workbench_model.ConversationMessage.model_validate(results[1].body)
+        assert message.content == "hello"
+        assert message.sender.participant_id == test_user.id
+
+        # writes are performed in order, before the reads that follow them
+        batched_conversation = workbench_model.Conversation.model_validate(results[3].body)
+        assert batched_conversation.id == conversation_id
+        assert batched_conversation.latest_message is not None
+        assert batched_conversation.latest_message.content == "again"
+
+        participants = workbench_model.ConversationParticipantList.model_validate(results[4].body)
+        assert [p.id for p in participants.participants] == [test_user.id]
+
+        messages = workbench_model.ConversationMessageList.model_validate(results[5].body)
+        assert [m.content for m in messages.messages] == ["again"]
+
+        updated_conversation = workbench_model.Conversation.model_validate(results[6].body)
+        assert updated_conversation.metadata["key"] == "value"
+
+        # operations are limited to the conversation's endpoints, and are validated before any are performed
+        for path in ["/../../conversations", "messages", "/events", "/batch", "/messages?limit=1", "/%2e%2e"]:
+            batch_request = workbench_model.ConversationBatchRequest(
+                operations=[
+                    workbench_model.ConversationBatchOperation(method="POST", path="/messages", body={"content": "no"}),
+                    workbench_model.ConversationBatchOperation(method="GET", path=path),
+                ]
+            )
+            http_response = client.post(
+                f"/conversations/{conversation_id}/batch", json=batch_request.model_dump(mode="json")
+            )
+            assert http_response.status_code == httpx.codes.BAD_REQUEST
+
+        http_response = client.get(f"/conversations/{conversation_id}/messages")
+        assert httpx.codes.is_success(http_response.status_code)
+        messages = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.content for m in messages.messages] == ["hello", "again"]
+
+        # bodies that are not JSON are returned base64-encoded, with their content type
+        payload = [("files", ("test.txt", "hello world\n", "text/plain"))]
+        http_response = client.put(f"/conversations/{conversation_id}/files", files=payload)
+        assert httpx.codes.is_success(http_response.status_code)
+
+        batch_request = workbench_model.ConversationBatchRequest(
+            operations=[workbench_model.ConversationBatchOperation(method="GET", path="/files/test.txt")]
+        )
+        http_response = client.post(
+            f"/conversations/{conversation_id}/batch", json=batch_request.model_dump(mode="json")
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        results = workbench_model.ConversationBatchResponse.model_validate(http_response.json()).results
+
+        assert results[0].status_code == 200
+        assert results[0].body is None
+        assert results[0].content is not None
+        assert base64.b64decode(results[0].content) == b"hello world\n"
+        assert results[0].content_type is not None
+        assert results[0].content_type.startswith("text/plain")
+
+
+def conversation_api_client(
+    app: FastAPI, conversation_id: uuid.UUID, headers: dict[str, str]
+) -> workbench_service_client.ConversationAPIClient:
+    return workbench_service_client.ConversationAPIClient(
+        conversation_id=str(conversation_id),
+        httpx_client_factory=lambda: httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test", headers=headers
+        ),
+    )
+
+
+async def test_conversation_batch_client(workbench_service: FastAPI, test_user: MockUser) -> None:
+    async with LifespanManager(workbench_service):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=workbench_service),
+            headers=test_user.authorization_headers,
+            base_url="http://test",
+        ) as client:
+            http_response = await client.post("/conversations", json={"title": "test-conversation"})
+            assert httpx.codes.is_success(http_response.status_code)
+            conversation = workbench_model.Conversation.model_validate(http_response.json())
+
+        conversation_client = conversation_api_client(
+            workbench_service, conversation.id, test_user.authorization_headers
+        )
+        await conversation_client.write_file("path 1/notes?.txt", io.BytesIO(b"notes"), content_type="text/plain")
+
+        # more operations than the service accepts in one request are sent in several
+        async with conversation_client.batch() as batch:
+            sent = batch.send_messages(
+                *(workbench_model.NewConversationMessage(content=f"message {index}") for index in range(150))
+            )
+            updated_file = batch.update_file("path 1/notes?.txt", {"key": "value"})
+            missing_file = batch.update_file("missing.txt", {"key": "value"})
+            missing_participant = batch.update_participant(
+                str(uuid.uuid4()), workbench_model.UpdateParticipant(status="x")
+            )
+            messages = batch.get_messages(limit=200)
+
+        assert [message.content for message in (await sent).messages] == [f"message {index}" for index in range(150)]
+
+        # file names are quoted, so that any file can be updated
+        file_versions = await updated_file
+        assert file_versions.filename == "path 1/notes?.txt"
+        assert file_versions.versions[-1].metadata == {"key": "value"}
+
+        # an operation that fails raises from its own future, without failing the others
+        with pytest.raises(httpx.HTTPStatusError) as exc_info:
+            await missing_file
+        assert exc_info.value.response.status_code == httpx.codes.NOT_FOUND
+
+        with pytest.raises(httpx.HTTPStatusError) as exc_info:
+            await missing_participant
+        assert exc_info.value.response.status_code == httpx.codes.NOT_FOUND
+
+        assert len((await messages).messages) == 150
+
+
+async def test_conversation_batch_client_failed_request(workbench_service: FastAPI, test_user: MockUser) -> None:
+    async with LifespanManager(workbench_service):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=workbench_service),
+            headers=test_user.authorization_headers,
+            base_url="http://test",
+        ) as client:
+            http_response = await client.post("/conversations", json={"title": "test-conversation"})
+            assert httpx.codes.is_success(http_response.status_code)
+            conversation = workbench_model.Conversation.model_validate(http_response.json())
+
+        conversation_client = conversation_api_client(
+            workbench_service, conversation.id, test_user.authorization_headers
+        )
+
+        sent: asyncio.Future[workbench_model.ConversationMessageList] | None = None
+        rejected: asyncio.Future[workbench_model.ConversationParticipant] | None = None
+
+        # the second request is rejected, for an invalid path
+        with pytest.raises(httpx.HTTPStatusError) as exc_info:
+            async with conversation_client.batch() as batch:
+                sent = batch.send_messages(
+                    *(workbench_model.NewConversationMessage(content=f"message {index}") for index in range(100))
+                )
+                rejected = batch.update_participant("..", workbench_model.UpdateParticipant(status="x"))
+
+        assert exc_info.value.response.status_code == httpx.codes.BAD_REQUEST
+
+        # the operations of the first request were performed, and resolve with their results
+        assert sent is not None
+        assert rejected is not None
+        assert len((await sent).messages) == 100
+        assert rejected.cancelled()
+
+        messages = await conversation_client.get_messages(limit=200)
+        assert len(messages.messages) == 100
+
 
 @pytest.mark.httpx_mock(can_send_already_matched_responses=True)
 def test_create_assistant_send_assistant_message(
@@ -1028,6 +1577,16 @@ def test_create_conversation_write_read_delete_file(
         assert httpx.codes.is_success(http_response.status_code)
         assert http_response.text == "hello world\n"
 
+        # cached downloads are revalidated by etag
+        etag = http_response.headers["etag"]
+        http_response = client.get(f"/conversations/{conversation_id}/files/test.txt", headers={"if-none-match": etag})
+        assert http_response.status_code == httpx.codes.NOT_MODIFIED
+
+        # download a range of a file
+        http_response = client.get(f"/conversations/{conversation_id}/files/test.txt", headers={"range": "bytes=6-10"})
+        assert http_response.status_code == httpx.codes.PARTIAL_CONTENT
+        assert http_response.text == "world"
+
         # download another file
         http_response = client.get(f"/conversations/{conversation_id}/files/path1/path2/test.html")
         assert httpx.codes.is_success(http_response.status_code)
@@ -1059,6 +1618,7 @@ def test_create_conversation_write_read_delete_file(
         http_response = client.get(f"/conversations/{conversation_id}/files/test.txt")
         assert httpx.codes.is_success(http_response.status_code)
         assert http_response.text == "hello again\n"
+        assert http_response.headers["etag"] != etag
 
         # get the file content for the prior version
         http_response = client.get(f"/conversations/{conversation_id}/files/test.txt", params={"version": 1})
@@ -1152,8 +1712,8 @@ def test_create_assistant_export_import_data(
         assert httpx.codes.is_success(http_response.status_code)
 
         assert http_response.headers["content-type"] == "application/zip"
-        assert "content-length" in http_response.headers
-        assert int(http_response.headers["content-length"]) > 0
+        # exports are streamed, so have no content-length
+        assert len(http_response.content) > 0
 
         logging.info("response: %s", http_response.content)
 
@@ -1280,8 +1840,8 @@ def test_create_assistant_conversations_export_import_conversations(
         assert httpx.codes.is_success(http_response.status_code)
 
         assert http_response.headers["content-type"] == "application/zip"
-        assert "content-length" in http_response.headers
-        assert int(http_response.headers["content-length"]) > 0
+        # exports are streamed, so have no content-length
+        assert len(http_response.content) > 0
 
         logging.info("response: %s", http_response.content)
 
@@ -1343,10 +1903,55 @@ def test_create_assistant_conversations_export_import_conversations(
             assert message_debug.debug_data == {"key": "value"}
 
 
+def test_create_conversation_delete_files_sweeps_unreferenced_blobs(
+    workbench_service: FastAPI,
+    test_user: MockUser,
+    storage_settings: semantic_workbench_service.files.StorageSettings,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "file_blob_sweep_interval_seconds", 0.1)
+    blobs_path = pathlib.Path(storage_settings.root) / "blobs"
+
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = http_response.json()["id"]
+
+        # two files share the blob for their identical content
+        payload = [
+            ("files", ("shared-1.txt", "shared content\n", "text/plain")),
+            ("files", ("shared-2.txt", "shared content\n", "text/plain")),
+            ("files", ("other.txt", "other content\n", "text/plain")),
+        ]
+        http_response = client.put(f"/conversations/{conversation_id}/files", files=payload)
+        assert httpx.codes.is_success(http_response.status_code)
+        assert len(list(blobs_path.glob("*/*"))) == 2
+
+        for filename in ["shared-1.txt", "other.txt"]:
+            http_response = client.delete(f"/conversations/{conversation_id}/files/{filename}")
+            assert httpx.codes.is_success(http_response.status_code)
+
+        # the blob of the deleted file is removed by the sweep, and the still referenced blob is kept
+        for _ in range(50):
+            if len(list(blobs_path.glob("*/*"))) == 1:
+                break
+            time.sleep(0.1)
+        assert len(list(blobs_path.glob("*/*"))) == 1
+
+        http_response = client.get(f"/conversations/{conversation_id}/files/shared-2.txt")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert http_response.text == "shared content\n"
+
+
 def test_export_import_conversations_with_files(
     workbench_service: FastAPI,
     test_user: MockUser,
+    monkeypatch: pytest.MonkeyPatch,
 ) -> None:
+    # read exported records and insert imported records in several batches
+    monkeypatch.setattr("semantic_workbench_service.controller.export_import._EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "import_batch_size", 2)
+
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
         http_response = client.post("/conversations", json={"title": "test-conversation-1"})
         assert httpx.codes.is_success(http_response.status_code)
@@ -1406,6 +2011,60 @@ def test_export_import_conversations_with_files(
                             pytest.fail(f"unexpected file: {file.filename}")
 
 
+def test_duplicate_conversation_with_messages_and_files(
+    workbench_service: FastAPI,
+    test_user: MockUser,
+) -> None:
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = workbench_model.Conversation.model_validate(http_response.json()).id
+
+        for index in range(5):
+            http_response = client.post(
+                f"/conversations/{conversation_id}/messages",
+                json={"content": f"message {index}", "debug_data": {"index": index} if index % 2 else None},
+            )
+            assert httpx.codes.is_success(http_response.status_code)
+
+        payload = [("files", ("test.txt", "hello world\n", "text/plain"))]
+        http_response = client.put(f"/conversations/{conversation_id}/files", files=payload)
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.post(f"/conversations/{conversation_id}", json={"title": "copy"})
+        assert httpx.codes.is_success(http_response.status_code)
+        import_result = workbench_model.ConversationImportResult.model_validate(http_response.json())
+        new_conversation_id = import_result.conversation_ids[0]
+
+        http_response = client.get(f"/conversations/{new_conversation_id}/messages")
+        assert httpx.codes.is_success(http_response.status_code)
+        messages = workbench_model.ConversationMessageList.model_validate(http_response.json()).messages
+        assert [m.content for m in messages] == [f"message {index}" for index in range(5)]
+        assert [m.has_debug_data for m in messages] == [False, True, False, True, False]
+
+        http_response = client.get(f"/conversations/{new_conversation_id}/messages/{messages[3].id}/debug_data")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert workbench_model.ConversationMessageDebug.model_validate(http_response.json()).debug_data == {"index": 3}
+
+        http_response = client.get(f"/conversations/{new_conversation_id}")
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+        assert conversation.latest_message is not None
+        assert conversation.latest_message.id == messages[-1].id
+
+        http_response = client.get(f"/conversations/{new_conversation_id}/files/test.txt")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert http_response.text == "hello world\n"
+
+        # the copy shares the file content, which is kept until neither conversation references it
+        http_response = client.delete(f"/conversations/{conversation_id}/files/test.txt")
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get(f"/conversations/{new_conversation_id}/files/test.txt")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert http_response.text == "hello world\n"
+
+
 @pytest.mark.httpx_mock(can_send_already_matched_responses=True)
 def test_create_conversations_get_participants(
     workbench_service: FastAPI,